@@ -1,2 +1,3 @@
 
-from .ingredient import FoodGraph
\ No newline at end of file
+from .ingredient import FoodGraph
+from .feedback import SubstitutionFeedback
\ No newline at end of file
@@ -0,0 +1,136 @@
+# -*- coding:utf-8 -*-
+
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+# Default number of query results kept by a `FoodGraph`
+DEFAULT_CACHE_SIZE = 1024
+
+
+class QueryCache:
+    """
+    Bounded cache of query results, evicted in least recently used order. Entries may also expire after a fixed time.
+
+    Every entry belongs to a version of the model. When the cache is used with a newer version, all the entries are discarded at once, since any change of the model may change any result.
+    """
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE, ttl=None):
+        """
+        Args:
+            max_entries (int, optional): Maximum number of entries. 0 disables the cache. Defaults to 1024.
+            ttl (float, optional): Time after which an entry expires, in seconds. Defaults to None (never).
+
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = dict([('hits', 0), ('misses', 0), ('evictions', 0), ('expirations', 0), ('invalidations', 0)])
+
+
+    def get(self, key, version):
+        """Look up the result of a query
+
+        Args:
+            key (hashable): Normalized query.
+            version (int): Current version of the model.
+
+        Returns:
+            (bool, object): Whether the result was found, and the result.
+
+        """
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+
+            if not entry is None and not self.ttl is None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                entry = None
+
+            if entry is None:
+                self._stats['misses'] += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return True, entry[1]
+
+
+    def put(self, key, version, value):
+        """Store the result of a query
+
+        Args:
+            key (hashable): Normalized query.
+            version (int): Version of the model on which the query was run.
+            value (object): Result.
+
+        """
+        with self._lock:
+            self._check_version(version)
+            if self.max_entries <= 0 or version != self.version:
+                return
+
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+    def stats(self):
+        """Returns the statistics of the cache
+
+        Returns:
+            dict: Number of hits, misses, evictions (by size), expirations (by time) and invalidations (by a new model version), current number of entries, and maximum number of entries.
+
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+            return stats
+
+
+    def _check_version(self, version):
+        if self.version is None or version > self.version:
+            self._stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+            self.version = version
+
+
+def cached_query(key, copy=list):
+    """Decorator of a `FoodGraph` query method, whose results are kept in the query cache of the instance. If the instance is instrumented (see `analysis.metrics.Metrics`), the latency of every call is recorded, by query and by whether its result was cached.
+
+    Args:
+        key (callable): Receives the arguments of the method, and returns a hashable normalization of them. Arguments that do not change the result (e.g. the order of a set of ingredients) must be normalized away.
+        copy (callable, optional): Returns a copy of a result, so the caller cannot change the cached one. Defaults to `list`.
+
+    Returns:
+        callable: Decorator.
+
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter() if self.metrics.enabled else None
+            query = (method.__name__,) + key(*args, **kwargs)
+            found, result = self._cache.get(query, self.version)
+            if not found:
+                version = self.version
+                result = method(self, *args, **kwargs)
+                self._cache.put(query, version, result)
+            result = copy(result)
+            if not start is None:
+                self.metrics.observe('query_seconds', time.perf_counter() - start, query=method.__name__, cache='hit' if found else 'miss')
+            return result
+        return wrapper
+    return decorator
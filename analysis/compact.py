@@ -0,0 +1,959 @@
+# -*- coding:utf-8 -*-
+
+import mmap
+import threading
+import time
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import networkx as nx
+import numpy as np
+
+from .embedding import Embeddings
+from .snapshot import read_snapshot, write_snapshot
+
+# Stride of the reads that bring the pages of a memory-mapped graph into memory (see `LazyGraphs.prefetch`)
+PAGE_SIZE = mmap.PAGESIZE
+
+
+class StringTable:
+    """
+    Interned strings, stored as a single UTF-8 buffer plus the offsets of each string. A string is identified by its position in the table.
+
+    Strings appended after the table was built are kept aside, after the stored ones, until `compacted` merges them into new arrays.
+    """
+
+    def __init__(self, data, offsets, order):
+        """
+        Args:
+            data (numpy.ndarray): Concatenated UTF-8 encoded strings (uint8).
+            offsets (numpy.ndarray): Start of each string inside `data`, followed by the length of `data` (int64).
+            order (numpy.ndarray): Positions of the strings, sorted by their encoded bytes (int32). Used to find strings by binary search.
+
+        """
+        self.data = data
+        self.offsets = offsets
+        self.order = order
+        self._appended = []
+        self._appended_index = dict()
+
+
+    @classmethod
+    def from_strings(cls, strings):
+        """Intern a sequence of strings
+
+        Args:
+            strings (list of str): Distinct strings, in the order that will define their positions.
+
+        Returns:
+            StringTable: Table.
+
+        """
+        encoded = [string.encode('utf8') for string in strings]
+        lengths = np.fromiter((len(value) for value in encoded), dtype=np.int64, count=len(encoded))
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        order = np.array(sorted(range(len(encoded)), key=encoded.__getitem__), dtype=np.int32)
+
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets, order)
+
+
+    def __len__(self):
+        return len(self.offsets) - 1 + len(self._appended)
+
+
+    def __getitem__(self, position):
+        if position >= len(self.offsets) - 1:
+            return self._appended[position - len(self.offsets) + 1]
+        return self._bytes(position).decode('utf8')
+
+
+    def __contains__(self, string):
+        return self.find(string) >= 0
+
+
+    def _bytes(self, position):
+        return self.data[self.offsets[position]:self.offsets[position + 1]].tobytes()
+
+
+    def find(self, string):
+        """Returns the position of a string
+
+        Args:
+            string (str): String.
+
+        Returns:
+            int: Position of the string, or -1 if it is not in the table.
+
+        """
+        value = string.encode('utf8')
+        low, high = 0, len(self.order)
+
+        while low < high:
+            middle = (low + high) // 2
+            if self._bytes(self.order[middle]) < value:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < len(self.order) and self._bytes(self.order[low]) == value:
+            return int(self.order[low])
+        return self._appended_index.get(string, -1)
+
+
+    def index(self, string):
+        """Returns the position of a string
+
+        Args:
+            string (str): String.
+
+        Raises:
+            KeyError: If the string is not in the table.
+
+        Returns:
+            int: Position of the string.
+
+        """
+        position = self.find(string)
+        if position < 0:
+            raise KeyError(string)
+        return position
+
+
+    def append(self, string):
+        """Add a string at the end of the table
+
+        Args:
+            string (str): String, not in the table.
+
+        Returns:
+            int: Position of the string.
+
+        """
+        position = len(self)
+        self._appended.append(string)
+        self._appended_index[string] = position
+        return position
+
+
+    def compacted(self):
+        """Returns a copy of the table whose arrays include the appended strings. The positions do not change.
+
+        Returns:
+            StringTable: Table, or this same table if no string was appended.
+
+        """
+        if not self._appended:
+            return self
+        return StringTable.from_strings([self[position] for position in range(len(self))])
+
+
+    def arrays(self, prefix):
+        return dict([
+            (prefix + 'data', self.data),
+            (prefix + 'offsets', self.offsets),
+            (prefix + 'order', self.order)
+        ])
+
+
+class CSRGraph:
+    """
+    Undirected graph over the positions of a `StringTable`, in compressed sparse row layout. The neighbours of node `u` are `indices[indptr[u]:indptr[u + 1]]`, sorted, and `weights` holds the weight of each of those edges. Every edge is stored in both directions (a self-loop, once).
+
+    The arrays are never modified (they may be a read-only memory map). Changes, to the edges and to the set of nodes, are kept in an overlay, which the queries take into account and `compacted` merges into new arrays.
+    """
+
+    def __init__(self, nodes, kinds, indptr, indices, weights):
+        """
+        Args:
+            nodes (numpy.ndarray): Positions of the nodes that belong to the graph, in insertion order (int32).
+            kinds (numpy.ndarray): Index of the `type` of each node of `nodes`, within the list of node types of the graph (uint8).
+            indptr (numpy.ndarray): Start of the neighbours of each position, followed by the number of stored edges (int64).
+            indices (numpy.ndarray): Neighbours (int32).
+            weights (numpy.ndarray): Weight of each stored edge (float64).
+
+        """
+        self.nodes = nodes
+        self.kinds = kinds
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        # position -> (neighbour -> weight, or None if the edge was removed)
+        self._delta = dict()
+        # position -> neighbours and weights of a changed node, merged with the arrays
+        self._merged = dict()
+        # Nodes added (or whose kind changed), with their kind, and nodes removed
+        self._added_nodes = dict()
+        self._removed_nodes = set()
+        self._members = None
+
+
+    @classmethod
+    def from_networkx(cls, graph, index, types):
+        """Convert a NetworkX graph
+
+        Args:
+            graph (networkx.Graph): Graph. Nodes are labelled by strings and edges are expected to have a `weight`.
+            index (dict(str, int)): Position of every node label.
+            types (list of str): Node types. New types found in the graph are appended.
+
+        Returns:
+            CSRGraph: Graph.
+
+        """
+        nodes = np.fromiter((index[node] for node in graph.nodes), dtype=np.int32, count=graph.number_of_nodes())
+
+        kinds = np.zeros(len(nodes), dtype=np.uint8)
+        for i, (_, data) in enumerate(graph.nodes(data=True)):
+            node_type = data.get('type')
+            if not node_type in types:
+                types.append(node_type)
+            kinds[i] = types.index(node_type)
+
+        firsts, seconds, weights = [], [], []
+        for (u, v, weight) in graph.edges(data='weight', default=1):
+            firsts.append(index[u])
+            seconds.append(index[v])
+            weights.append(weight)
+
+        return cls.from_edges(len(index), nodes, kinds, np.array(firsts, dtype=np.int64), np.array(seconds, dtype=np.int64), np.array(weights, dtype=np.float64))
+
+
+    @classmethod
+    def from_edges(cls, n_positions, nodes, kinds, firsts, seconds, weights):
+        """Build the graph from a list of edges
+
+        Args:
+            n_positions (int): Number of positions of the string table.
+            nodes (numpy.ndarray): Positions of the nodes of the graph.
+            kinds (numpy.ndarray): Index of the type of each node.
+            firsts (numpy.ndarray): First end of each edge.
+            seconds (numpy.ndarray): Second end of each edge.
+            weights (numpy.ndarray): Weight of each edge.
+
+        Returns:
+            CSRGraph: Graph.
+
+        """
+        loops = firsts == seconds
+        rows = np.concatenate([firsts, seconds[~loops]])
+        cols = np.concatenate([seconds, firsts[~loops]])
+        values = np.concatenate([weights, weights[~loops]])
+
+        order = np.lexsort((cols, rows))
+        indptr = np.zeros(n_positions + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_positions), out=indptr[1:])
+
+        return cls(nodes, kinds, indptr, cols[order].astype(np.int32), values[order].astype(np.float64))
+
+
+    def neighbors(self, position):
+        """Returns the neighbours of a node, and the weights of the edges that join them
+
+        Args:
+            position (int): Node.
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray): Sorted neighbours, and weights.
+
+        """
+        if position < len(self.indptr) - 1:
+            start, end = self.indptr[position], self.indptr[position + 1]
+            indices, weights = self.indices[start:end], self.weights[start:end]
+        else:
+            indices, weights = self.indices[:0], self.weights[:0]
+
+        if not position in self._delta:
+            return indices, weights
+
+        if not position in self._merged:
+            delta = self._delta[position]
+            changed = np.fromiter(delta, dtype=np.int32, count=len(delta))
+            added = np.array([not weight is None for weight in delta.values()], dtype=bool)
+            keep = ~np.isin(indices, changed)
+
+            indices = np.concatenate([indices[keep], changed[added]])
+            weights = np.concatenate([weights[keep], np.array([weight for weight in delta.values() if not weight is None], dtype=np.float64)])
+            order = np.argsort(indices, kind='stable')
+            self._merged[position] = (indices[order], weights[order])
+
+        return self._merged[position]
+
+
+    def degree(self, position):
+        if position in self._delta or position >= len(self.indptr) - 1:
+            return len(self.neighbors(position)[0])
+        return int(self.indptr[position + 1] - self.indptr[position])
+
+
+    def weight(self, u, v):
+        """Returns the weight of an edge
+
+        Args:
+            u (int): First end.
+            v (int): Second end.
+
+        Returns:
+            float | None: Weight, or None if the edge does not exist.
+
+        """
+        if u in self._delta and v in self._delta[u]:
+            return self._delta[u][v]
+        if u >= len(self.indptr) - 1:
+            return None
+
+        start, end = self.indptr[u], self.indptr[u + 1]
+        found = start + np.searchsorted(self.indices[start:end], v)
+        return float(self.weights[found]) if found < end and self.indices[found] == v else None
+
+
+    def is_modified(self, position):
+        """Whether the neighbours of a node have changed since the arrays were built
+
+        """
+        return position in self._delta
+
+
+    def modified(self):
+        """Returns the nodes whose neighbours have changed since the arrays were built
+
+        Returns:
+            list of int: Nodes.
+
+        """
+        return list(self._delta)
+
+
+    def has_changes(self):
+        return bool(self._delta or self._added_nodes or self._removed_nodes)
+
+
+    def has_node(self, position):
+        if position in self._added_nodes:
+            return True
+        if position in self._removed_nodes:
+            return False
+
+        if self._members is None:
+            self._members = np.zeros(len(self.indptr) - 1, dtype=bool)
+            self._members[self.nodes] = True
+        return position < len(self._members) and bool(self._members[position])
+
+
+    def add_node(self, position, kind):
+        """Add a node, or change its kind
+
+        Args:
+            position (int): Node.
+            kind (int): Index of the type of the node.
+
+        """
+        self._removed_nodes.discard(position)
+        self._added_nodes[position] = kind
+
+
+    def remove_node(self, position):
+        """Remove a node and its edges
+
+        Args:
+            position (int): Node.
+
+        """
+        neighbors, _ = self.neighbors(position)
+        for neighbor in neighbors.tolist():
+            self.set_weight(position, neighbor, None)
+
+        self._added_nodes.pop(position, None)
+        self._removed_nodes.add(position)
+
+
+    def members(self):
+        """Returns the nodes of the graph, including the changes
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray): Nodes, in insertion order (added nodes last), and index of the type of each one.
+
+        """
+        if not self._added_nodes and not self._removed_nodes:
+            return self.nodes, self.kinds
+
+        keep = ~np.isin(self.nodes, np.array(list(self._removed_nodes), dtype=np.int64))
+        nodes, kinds = self.nodes[keep], self.kinds[keep].copy()
+
+        changed = dict(self._added_nodes)
+        found = np.flatnonzero(np.isin(nodes, np.array(list(changed), dtype=np.int64)))
+        for i in found.tolist():
+            kinds[i] = changed.pop(int(nodes[i]))
+
+        return (
+            np.concatenate([nodes, np.array(list(changed), dtype=np.int32)]).astype(np.int32),
+            np.concatenate([kinds, np.array(list(changed.values()), dtype=np.uint8)]).astype(np.uint8)
+        )
+
+
+    def set_weight(self, u, v, weight):
+        """Add an edge, or change its weight
+
+        Args:
+            u (int): First end.
+            v (int): Second end.
+            weight (float | None): Weight. None removes the edge.
+
+        """
+        self._delta.setdefault(u, dict())[v] = weight
+        self._delta.setdefault(v, dict())[u] = weight
+        self._merged.pop(u, None)
+        self._merged.pop(v, None)
+
+
+    def edges(self):
+        """Returns every edge once, with its first end not greater than the second
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray, numpy.ndarray): First end, second end and weight of each edge.
+
+        """
+        if self._delta:
+            return self.compacted(max(len(self.indptr) - 1, max(self._delta) + 1)).edges()
+
+        rows = np.repeat(np.arange(len(self.indptr) - 1, dtype=np.int32), np.diff(self.indptr))
+        keep = rows <= self.indices
+        return rows[keep], self.indices[keep], self.weights[keep]
+
+
+    def compacted(self, n_positions):
+        """Returns a copy of the graph whose arrays include the changes
+
+        Args:
+            n_positions (int): Number of positions of the string table.
+
+        Returns:
+            CSRGraph: Graph, or this same graph if it has no changes and covers all the positions.
+
+        """
+        if not self.has_changes() and n_positions == len(self.indptr) - 1:
+            return self
+
+        nodes, kinds = self.members()
+
+        rows = np.repeat(np.arange(len(self.indptr) - 1, dtype=np.int64), np.diff(self.indptr))
+        keep = rows <= self.indices
+        firsts, seconds, weights = rows[keep], self.indices[keep].astype(np.int64), self.weights[keep]
+
+        changed = [(u, v, weight) for u, row in self._delta.items() for v, weight in row.items() if u <= v]
+        changed_firsts = np.array([u for u, _, _ in changed], dtype=np.int64)
+        changed_seconds = np.array([v for _, v, _ in changed], dtype=np.int64)
+        keep = ~np.isin(firsts * n_positions + seconds, changed_firsts * n_positions + changed_seconds)
+        added = np.array([not weight is None for _, _, weight in changed], dtype=bool)
+
+        return CSRGraph.from_edges(
+            n_positions, nodes, kinds,
+            np.concatenate([firsts[keep], changed_firsts[added]]),
+            np.concatenate([seconds[keep], changed_seconds[added]]),
+            np.concatenate([weights[keep], np.array([weight for _, _, weight in changed if not weight is None], dtype=np.float64)])
+        )
+
+
+    def arrays(self, prefix):
+        return dict([
+            (prefix + 'nodes', self.nodes),
+            (prefix + 'kinds', self.kinds),
+            (prefix + 'indptr', self.indptr),
+            (prefix + 'indices', self.indices),
+            (prefix + 'weights', self.weights)
+        ])
+
+
+class RankedLists:
+    """
+    One ranked list of positions per position, in compressed layout: the list of `u` is `indices[indptr[u]:indptr[u + 1]]`, and `scores` holds the score of each element, in decreasing order.
+    """
+
+    def __init__(self, indptr, indices, scores):
+        """
+        Args:
+            indptr (numpy.ndarray): Start of the list of each position, followed by the number of stored elements (int64).
+            indices (numpy.ndarray): Elements of the lists (int32).
+            scores (numpy.ndarray): Score of each element (float64).
+
+        """
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+
+
+    @classmethod
+    def top(cls, graph, n):
+        """Rank the neighbours of every node of a graph by the weight of the edge that joins them, greater weight and then smaller position first
+
+        Args:
+            graph (CSRGraph): Graph.
+            n (int): Maximum length of each list.
+
+        Returns:
+            RankedLists: Lists.
+
+        """
+        degrees = np.diff(graph.indptr)
+        rows = np.repeat(np.arange(len(degrees), dtype=np.int64), degrees)
+        order = np.lexsort((graph.indices, -graph.weights, rows))
+
+        keep = np.arange(len(rows)) - graph.indptr[rows] < n
+        indptr = np.zeros(len(degrees) + 1, dtype=np.int64)
+        np.cumsum(np.minimum(degrees, n), out=indptr[1:])
+
+        return cls(indptr, graph.indices[order][keep], graph.weights[order][keep])
+
+
+    def __getitem__(self, position):
+        start, end = self.indptr[position], self.indptr[position + 1]
+        return self.indices[start:end], self.scores[start:end]
+
+
+    def arrays(self, prefix):
+        return dict([
+            (prefix + 'indptr', self.indptr),
+            (prefix + 'indices', self.indices),
+            (prefix + 'scores', self.scores)
+        ])
+
+
+class LazyGraphs(MutableMapping):
+    """
+    Graphs of a model, by name, each one loaded on first access. A load can also start ahead of the access, in a background thread (see `prefetch`), so the access only waits for what is left of it.
+
+    A graph is loaded by two functions: `prefetch`, which reads what the graph needs (e.g. parses a file, or reads the pages of a memory map) and may run in a background thread, and `build`, which produces the graph from what was read, in the thread that accesses it, so only that thread changes the model. `build` receives None if the graph was not prefetched, and then reads it on its own.
+
+    The time spent loading each graph is kept in `timings`. Iterating, checking membership or counting the graphs does not load them; reading their values does.
+    """
+
+    def __init__(self, graphs=None, loaders=None, on_load=None):
+        """
+        Args:
+            graphs (dict(str, CSRGraph), optional): Graphs already loaded, by name. Defaults to None.
+            loaders (dict(str, (callable | None, callable)), optional): `prefetch` and `build` functions of the graphs to load, by name. `prefetch` takes no argument and may be None; `build` takes the result of `prefetch` and returns the graph. Defaults to None.
+            on_load (callable, optional): Called with the name of every graph loaded, and the graph, right after it is loaded. Defaults to None.
+
+        """
+        self._graphs = dict() if graphs is None else dict(graphs)
+        self._loaders = dict()
+        self._names = list(self._graphs)
+        # name -> future of its prefetch
+        self._futures = dict()
+        self._locks = dict()
+        self._lock = threading.Lock()
+        self.on_load = on_load
+        # name -> seconds spent by the thread that accessed the graph, seconds of its prefetch, and seconds the access waited for the prefetch
+        self.timings = dict()
+
+        for name, (prefetch, build) in (loaders or dict()).items():
+            self.add(name, build, prefetch)
+
+
+    def add(self, name, build, prefetch=None):
+        """Add a graph, loaded on first access
+
+        Args:
+            name (str): Graph name.
+            build (callable): Function that returns the graph, from the result of `prefetch` (None if it did not run).
+            prefetch (callable, optional): Function that reads what the graph needs, in advance. Defaults to None (`build` does it all).
+
+        """
+        self._graphs.pop(name, None)
+        self._loaders[name] = (prefetch, build)
+        self._locks[name] = threading.Lock()
+        if not name in self._names:
+            self._names.append(name)
+
+
+    def __getitem__(self, name):
+        graph = self._graphs.get(name)
+        if graph is None:
+            if not name in self._loaders:
+                raise KeyError(name)
+            graph = self._load(name)
+        return graph
+
+
+    def _load(self, name):
+        with self._locks[name]:
+            # Loaded by another thread while this one waited
+            if name in self._graphs:
+                return self._graphs[name]
+
+            start = time.perf_counter()
+            prefetch, build = self._loaders[name]
+            with self._lock:
+                future = self._futures.pop(name, None)
+
+            fetched, prefetch_seconds = (None, None) if future is None else future.result()
+            waited = time.perf_counter() - start
+            graph = build(fetched)
+
+            self._graphs[name] = graph
+            del self._loaders[name]
+            self.timings[name] = dict([
+                ('seconds', time.perf_counter() - start),
+                ('prefetch_seconds', prefetch_seconds),
+                ('waited_seconds', waited if not future is None else None)
+            ])
+
+        if not self.on_load is None:
+            self.on_load(name, graph)
+        return graph
+
+
+    def _prefetch(self, name):
+        start = time.perf_counter()
+        fetched = self._loaders[name][0]()
+        return fetched, time.perf_counter() - start
+
+
+    def prefetch(self, workers=None):
+        """Start reading every graph not loaded yet, in background threads. The graphs are still built on first access, which waits for their reading to end.
+
+        Args:
+            workers (int, optional): Number of threads. Defaults to None (one per graph).
+
+        Returns:
+            list of str: Names of the graphs being read.
+
+        """
+        with self._lock:
+            names = [name for name, (prefetch, _) in self._loaders.items() if not prefetch is None and not name in self._futures]
+            if not names:
+                return []
+
+            executor = ThreadPoolExecutor(max_workers=workers or len(names), thread_name_prefix='prefetch')
+            for name in names:
+                self._futures[name] = executor.submit(self._prefetch, name)
+        # The threads end with their reading
+        executor.shutdown(wait=False)
+        return names
+
+
+    def is_loaded(self, name):
+        return name in self._graphs
+
+
+    def pending(self):
+        """Returns the names of the graphs not loaded yet
+        """
+        return [name for name in self._names if name in self._loaders]
+
+
+    def loaded(self):
+        """Returns the graphs already loaded, by name, without loading the others
+        """
+        return dict((name, self._graphs[name]) for name in self._names if name in self._graphs)
+
+
+    def load_all(self):
+        for name in self.pending():
+            self[name]
+
+
+    def __setitem__(self, name, graph):
+        self._graphs[name] = graph
+        self._loaders.pop(name, None)
+        with self._lock:
+            self._futures.pop(name, None)
+        if not name in self._names:
+            self._names.append(name)
+
+
+    def __delitem__(self, name):
+        if not name in self._names:
+            raise KeyError(name)
+        self._graphs.pop(name, None)
+        self._loaders.pop(name, None)
+        with self._lock:
+            self._futures.pop(name, None)
+        self._names.remove(name)
+
+
+    def __contains__(self, name):
+        return name in self._graphs or name in self._loaders
+
+
+    def __iter__(self):
+        return iter(list(self._names))
+
+
+    def __len__(self):
+        return len(self._names)
+
+
+class LazyMetadata(MutableMapping):
+    """
+    Metadata of the graphs of a `LazyGraphs`, by graph name (see `CompactModel`). Reading the metadata of a graph loads the graph first, since it may be produced along with it.
+    """
+
+    def __init__(self, graphs, metadata):
+        """
+        Args:
+            graphs (LazyGraphs): Graphs.
+            metadata (dict): Metadata known so far, by graph name.
+
+        """
+        self._graphs = graphs
+        self._metadata = metadata
+
+
+    def __getitem__(self, name):
+        if name in self._graphs and not self._graphs.is_loaded(name):
+            self._graphs[name]
+        return self._metadata[name]
+
+
+    def __setitem__(self, name, value):
+        self._metadata[name] = value
+
+
+    def __delitem__(self, name):
+        del self._metadata[name]
+
+
+    def __contains__(self, name):
+        return name in self._metadata or name in self._graphs
+
+
+    def __iter__(self):
+        self._graphs.load_all()
+        return iter(list(self._metadata))
+
+
+    def __len__(self):
+        return len(set(self._metadata) | set(self._graphs))
+
+
+class CompactModel:
+    """
+    Array-backed copy of the model graphs: one string table shared by the graphs, and one `CSRGraph` per graph. It is stored as a memory-mappable snapshot (see `analysis.snapshot`).
+
+    Edge attributes other than the weight are described by an edge schema per graph, a dict with the optional fields:
+        - type (str): Value of the `type` attribute of every edge.
+        - label (str): Prefix of the `label` attribute, which is followed by the weight.
+        - value (bool): Whether the edges have a `value` attribute equal to the weight.
+        - integer (bool): Whether the weights are integers.
+    Attributes that do not follow the schema are kept aside, edge by edge.
+    """
+
+    def __init__(self, strings, graphs, metadata, lists=None, embeddings=None):
+        """
+        Args:
+            strings (StringTable): Node labels.
+            graphs (dict(str, CSRGraph) | LazyGraphs): Graphs, by name. A `LazyGraphs` loads them on first access.
+            metadata (dict): For each graph name, a dict with the fields:
+                - types (list of str): Node types.
+                - schema (dict): Edge schema.
+                - extra (list of [int, int, dict]): Edges with attributes outside the schema.
+              The metadata of a graph not loaded yet may be missing, if it is produced along with the graph.
+            lists (dict(str, RankedLists), optional): Precomputed ranked lists, by name. Defaults to None.
+            embeddings (dict(str, Embeddings), optional): Vectors of the nodes, by name (see `analysis.embedding`). Defaults to None.
+
+        """
+        self.strings = strings
+        self.graphs = graphs if isinstance(graphs, LazyGraphs) else LazyGraphs(graphs)
+        self.metadata = LazyMetadata(self.graphs, metadata)
+        self.lists = dict() if lists is None else lists
+        self.embeddings = dict() if embeddings is None else embeddings
+
+
+    @classmethod
+    def from_networkx(cls, graphs, schemas):
+        """Convert NetworkX graphs
+
+        Args:
+            graphs (dict(str, networkx.Graph)): Graphs, by name. Labels are interned in order of first appearance, following the order of the dict.
+            schemas (dict(str, dict)): Edge schema of each graph.
+
+        Returns:
+            CompactModel: Model.
+
+        """
+        index = dict()
+        for graph in graphs.values():
+            for node in graph.nodes:
+                index.setdefault(node, len(index))
+
+        compact_graphs, metadata = dict(), dict()
+        for name, graph in graphs.items():
+            compact_graphs[name], metadata[name] = compact_networkx(graph, index, schemas.get(name, dict()))
+
+        return cls(StringTable.from_strings(list(index)), compact_graphs, metadata)
+
+
+    def to_networkx(self, name):
+        """Produce a NetworkX copy of a graph
+
+        Args:
+            name (str): Graph name.
+
+        Returns:
+            networkx.Graph: Graph, with the same nodes, edges and attributes as the one converted.
+
+        """
+        compact = self.graphs[name].compacted(len(self.strings))
+        metadata = self.metadata[name]
+        types, schema = metadata['types'], metadata['schema']
+        labels = dict()
+
+        def label(position):
+            if not position in labels:
+                labels[position] = self.strings[position]
+            return labels[position]
+
+        graph = nx.Graph()
+        graph.add_nodes_from(
+            (label(position), dict([('type', types[kind]), ('label', label(position))]))
+            for position, kind in zip(compact.nodes.tolist(), compact.kinds.tolist())
+        )
+
+        firsts, seconds, weights = compact.edges()
+        graph.add_edges_from(
+            (label(u), label(v), edge_attributes(schema, weight))
+            for u, v, weight in zip(firsts.tolist(), seconds.tolist(), weights.tolist())
+        )
+
+        for (u, v, different, missing) in metadata['extra']:
+            if not graph.has_edge(label(u), label(v)):
+                continue
+            data = graph.edges[label(u), label(v)]
+            data.update(different)
+            for key in missing:
+                del data[key]
+
+        return graph
+
+
+    def compacted(self):
+        """Returns a copy of the model whose arrays include the changes made to the graphs. The ranked lists are not copied, since they may be outdated; the embeddings are, since the positions do not change.
+
+        Returns:
+            CompactModel: Model.
+
+        """
+        strings = self.strings.compacted()
+        graphs = dict((name, graph.compacted(len(strings))) for name, graph in self.graphs.items())
+        return CompactModel(strings, graphs, dict(self.metadata), embeddings=dict(self.embeddings))
+
+
+    def has_changes(self):
+        # The graphs not loaded yet have no changes
+        return len(self.strings) != len(self.strings.offsets) - 1 or any(graph.has_changes() for graph in self.graphs.loaded().values())
+
+
+    def save(self, fpath):
+        """Store the model as a snapshot
+
+        Args:
+            fpath (str): Path of the file.
+
+        """
+        arrays = self.strings.compacted().arrays('strings.')
+        for name, graph in self.graphs.items():
+            arrays.update(graph.compacted(len(self.strings)).arrays(name + '.'))
+        for name, lists in self.lists.items():
+            arrays.update(lists.arrays(name + '.'))
+        for name, embeddings in self.embeddings.items():
+            arrays.update(embeddings.arrays(name + '.'))
+        write_snapshot(fpath, arrays, dict([('graphs', dict(self.metadata)), ('lists', list(self.lists)), ('embeddings', list(self.embeddings))]))
+
+
+    @classmethod
+    def load(cls, fpath, on_load=None):
+        """Memory-map a model stored with `save`. Each graph is produced from its arrays on first access (see `LazyGraphs`); prefetching it reads the pages of its arrays in advance, so the first queries do not wait for the disk.
+
+        Args:
+            fpath (str): Path of the file.
+            on_load (callable, optional): Called with the name of every graph loaded, and the graph (see `LazyGraphs`). Defaults to None.
+
+        Returns:
+            CompactModel: Model.
+
+        """
+        arrays, metadata = read_snapshot(fpath)
+        strings = StringTable(arrays['strings.data'], arrays['strings.offsets'], arrays['strings.order'])
+
+        loaders = dict()
+        for name in metadata['graphs']:
+            fields = [arrays[name + '.' + field] for field in ['nodes', 'kinds', 'indptr', 'indices', 'weights']]
+            loaders[name] = (partial(_read_pages, fields), partial(_csr_graph, fields))
+
+        lists = dict()
+        for name in metadata.get('lists', []):
+            lists[name] = RankedLists(*[arrays[name + '.' + field] for field in ['indptr', 'indices', 'scores']])
+
+        embeddings = dict()
+        for name in metadata.get('embeddings', []):
+            embeddings[name] = Embeddings(arrays[name + '.positions'], arrays[name + '.vectors'])
+
+        return cls(strings, LazyGraphs(loaders=loaders, on_load=on_load), metadata['graphs'], lists, embeddings)
+
+
+def _read_pages(arrays):
+    """Read one byte of every page of some memory-mapped arrays, so the operating system loads them
+    """
+    for array in arrays:
+        np.add.reduce(array.reshape(-1).view(np.uint8)[::PAGE_SIZE])
+
+
+def _csr_graph(fields, fetched=None):
+    return CSRGraph(*fields)
+
+
+def compact_networkx(graph, index, schema):
+    """Convert a NetworkX graph of a model, with its metadata (see `CompactModel`)
+
+    Args:
+        graph (networkx.Graph): Graph.
+        index (dict(str, int)): Position of every node label.
+        schema (dict): Edge schema of the graph.
+
+    Returns:
+        (CSRGraph, dict): Graph and metadata.
+
+    """
+    types = []
+    compact = CSRGraph.from_networkx(graph, index, types)
+
+    extra = []
+    for (u, v, data) in graph.edges(data=True):
+        expected = edge_attributes(schema, data.get('weight', 1))
+        different = dict((key, value) for key, value in data.items() if not key in expected or expected[key] != value)
+        missing = [key for key in expected if not key in data]
+        if different or missing:
+            extra.append([index[u], index[v], different, missing])
+
+    return compact, dict([
+        ('types', types),
+        ('schema', schema),
+        ('extra', extra)
+    ])
+
+
+def edge_attributes(schema, weight):
+    """Returns the attributes of an edge, according to the edge schema of its graph
+
+    Args:
+        schema (dict): Edge schema.
+        weight (float): Edge weight.
+
+    Returns:
+        dict: Attributes.
+
+    """
+    weight = int(weight) if schema.get('integer', False) else weight
+    attributes = dict()
+
+    if 'type' in schema:
+        attributes['type'] = schema['type']
+    if schema.get('value', False):
+        attributes['value'] = weight
+    attributes['weight'] = weight
+    if 'label' in schema:
+        attributes['label'] = schema['label'] + str(weight)
+
+    return attributes
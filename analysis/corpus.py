@@ -0,0 +1,310 @@
+# -*- coding:utf-8 -*-
+
+import itertools
+from array import array
+from collections import deque
+
+import numpy as np
+from scipy import sparse
+
+from .relation import cooccurrence_counts, pointwise_mutual_information_matrix, pointwise_mutual_information_values, prune_pairs
+from .sketch import DEFAULT_SKETCH_DEPTH, sketch_cooccurrence
+
+
+class CorpusStatistics:
+    """
+    Statistics of a recipe corpus, collected in a single pass over the recipes, from which the correlation and substitution edges are derived
+
+    The statistics of disjoint portions of the corpus can be collected separately (e.g. in different processes) and then combined with `merge`, giving the same result as a single collection over the whole corpus.
+    """
+
+    def __init__(self):
+        self.n_recipes = 0
+        # recipe name -> row of the incidence matrix
+        self.recipes = dict()
+        # recipe name -> number of times it was read, only for the recipes read more than once
+        self.entries = dict()
+        # ingredient name -> column of the incidence matrix, in order of first appearance
+        self.ingredients = dict()
+        self.rows = array('i')
+        self.cols = array('i')
+        # De-duplicated substitution relations (frozenset of ingredient names), in order of first appearance, and the rows of the recipes in which each one appears
+        self.substitutions = dict()
+
+        # Number of documents containing each ingredient and each pair of ingredients (see `count`)
+        self.frequency = None
+        self.counts = None
+        # Only for merged statistics: portion from which each incidence entry comes, and whether the counts of recipes repeated in several portions have been corrected
+        self._portions = None
+        self._n_portions = 0
+        self._corrected = True
+
+
+    def add(self, recipe):
+        """Account for a recipe
+
+        Args:
+            recipe (dict): Recipe. The fields are:
+                - name (str): Recipe name.
+                - ingredients (list of dict): List of ingredients. Its fields are:
+                    - name (str): Ingredient name.
+                    - variants (list of int): List of ingredients that can be substituted. The list contains positions within the `ingredients` list.
+
+        """
+        self.n_recipes += 1
+        if recipe['name'] in self.recipes:
+            self.entries[recipe['name']] = self.entries.get(recipe['name'], 1) + 1
+        row = self.recipes.setdefault(recipe['name'], len(self.recipes))
+        ingredients = recipe['ingredients']
+
+        for ingredient in ingredients:
+            self.rows.append(row)
+            self.cols.append(self.ingredients.setdefault(ingredient['name'], len(self.ingredients)))
+        self.frequency = self.counts = None
+
+        for relation in substitution_relations(ingredients):
+            self.substitutions.setdefault(frozenset(relation), set()).add(row)
+
+
+    def merge(self, other):
+        """Accumulate the statistics of another portion of the corpus. The portions are expected to be merged in the order in which they appear in the corpus, so the ingredients keep their order of first appearance.
+
+        A recipe repeated in several portions is a single row of the incidence matrix, as in a single collection. Its contribution to the counts of each portion is replaced by the contribution of the union of its ingredients the next time the counts are requested.
+
+        Args:
+            other (CorpusStatistics): Statistics of the portion. If the first portion merged was counted, the rest are counted if they have not been already; otherwise, none of them is, and the counts are left for when they are requested (see `approximate_correlations`).
+
+        Raises:
+            ValueError: If recipes were added to these statistics with `add`.
+
+        """
+        if self._portions is None:
+            if self.n_recipes > 0:
+                raise ValueError('Statistics collected with `add` cannot be merged into.')
+            self._portions = array('i')
+            if not other.frequency is None:
+                self.frequency = np.zeros(0, dtype=np.int64)
+                self.counts = sparse.coo_matrix((0, 0), dtype=np.int64)
+
+        counted = not self.frequency is None
+        if counted:
+            other_frequency, other_counts = other.cooccurrence()
+        portion = self._n_portions
+        self._n_portions += 1
+
+        for name in other.recipes:
+            if name in self.recipes:
+                self.entries[name] = self.entries.get(name, 1) + other.entries.get(name, 1)
+            elif name in other.entries:
+                self.entries[name] = other.entries[name]
+
+        ingredient_map = np.array([self.ingredients.setdefault(name, len(self.ingredients)) for name in other.ingredients], dtype=np.int64)
+        recipe_map = np.array([self.recipes.setdefault(name, len(self.recipes)) for name in other.recipes], dtype=np.int64)
+        n_ingredients = len(self.ingredients)
+        self.n_recipes += other.n_recipes
+
+        if counted:
+            frequency = np.zeros(n_ingredients, dtype=np.int64)
+            frequency[:len(self.frequency)] = self.frequency
+            frequency[ingredient_map] += other_frequency
+            self.frequency = frequency
+
+            firsts, seconds = ingredient_map[other_counts.row], ingredient_map[other_counts.col]
+            counts = sparse.coo_matrix((self.counts.data, (self.counts.row, self.counts.col)), shape=(n_ingredients, n_ingredients)).tocsr()
+            counts += sparse.coo_matrix((other_counts.data, (np.minimum(firsts, seconds), np.maximum(firsts, seconds))), shape=(n_ingredients, n_ingredients)).tocsr()
+            self.counts = counts.tocoo()
+
+        other_rows = np.frombuffer(other.rows, dtype=np.int32)
+        other_cols = np.frombuffer(other.cols, dtype=np.int32)
+        self.rows.frombytes(recipe_map[other_rows].astype(np.int32).tobytes())
+        self.cols.frombytes(ingredient_map[other_cols].astype(np.int32).tobytes())
+        self._portions.frombytes(np.full(len(other_rows), portion, dtype=np.int32).tobytes())
+        # Without counts, the incidence entries of a repeated recipe fall in the same row, so there is nothing to correct
+        self._corrected = not counted
+
+        for relation, rows in other.substitutions.items():
+            self.substitutions.setdefault(relation, set()).update(recipe_map[list(rows)].tolist())
+
+
+    def count(self):
+        """Count the number of recipes containing each ingredient and each pair of ingredients, and keep the result with the statistics (so it travels with them, see `merge`)
+
+        """
+        self.frequency, self.counts = cooccurrence_counts(self.incidence())
+
+
+    def cooccurrence(self):
+        """Returns the number of recipes containing each ingredient and each pair of ingredients
+
+        Returns:
+            (numpy.ndarray, scipy.sparse.coo_matrix): Number of recipes containing each ingredient, and upper triangle (without the diagonal) of the co-occurrence matrix.
+
+        """
+        if self.frequency is None:
+            self.count()
+        elif not self._corrected:
+            self._correct_repeated_recipes()
+        return self.frequency, self.counts
+
+
+    def incidence(self):
+        """Returns the binary recipe x ingredient incidence matrix
+
+        Returns:
+            scipy.sparse.coo_matrix: Matrix of shape (number of distinct recipes, number of ingredients).
+
+        """
+        rows = np.frombuffer(self.rows, dtype=np.int32)
+        cols = np.frombuffer(self.cols, dtype=np.int32)
+        return sparse.coo_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)), shape=(len(self.recipes), len(self.ingredients)))
+
+
+    def correlations(self, min_support=1, min_npmi=None, top_k=None):
+        """Returns the pointwise mutual information of every pair of ingredients that appear in the same recipe, or of those left by the pruning (see `analysis.relation.prune_pairs`)
+
+        Args:
+            min_support (int, optional): Minimum number of recipes containing a pair. Defaults to 1.
+            min_npmi (float, optional): Minimum normalized PMI of a pair. Defaults to None (no minimum).
+            top_k (int, optional): Number of best pairs kept per ingredient. Defaults to None (every pair).
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray, numpy.ndarray): Column of the first ingredient, column of the second ingredient and PMI value of each pair.
+
+        """
+        frequency, counts = self.cooccurrence()
+        return pointwise_mutual_information_matrix(frequency, counts, self.n_recipes, min_support=min_support, min_npmi=min_npmi, top_k=top_k)
+
+
+    def approximate_correlations(self, memory, min_support=1, min_npmi=None, top_k=None, depth=DEFAULT_SKETCH_DEPTH):
+        """Approximate version of `correlations`, for corpora whose pairs of ingredients cannot be counted exactly in memory. The number of recipes containing each pair is estimated with a count-min sketch, and only the pairs whose estimate reaches `min_support` are kept, at most as many as fit in the memory budget with the sketch, those of highest estimate first (see `analysis.sketch.sketch_cooccurrence` for the error bounds). The counts are not kept with the statistics. The budget bounds the sketch and the pairs kept, but not the incidence matrix (see `incidence`), which is built in full.
+
+        Args:
+            memory (int): Memory of the sketch and of the pairs kept, in bytes.
+            min_support (int, optional): Minimum number of recipes containing a pair. Defaults to 1.
+            min_npmi (float, optional): Minimum normalized PMI of a pair. Defaults to None (no minimum).
+            top_k (int, optional): Number of best pairs kept per ingredient. Defaults to None (every pair).
+            depth (int, optional): Number of rows of the sketch. Defaults to 4.
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, analysis.sketch.CountMinSketch, analysis.sketch.TopPairs): Column of the first ingredient, column of the second ingredient, PMI value and estimated count of each pair, the sketch, and the table of the pairs kept before the pruning.
+
+        """
+        frequency, firsts, seconds, counts, sketch, pairs = sketch_cooccurrence(self.incidence(), memory, min_support, depth)
+
+        keep = prune_pairs(firsts, seconds, counts, frequency[firsts], frequency[seconds], self.n_recipes, min_support, min_npmi, top_k)
+        firsts, seconds, counts = firsts[keep], seconds[keep], counts[keep]
+        return firsts, seconds, pointwise_mutual_information_values(counts, frequency[firsts], frequency[seconds], self.n_recipes), counts, sketch, pairs
+
+
+    def substitution_weights(self):
+        """Returns the substitution weight of every pair of ingredients, that is, the number of distinct substitution relations in which both appear
+
+        Returns:
+            dict((str, str), int): Pairs of ingredients and their weights.
+
+        """
+        weights = dict()
+        for relation in self.substitutions:
+            for pair in itertools.combinations(sorted(relation), 2):
+                weights[pair] = weights.get(pair, 0) + 1
+        return weights
+
+
+    def _correct_repeated_recipes(self):
+        """Replace the contribution of every recipe repeated in several merged portions (one per portion) by the contribution of the union of its ingredients
+
+        """
+        rows = np.frombuffer(self.rows, dtype=np.int32).astype(np.int64)
+        cols = np.frombuffer(self.cols, dtype=np.int32)
+        portions = np.frombuffer(self._portions, dtype=np.int32)
+        n_ingredients = len(self.ingredients)
+
+        # Recipes that appear in more than one portion
+        occurrences = np.unique(rows * self._n_portions + portions)
+        occurrence_rows = occurrences // self._n_portions
+        repeated = np.unique(occurrence_rows[1:][occurrence_rows[1:] == occurrence_rows[:-1]])
+
+        if len(repeated) > 0:
+            mask = np.isin(rows, repeated)
+            rows, cols, portions = rows[mask], cols[mask], portions[mask]
+
+            _, by_occurrence = np.unique(rows * self._n_portions + portions, return_inverse=True)
+            _, by_recipe = np.unique(rows, return_inverse=True)
+            ones = np.ones(len(rows), dtype=np.int64)
+
+            counted_frequency, counted = cooccurrence_counts(sparse.coo_matrix((ones, (by_occurrence, cols)), shape=(by_occurrence.max() + 1, n_ingredients)))
+            actual_frequency, actual = cooccurrence_counts(sparse.coo_matrix((ones, (by_recipe, cols)), shape=(by_recipe.max() + 1, n_ingredients)))
+
+            self.frequency = self.frequency - counted_frequency + actual_frequency
+            counts = self.counts.tocsr() - counted.tocsr() + actual.tocsr()
+            counts.eliminate_zeros()
+            self.counts = counts.tocoo()
+
+        self._corrected = True
+
+
+def substitution_relations(ingredients):
+    """Extract the substitution relations within a recipe: each ingredient with variants forms a relation with them, unless it already belongs to a previous relation
+
+    Args:
+        ingredients (list of dict): Ingredients of the recipe (see `CorpusStatistics.add`).
+
+    Yields:
+        set of str: Names of the ingredients of each relation.
+
+    """
+    mark = [True for _ in range(len(ingredients))]
+    for i in range(len(mark)):
+        substitutions = ingredients[i]['variants']
+
+        if mark[i] and len(substitutions) > 0:
+            relation = set()
+            for j in [i] + substitutions:
+                mark[j] = False
+                relation.add(ingredients[j]['name'])
+            yield relation
+
+
+def collect_statistics(source, count=True):
+    """Collect and count the statistics of a portion of the corpus. It is the task executed by each worker process of a parallel build.
+
+    Args:
+        source (parser.RecipeJSON | list of dict): Portion of the recipes (see `parser.RecipeJSON.get_shards`).
+        count (bool, optional): Whether to count the pairs of ingredients. Defaults to True.
+
+    Returns:
+        (CorpusStatistics, list of dict): Counted statistics of the portion, and its recipes in the order in which they were read.
+
+    """
+    recipes = list(source.get_recipes()) if hasattr(source, 'get_recipes') else source
+    statistics = CorpusStatistics()
+
+    for recipe in recipes:
+        statistics.add(recipe)
+    if count:
+        statistics.count()
+
+    return statistics, recipes
+
+
+def ordered_map(executor, function, iterable, max_pending):
+    """Like `executor.map`, but submitting the tasks lazily, so that at most `max_pending` results are waiting at any time
+
+    Args:
+        executor (concurrent.futures.Executor): Executor of the tasks.
+        function (callable): Task.
+        iterable (iterable): Arguments of the tasks.
+        max_pending (int): Maximum number of submitted tasks whose result has not been returned yet.
+
+    Yields:
+        object: Results of the tasks, in the order of `iterable`.
+
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(function, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
@@ -0,0 +1,190 @@
+# -*- coding:utf-8 -*-
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import svds
+
+# Number of dimensions of the ingredient and recipe vectors
+DEFAULT_EMBEDDING_DIM = 64
+# Number of vectors scored at a time by `Embeddings.nearest`, which bounds the memory of a search
+SEARCH_BLOCK = 1 << 16
+# Above this many candidates per result, the best candidates of a block are selected by partition instead of by sorting them all
+CANDIDATES_PER_RESULT = 8
+
+_VECTOR = np.dtype(np.float32)
+
+
+class Embeddings:
+    """
+    Unit vectors of a set of positions (see `analysis.compact.StringTable`), searched by cosine similarity. `positions` is sorted, and row `i` of `vectors` is the vector of `positions[i]`. Positions without a vector (e.g. an ingredient without correlations) are left out.
+    """
+
+    def __init__(self, positions, vectors):
+        """
+        Args:
+            positions (numpy.ndarray): Sorted positions (int32).
+            vectors (numpy.ndarray): Unit vector of each position, one per row (float32).
+
+        """
+        self.positions = positions
+        self.vectors = vectors
+
+
+    @classmethod
+    def empty(cls, dim=0):
+        return cls(np.zeros(0, dtype=np.int32), np.zeros((0, dim), dtype=_VECTOR))
+
+
+    def __len__(self):
+        return len(self.positions)
+
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+
+    def rows(self, positions):
+        """Returns the row of the vector of each position
+
+        Args:
+            positions (numpy.ndarray): Positions.
+
+        Returns:
+            numpy.ndarray: Rows, -1 for the positions without a vector.
+
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        if len(self.positions) == 0:
+            return np.full(len(positions), -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.positions, positions), len(self.positions) - 1)
+        return np.where(self.positions[rows] == positions, rows, -1)
+
+
+    def nearest(self, queries, k, exclude=None):
+        """Search the vectors most similar to a batch of queries. The vectors are scored a block at a time, with one matrix product per block for the whole batch, and only the best `k` of each query are kept from block to block, so the memory does not depend on the number of vectors.
+
+        Args:
+            queries (numpy.ndarray): Query vectors, one per row.
+            k (int): Number of vectors returned per query.
+            exclude (numpy.ndarray, optional): Row excluded from the results of each query (e.g. the query itself), -1 for none. Defaults to None.
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray): Rows and cosine similarities of the best vectors of each query, one query per row, from most to least similar (ties by position). Rows are -1 where there are fewer than `k` vectors.
+
+        """
+        queries = np.asarray(queries, dtype=_VECTOR)
+        n_queries = len(queries)
+        k = max(0, min(k, len(self.positions)))
+        best_rows = np.full((n_queries, k), -1, dtype=np.int64)
+        best_scores = np.full((n_queries, k), -np.inf, dtype=_VECTOR)
+        if k == 0 or n_queries == 0:
+            return best_rows, best_scores
+
+        exclude = np.full(n_queries, -1, dtype=np.int64) if exclude is None else np.asarray(exclude, dtype=np.int64)
+
+        for start in range(0, len(self.positions), SEARCH_BLOCK):
+            block = self.vectors[start:start + SEARCH_BLOCK]
+            scores = queries @ block.T
+            excluded = (exclude >= start) & (exclude < start + len(block))
+            scores[excluded, exclude[excluded] - start] = -np.inf
+
+            # Only the scores above the worst of the best so far can enter them, which are few once some blocks were read
+            members, cols = np.nonzero(scores > best_scores.min(axis=1)[:, None])
+            if len(cols) > CANDIDATES_PER_RESULT * k * n_queries:
+                top = np.argpartition(scores, len(block) - k, axis=1)[:, -k:] if len(block) > k else np.broadcast_to(np.arange(len(block)), (n_queries, len(block)))
+                members, cols = np.repeat(np.arange(n_queries), top.shape[1]), top.ravel()
+
+            # Best `k` of each query among the best so far and the candidates of the block
+            members = np.concatenate([np.repeat(np.arange(n_queries), k), members])
+            rows = np.concatenate([best_rows.ravel(), cols + start])
+            candidates = np.concatenate([best_scores.ravel(), scores[members[n_queries * k:], cols]])
+            order = np.lexsort((-candidates, members))
+            counts = np.bincount(members, minlength=n_queries)
+            rank = np.arange(len(order)) - np.repeat(np.cumsum(counts) - counts, counts)
+            order = order[rank < k]
+            best_rows, best_scores = rows[order].reshape(n_queries, k), candidates[order].reshape(n_queries, k)
+
+        best_rows[np.isneginf(best_scores)] = -1
+        # Ties are broken by position, and the missing vectors go last
+        positions = np.where(best_rows >= 0, self.positions[np.maximum(best_rows, 0)], np.iinfo(np.int64).max)
+        order = np.lexsort((positions, -best_scores), axis=1)
+        batch = np.arange(n_queries)[:, None]
+        return best_rows[batch, order], best_scores[batch, order]
+
+
+    def arrays(self, prefix):
+        return dict([
+            (prefix + 'positions', self.positions),
+            (prefix + 'vectors', self.vectors)
+        ])
+
+
+def factorize(positions, firsts, seconds, values, dim=DEFAULT_EMBEDDING_DIM, seed=0):
+    """Vectors of a set of tokens, from the truncated singular value decomposition of their positive PMI matrix
+
+        M ~ U S V^T, with M[x, y] = max(PMI(x, y), 0)
+
+    The vector of a token is its row of `U sqrt(S)`, normalized, so two tokens have similar vectors when they are correlated with the same tokens, even if they never appear together. Only the stored pairs are read, so the cost depends on the number of correlated pairs, and not on the square of the number of tokens.
+
+    Args:
+        positions (numpy.ndarray): Sorted positions of the tokens.
+        firsts (numpy.ndarray): First token of each pair (position).
+        seconds (numpy.ndarray): Second token of each pair (position). Each pair is expected once.
+        values (numpy.ndarray): PMI of each pair.
+        dim (int, optional): Number of dimensions. It is reduced to the number of tokens minus one if needed. Defaults to 64.
+        seed (int, optional): Seed of the starting vector of the decomposition, so it is deterministic. Defaults to 0.
+
+    Returns:
+        Embeddings: Vectors of the tokens with some positive PMI.
+
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    n_tokens = len(positions)
+    keep = values > 0
+    rows, cols, values = np.searchsorted(positions, firsts[keep]), np.searchsorted(positions, seconds[keep]), values[keep]
+
+    k = min(dim, n_tokens - 1)
+    if k < 1 or len(values) == 0:
+        return Embeddings.empty(max(k, 0))
+
+    matrix = sparse.coo_matrix((np.concatenate([values, values]), (np.concatenate([rows, cols]), np.concatenate([cols, rows]))), shape=(n_tokens, n_tokens)).tocsr()
+    v0 = np.random.default_rng(seed).uniform(-1, 1, n_tokens)
+    u, s, _ = svds(matrix.astype(np.float64), k=k, v0=v0)
+    # Greatest singular values first
+    order = np.argsort(-s, kind='stable')
+    vectors = u[:, order] * np.sqrt(s[order])
+
+    return _normalized(positions, vectors)
+
+
+def aggregate(embeddings, groups, members):
+    """Vectors of groups of tokens (e.g. recipes), as the normalized mean of the vectors of their tokens (e.g. ingredients). It is a single sparse-dense product, so it scales to millions of groups.
+
+    Args:
+        embeddings (Embeddings): Vectors of the tokens.
+        groups (numpy.ndarray): Group of each membership (position).
+        members (numpy.ndarray): Token of each membership (position). Tokens without a vector are ignored.
+
+    Returns:
+        Embeddings: Vectors of the groups with some token with a vector.
+
+    """
+    rows = embeddings.rows(members)
+    keep = rows >= 0
+    groups, rows = np.asarray(groups, dtype=np.int64)[keep], rows[keep]
+    if len(rows) == 0:
+        return Embeddings.empty(embeddings.dim)
+
+    positions, group_rows = np.unique(groups, return_inverse=True)
+    incidence = sparse.csr_matrix((np.ones(len(rows), dtype=_VECTOR), (group_rows, rows)), shape=(len(positions), len(embeddings)))
+    incidence.sum_duplicates()
+    incidence.data[:] = 1
+    return _normalized(positions, incidence @ np.asarray(embeddings.vectors, dtype=_VECTOR))
+
+
+def _normalized(positions, vectors):
+    norms = np.linalg.norm(vectors, axis=1)
+    keep = norms > 1e-12
+    vectors = (vectors[keep] / norms[keep, None]).astype(_VECTOR)
+    return Embeddings(positions[keep].astype(np.int32), np.ascontiguousarray(vectors))
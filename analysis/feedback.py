@@ -0,0 +1,187 @@
+# -*- coding:utf-8 -*-
+
+import json
+import os
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+JOURNAL_EXTENSION = '.journal'
+LOCK_EXTENSION = '.lock'
+# Compacted file that already includes the journal, until the journal is removed (see `_compact`)
+PENDING_EXTENSION = '.pending'
+# Size of the journal, in bytes, from which it is folded into the compacted file
+COMPACTION_THRESHOLD = 1 << 20
+
+
+class SubstitutionFeedback:
+    """
+    Store of the substitutions suggested by the users. Every suggestion is appended as one line to a journal, so concurrent writers never rewrite each other's votes. From time to time the journal is folded into the compacted file, a JSON object of the form `{ingredient: {substitute: votes}}`, and started again under a new generation identifier.
+
+    Writers and the compaction hold an exclusive lock on a sidecar `.lock` file (on platforms without `fcntl`, only the atomicity of appends is relied upon). The compaction is atomic with respect to the journal: if it is interrupted, the next operation either finishes it or finds it never happened, so no vote is ever counted twice.
+    """
+
+    def __init__(self, fpath, compaction_threshold=COMPACTION_THRESHOLD):
+        """
+        Args:
+            fpath (str): Path of the compacted JSON file. The journal and the lock file are created next to it.
+            compaction_threshold (int, optional): Size of the journal, in bytes, from which `record` compacts it. Defaults to 1 MiB.
+
+        """
+        self.fpath = fpath
+        self.journal = fpath + JOURNAL_EXTENSION
+        self.pending = fpath + PENDING_EXTENSION
+        self.compaction_threshold = compaction_threshold
+
+
+    @contextmanager
+    def _lock(self):
+        with open(self.fpath + LOCK_EXTENSION, 'a') as f:
+            if not fcntl is None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if not fcntl is None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+
+    def record(self, ingredient, substitutions):
+        """Append the vote of a user: `ingredient` can be substituted by each of `substitutions`
+
+        Args:
+            ingredient (str): Ingredient name.
+            substitutions (list of str): Names of the substitutes.
+
+        """
+        line = json.dumps(dict([('ingredient', ingredient), ('substitutions', list(substitutions))])) + '\n'
+
+        with self._lock():
+            self._finish_compaction()
+            self._start_journal()
+            # A single write on a file opened in append mode, so the line is never interleaved with others
+            fd = os.open(self.journal, os.O_WRONLY | os.O_APPEND)
+            try:
+                os.write(fd, line.encode('utf8'))
+            finally:
+                os.close(fd)
+
+            if os.path.getsize(self.journal) >= self.compaction_threshold:
+                self._compact()
+
+
+    def compact(self):
+        """Fold the journal into the compacted file
+
+        """
+        with self._lock():
+            self._finish_compaction()
+            self._compact()
+
+
+    def totals(self):
+        """Returns all the votes
+
+        Returns:
+            dict((str, str), int): Votes of every (ingredient, substitute) pair.
+
+        """
+        votes, _, _ = self.changes()
+        return votes
+
+
+    def changes(self, cursor=None):
+        """Returns the votes recorded since a previous call
+
+        Args:
+            cursor (tuple, optional): Cursor returned by a previous call. Defaults to None.
+
+        Returns:
+            (dict((str, str), int), tuple, bool): Votes of every (ingredient, substitute) pair, cursor for the next call, and whether the votes are all the votes (the first time, or when the journal was compacted after the previous call) instead of only the new ones.
+
+        """
+        with self._lock():
+            self._finish_compaction()
+            generation, offset, votes = None, 0, dict()
+
+            if os.path.isfile(self.journal):
+                with open(self.journal, 'rb') as f:
+                    generation = json.loads(f.readline())['generation']
+                    offset = f.tell()
+
+            complete = cursor is None or cursor[0] != generation
+            if complete:
+                votes = self._read_compacted()
+            else:
+                offset = cursor[1]
+
+            if not generation is None:
+                with open(self.journal, 'rb') as f:
+                    f.seek(offset)
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            break
+                        self._count(json.loads(line), votes)
+                        offset += len(line)
+
+        return votes, (generation, offset), complete
+
+
+    def _start_journal(self):
+        if not os.path.isfile(self.journal):
+            with open(self.journal, 'w', encoding='utf8') as f:
+                f.write(json.dumps(dict([('generation', uuid.uuid4().hex)])) + '\n')
+
+
+    def _read_compacted(self):
+        votes = dict()
+        if os.path.isfile(self.fpath):
+            with open(self.fpath, 'r', encoding='utf8') as f:
+                for ingredient, substitutes in json.load(f).items():
+                    for substitute, count in substitutes.items():
+                        votes[(ingredient, substitute)] = count
+        return votes
+
+
+    def _count(self, entry, votes):
+        for substitute in entry['substitutions']:
+            pair = (entry['ingredient'], substitute)
+            votes[pair] = votes.get(pair, 0) + 1
+
+
+    def _compact(self):
+        votes = self._read_compacted()
+        if os.path.isfile(self.journal):
+            with open(self.journal, 'rb') as f:
+                f.readline()
+                for line in f:
+                    if line.endswith(b'\n'):
+                        self._count(json.loads(line), votes)
+
+        compacted = dict()
+        for (ingredient, substitute), count in votes.items():
+            compacted.setdefault(ingredient, dict())[substitute] = count
+
+        # Once the pending file is in place, the journal is part of it: the compaction is finished from there, now or by the next operation
+        temporary = self.fpath + '.tmp'
+        with open(temporary, 'w', encoding='utf8') as f:
+            json.dump(compacted, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.pending)
+        self._finish_compaction()
+
+
+    def _finish_compaction(self):
+        """Finish a compaction whose pending file is in place: remove the journal it includes, and make it the compacted file
+
+        """
+        if not os.path.isfile(self.pending):
+            return
+        if os.path.isfile(self.journal):
+            os.remove(self.journal)
+        os.replace(self.pending, self.fpath)
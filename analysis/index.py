@@ -0,0 +1,281 @@
+# -*- coding:utf-8 -*-
+
+import numpy as np
+
+# Kind of node of each position, in the recipe-ingredient relationship graph
+NO_NODE = 0
+RECIPE = 1
+INGREDIENT = 2
+
+
+class PostingIndex:
+    """
+    Inverted index ingredient -> recipes. The posting list of an ingredient is the sorted array of the positions (see `analysis.compact.StringTable`) of the recipes that contain it.
+
+    The lists are extracted once from the arrays of the relationship graph. The lists of the nodes changed afterwards are read from the overlay of the graph instead, and the recipes whose ingredients changed are expected to be reported with `refresh`.
+    """
+
+    def __init__(self, graph, kinds):
+        """Extract the posting lists from the recipe-ingredient relationship graph
+
+        Args:
+            graph (analysis.compact.CSRGraph): Recipe-ingredient relationship graph.
+            kinds (numpy.ndarray): Kind of node of each position: `NO_NODE`, `RECIPE` or `INGREDIENT` (uint8).
+
+        """
+        self.graph = graph
+        self.kinds = np.array(kinds, dtype=np.uint8)
+        is_recipe = self.kinds == RECIPE
+
+        keep = is_recipe[graph.indices]
+        kept = np.zeros(len(keep) + 1, dtype=np.int64)
+        np.cumsum(keep, out=kept[1:])
+
+        self.indptr = kept[graph.indptr]
+        self.indices = graph.indices[keep]
+
+        # Number of ingredients of each recipe, and the recipes sorted by it
+        ingredients = np.zeros(len(keep) + 1, dtype=np.int64)
+        np.cumsum(~keep, out=ingredients[1:])
+        self.sizes = np.zeros(len(self.kinds), dtype=np.int64)
+        self.sizes[:len(graph.indptr) - 1] = np.diff(ingredients[graph.indptr])
+        self.sizes[~is_recipe] = 0
+
+        recipes = np.flatnonzero(is_recipe & (self.sizes > 0))
+        self.by_size = recipes[np.argsort(self.sizes[recipes], kind='stable')]
+        self.sorted_sizes = self.sizes[self.by_size]
+        # Recipes whose number of ingredients may differ from the one in `by_size`
+        self._resized = set()
+
+
+    def grow(self, n_positions):
+        """Make room for new positions, with no kind of node
+
+        Args:
+            n_positions (int): Number of positions of the string table.
+
+        """
+        if n_positions > len(self.kinds):
+            self.kinds = np.concatenate([self.kinds, np.zeros(n_positions - len(self.kinds), dtype=np.uint8)])
+            self.sizes = np.concatenate([self.sizes, np.zeros(n_positions - len(self.sizes), dtype=np.int64)])
+
+
+    def refresh(self, recipe):
+        """Account for a change in the ingredients of a recipe, or in its kind of node
+
+        Args:
+            recipe (int): Recipe.
+
+        """
+        ingredients, _ = self.graph.neighbors(recipe)
+        self.sizes[recipe] = np.count_nonzero(self.kinds[ingredients] != RECIPE) if self.kinds[recipe] == RECIPE else 0
+        self._resized.add(recipe)
+
+
+    def postings(self, position):
+        """Returns the posting list of an ingredient
+
+        Args:
+            position (int): Ingredient.
+
+        Returns:
+            numpy.ndarray: Sorted recipes.
+
+        """
+        if self.graph.is_modified(position) or position >= len(self.indptr) - 1:
+            neighbors, _ = self.graph.neighbors(position)
+            return neighbors[self.kinds[neighbors] == RECIPE]
+        return self.indices[self.indptr[position]:self.indptr[position + 1]]
+
+
+    def frequency(self):
+        """Returns the number of recipes that contain each ingredient
+
+        Returns:
+            numpy.ndarray: Number of recipes of every position (int64).
+
+        """
+        frequency = np.zeros(len(self.kinds), dtype=np.int64)
+        frequency[:len(self.indptr) - 1] = np.diff(self.indptr)
+        for position in self.graph.modified():
+            frequency[position] = len(self.postings(position))
+        return frequency
+
+
+    def intersection(self, positions):
+        """Returns the recipes that contain all the ingredients. The posting lists are intersected from the shortest one, so the cost is bounded by the shortest list.
+
+        Args:
+            positions (list of int): Ingredients.
+
+        Returns:
+            numpy.ndarray: Sorted recipes.
+
+        """
+        if len(positions) == 0:
+            return np.zeros(0, dtype=np.int32)
+
+        lists = sorted((self.postings(position) for position in set(positions)), key=len)
+        result = lists[0]
+        for postings in lists[1:]:
+            if len(result) == 0:
+                break
+            result = np.intersect1d(result, postings, assume_unique=True)
+
+        return result
+
+
+    def overlap(self, positions, limit=None):
+        """Returns the recipes that contain any of the ingredients, ranked by the number of them they contain. Ties are broken by position, that is, by the order in which the recipes were added to the model.
+
+        Args:
+            positions (list of int): Ingredients.
+            limit (int, optional): Maximum number of recipes. Only the best ones are selected and sorted. Defaults to None (all of them).
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray): Recipes and number of ingredients that each one contains.
+
+        """
+        lists = [self.postings(position) for position in set(positions)]
+        if len(lists) == 0:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64)
+
+        recipes, counts = np.unique(np.concatenate(lists), return_counts=True)
+
+        # Greater count first and, among equal counts, smaller position first
+        n_positions = len(self.kinds)
+        keys = counts.astype(np.int64) * n_positions + (n_positions - 1 - recipes)
+        if limit is not None and limit < len(keys):
+            selected = np.argpartition(-keys, limit)[:limit]
+            selected = selected[np.argsort(-keys[selected])]
+        else:
+            selected = np.argsort(-keys, kind='stable')
+
+        return recipes[selected], counts[selected]
+
+
+    def makeable(self, positions, max_missing=0, limit=None):
+        """Returns the recipes that lack at most `max_missing` of their ingredients, given the available ones. Only the recipes that contain some available ingredient, and those with at most `max_missing` ingredients, are evaluated.
+
+        Args:
+            positions (list of int): Available ingredients.
+            max_missing (int, optional): Maximum number of missing ingredients. Defaults to 0.
+            limit (int, optional): Maximum number of recipes. Defaults to None (all of them).
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray): Recipes and number of missing ingredients of each one, sorted by fewest missing ingredients, then by most available ingredients used, then by position.
+
+        """
+        lists = [self.postings(position) for position in set(positions)]
+        if len(lists) > 0:
+            recipes, hits = np.unique(np.concatenate(lists), return_counts=True)
+        else:
+            recipes, hits = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64)
+
+        missing = self.sizes[recipes] - hits
+        keep = missing <= max_missing
+        recipes, hits, missing = recipes[keep], hits[keep], missing[keep]
+
+        # Recipes so small that they can be made without any available ingredient
+        small = self.by_size[:np.searchsorted(self.sorted_sizes, max_missing, side='right')]
+        if self._resized:
+            resized = np.array(sorted(self._resized), dtype=np.int64)
+            small = np.setdiff1d(small, resized, assume_unique=True)
+            sizes = self.sizes[resized]
+            small = np.concatenate([small, resized[(self.kinds[resized] == RECIPE) & (sizes > 0) & (sizes <= max_missing)]])
+        small = np.setdiff1d(small, recipes, assume_unique=True)
+        recipes = np.concatenate([recipes, small])
+        hits = np.concatenate([hits, np.zeros(len(small), dtype=np.int64)])
+        missing = np.concatenate([missing, self.sizes[small]])
+
+        order = np.lexsort((recipes, -hits, missing))[:limit]
+        return recipes[order], missing[order]
+
+
+class LabelView:
+    """
+    Labels of the nodes of one kind, sorted. The label of the i-th node, and the position of a label, are found in constant time.
+    """
+
+    def __init__(self, strings, positions):
+        """
+        Args:
+            strings (analysis.compact.StringTable): Labels of all the positions.
+            positions (numpy.ndarray): Positions of the nodes, sorted by label.
+
+        """
+        self.strings = strings
+        self.positions = positions
+        self._labels = None
+        self._index = None
+
+
+    @classmethod
+    def of_kind(cls, strings, kinds, kind):
+        """Select the nodes of one kind
+
+        Args:
+            strings (analysis.compact.StringTable): Labels of all the positions.
+            kinds (numpy.ndarray): Kind of node of each position (see `PostingIndex`).
+            kind (int): Kind of the nodes to select.
+
+        Returns:
+            LabelView: View.
+
+        """
+        stored = len(strings.order)
+        positions = strings.order[kinds[strings.order] == kind]
+
+        # Strings appended to the table are not in its sorted order
+        appended = np.flatnonzero(kinds[stored:] == kind) + stored
+        if len(appended) > 0:
+            positions = np.array(sorted(np.concatenate([positions, appended]).tolist(), key=strings.__getitem__), dtype=np.int32)
+
+        return cls(strings, positions)
+
+
+    @property
+    def labels(self):
+        """list of str: Sorted labels, decoded on first access.
+        """
+        if self._labels is None:
+            self._labels = [self.strings[position] for position in self.positions.tolist()]
+        return self._labels
+
+
+    def __len__(self):
+        return len(self.positions)
+
+
+    def __getitem__(self, i):
+        return self.labels[i]
+
+
+    def __iter__(self):
+        return iter(self.labels)
+
+
+    def __contains__(self, label):
+        return label in self._label_index()
+
+
+    def position(self, label):
+        """Returns the position of a label
+
+        Args:
+            label (str): Label.
+
+        Raises:
+            KeyError: If no node of the view has the label.
+
+        Returns:
+            int: Position.
+
+        """
+        return self._label_index()[label]
+
+
+    def _label_index(self):
+        if self._index is None:
+            self._index = dict(zip(self.labels, self.positions.tolist()))
+        return self._index
@@ -3,52 +3,193 @@
 from os import path
 import itertools
 import datetime
+import threading
+import time
+from functools import partial
 import networkx as nx
-import random as rnd
+import numpy as np
+from scipy import sparse
 
-from .relation import pointwise_mutual_information
+from concurrent.futures import ProcessPoolExecutor
+
+from .cache import DEFAULT_CACHE_SIZE, QueryCache, cached_query
+from .compact import CompactModel, CSRGraph, LazyGraphs, RankedLists, StringTable, compact_networkx, edge_attributes
+from .corpus import CorpusStatistics, collect_statistics, ordered_map, substitution_relations
+from .embedding import DEFAULT_EMBEDDING_DIM, aggregate, factorize
+from .index import LabelView, PostingIndex, NO_NODE, RECIPE, INGREDIENT
+from .manifest import content_key, file_digest, read_manifest, write_manifest
+from .metrics import DISABLED
+from .relation import cooccurrence_counts, distributional_substitutes, pointwise_mutual_information_values, prune_pairs
+from .search import DEFAULT_SEARCH_LIMIT, SearchIndex
 from .error import *
 
 from parser import RecipeJSON
+from parser.json_recipe import JSON_LINES_EXTENSIONS
 from pprint import pprint
 
-INGREDIENT_SUBSTITUTION_GRAPH_FILE = 'ingredient_substitution_graph.graphml'
-INGREDIENT_CORRELATION_GRAPH_FILE = 'ingredient_correlation_graph.graphml'
-RECIPE_INGREDIENT_RELATIONSHIP_GRAPH_FILE = 'recipe_ingredient_relationship_graph.graphml'
+INGREDIENT_SUBSTITUTION_GRAPH = 'ingredient_substitution_graph'
+INGREDIENT_CORRELATION_GRAPH = 'ingredient_correlation_graph'
+RECIPE_INGREDIENT_RELATIONSHIP_GRAPH = 'recipe_ingredient_relationship_graph'
+# Substitutions inferred from the recipes (see `_infer_substitutions`), kept apart from the curated ones of the substitution graph. It is stored with the model, but not exported.
+INGREDIENT_INFERRED_SUBSTITUTION_GRAPH = 'ingredient_inferred_substitution_graph'
+# Number of recipes that contain each pair of ingredients. It is stored with the model, but not exported, so the correlations can be updated (see `add_recipes`)
+INGREDIENT_COOCCURRENCE_GRAPH = 'ingredient_cooccurrence_graph'
+
+INGREDIENT_SUBSTITUTION_GRAPH_FILE = INGREDIENT_SUBSTITUTION_GRAPH + '.graphml'
+INGREDIENT_CORRELATION_GRAPH_FILE = INGREDIENT_CORRELATION_GRAPH + '.graphml'
+RECIPE_INGREDIENT_RELATIONSHIP_GRAPH_FILE = RECIPE_INGREDIENT_RELATIONSHIP_GRAPH + '.graphml'
+MODEL_FILE = 'model.snapshot'
+# Digest of the inputs of the stored model and key of each of its artifacts, so the next construction reuses what did not change (see `_reuse_model`)
+BUILD_MANIFEST_FILE = 'build.json'
+
+# Best substitutes of every ingredient, precomputed (see `replace_ingredient`)
+SUBSTITUTION_CANDIDATES = 'substitution_candidates'
+MAX_SUBSTITUTION_CANDIDATES = 32
+
+RECIPE_NODE_TYPE = 'recipe_name'
+INGREDIENT_NODE_TYPE = 'ingredient_name'
+
+# Ingredient fields kept as attributes of the belonging edges
+BELONGING_EDGE_ATTRIBUTES = ['opcional', 'cantidad', 'unidad', 'forma']
+
+# How the edge attributes of each graph derive from the edge weight (see `CompactModel`)
+EDGE_SCHEMAS = dict([
+    (INGREDIENT_SUBSTITUTION_GRAPH, dict(type='ingredient-ingredient substitution', label='i-i s: ', integer=True)),
+    (INGREDIENT_CORRELATION_GRAPH, dict(type='ingredient-ingredient correlation', label='i-i c: ', value=True)),
+    (INGREDIENT_INFERRED_SUBSTITUTION_GRAPH, dict(type='ingredient-ingredient inferred substitution', label='i-i is: ', value=True)),
+    (RECIPE_INGREDIENT_RELATIONSHIP_GRAPH, dict(integer=True)),
+    (INGREDIENT_COOCCURRENCE_GRAPH, dict(integer=True))
+])
+
+# Options of the pruning of the correlation graph, kept in its metadata so the updates apply the same pruning (see `analysis.relation.prune_pairs`). By default, every pair of ingredients that appear in the same recipe is related.
+CORRELATION_PRUNING = 'pruning'
+DEFAULT_PRUNING = dict([('min_support', 1), ('min_npmi', None), ('top_k', None)])
+
+# Estimation of the co-occurrence counts with a count-min sketch, kept in the metadata of the correlation graph (see `CorpusStatistics.approximate_correlations`)
+CORRELATION_SKETCH = 'sketch'
+
+# Options of the inference of substitutions, kept in the metadata of the inferred substitution graph so it is inferred again in the same way after the updates (see `analysis.relation.distributional_substitutes`)
+SUBSTITUTION_INFERENCE = 'inference'
+DEFAULT_INFERENCE = dict([('contexts', 50), ('min_similarity', 0.3), ('max_cooccurrence', 0.05), ('top_k', 10), ('min_docs', 5)])
+
+# Vectors of the ingredients, from the factorization of their PMI matrix, and of the recipes, from those of their ingredients (see `similar_recipes`). The number of dimensions is kept in the metadata of the correlation graph.
+INGREDIENT_EMBEDDINGS = 'ingredient_embeddings'
+RECIPE_EMBEDDINGS = 'recipe_embeddings'
+EMBEDDING_DIM = 'embedding_dim'
+# Number of similar recipes or ingredients returned by default
+DEFAULT_SIMILAR_LIMIT = 10
+
+# Number of shards of the recipes, per process, in a parallel build
+SHARDS_PER_WORKER = 4
+
+
+def _graph_property(name):
+    """Attribute that holds one of the model graphs as a `networkx.Graph`. When the model was loaded from a snapshot, the graph is produced on first access.
+    """
+    def getter(self):
+        if not name in self._graphs:
+            # The graphs imported from GraphML files keep the NetworkX graph they were read from (see `_import_graphml`)
+            self._model.graphs[name]
+        if not name in self._graphs:
+            if name == INGREDIENT_CORRELATION_GRAPH and self._stale_correlations:
+                self._refresh_correlations()
+            self._graphs[name] = self._model.to_networkx(name)
+        return self._graphs[name]
+    
+    def setter(self, graph):
+        self._graphs[name] = graph
+        
+    return property(getter, setter)
 
 
 class FoodGraph():
     
-    def __init__(self, graphs_path=None, recipes_path=None, save_path='data/graphs/'):
+    ingredient_substitution_graph = _graph_property(INGREDIENT_SUBSTITUTION_GRAPH)
+    ingredient_correlation_graph = _graph_property(INGREDIENT_CORRELATION_GRAPH)
+    recipe_ingredient_relationship_graph = _graph_property(RECIPE_INGREDIENT_RELATIONSHIP_GRAPH)
+    
+    def __init__(self, graphs_path=None, recipes_path=None, save_path='data/graphs/', workers=1, cache_size=DEFAULT_CACHE_SIZE, cache_ttl=None, metrics=None, min_support=1, min_npmi=None, top_k=None, sketch_memory_mb=None, prune_counts=False, embedding_dim=DEFAULT_EMBEDDING_DIM, infer_substitutions=False, prefetch=False, reuse=False):
         """
         Load into memory or build the model (graph)
         
         Args:
-            - graphs_path (str, optional): Path of the folder that contains the graphs. The `ingredient_substitution_graph.graphml`, `ingredient_correlation_graph.graphml` and `recipe_ingredient_relationship_graph.graphml` files are expected to exist inside the folder. Defaults to None.
+            - graphs_path (str, optional): Path of the folder that contains the model. The `model.snapshot` file, or else the `ingredient_substitution_graph.graphml`, `ingredient_correlation_graph.graphml` and `recipe_ingredient_relationship_graph.graphml` files, are expected to exist inside the folder. Defaults to None.
             - recipes_csv_path (str, optional): Path of the file in json format, with the information of the recipes. Defaults to None.
             - save_path (str, optional): If recipes_csv_path is non-null, it indicates the folder where the model will be stored. Defaults to 'data/'.
+            - workers (int, optional): If recipes_path is non-null, number of processes among which the construction of the model is distributed. Defaults to 1.
+            - cache_size (int, optional): Maximum number of query results kept in the query cache (see `cache_stats`). 0 disables the cache. Defaults to 1024.
+            - cache_ttl (float, optional): Time after which a cached query result expires, in seconds. Defaults to None (never).
+            - metrics (analysis.metrics.Metrics, optional): Instrumentation of the construction, loading and queries of the model: phase timers, counters and query latencies. Defaults to None (not instrumented).
+            - min_support (int, optional): If recipes_path is non-null, minimum number of recipes in which two ingredients must appear together to be correlated. Defaults to 1.
+            - min_npmi (float, optional): If recipes_path is non-null, minimum normalized PMI (between -1 and 1) of two correlated ingredients. Defaults to None (no minimum).
+            - top_k (int, optional): If recipes_path is non-null, maximum number of correlations kept per ingredient: a pair is kept if it is among the `top_k` of highest normalized PMI of both ingredients, so the correlation graph has at most `top_k` edges per ingredient. Defaults to None (every correlation). See `analysis.relation.prune_pairs`.
+            - sketch_memory_mb (float, optional): If recipes_path is non-null, build the correlations in approximate mode: the number of recipes of each pair of ingredients is estimated with a count-min sketch instead of being counted exactly, and of the pairs whose estimate reaches `min_support`, only those of highest estimate that fit are kept. This many megabytes are split between the counters of the sketch and the pairs kept, so neither grows with the corpus; the recipe x ingredient incidence matrix is still built in full (see `analysis.sketch.sketch_cooccurrence` for the error bounds, and the `sketch` metadata of the correlation graph for whether pairs were left out). Defaults to None (exact counts).
+            - prune_counts (bool, optional): If recipes_path is non-null, store the co-occurrence counts of the pairs kept by the pruning only, instead of those of every pair. The pruning options then reduce the stored model, and not only the correlation graph, but the updates are no longer exact (a pruned pair never comes back, see `add_recipes`), and the substitutions are inferred from the kept pairs. Always the case in approximate mode. Defaults to False.
+            - embedding_dim (int, optional): If recipes_path is non-null, number of dimensions of the vectors of the ingredients and recipes (see `similar_recipes`). Defaults to 64.
+            - infer_substitutions (bool, optional): If recipes_path is non-null, infer substitutions from the recipes, for the corpora whose recipes have no substitution variants (see `_infer_substitutions`). Defaults to False.
+            - prefetch (bool, optional): If graphs_path is non-null, start reading every graph of the model in background threads once it is loaded. Otherwise each graph is read on first access. Either way, loading the model only waits for the recipe-ingredient relationship graph, which the query indexes need (see `load_stats`). Defaults to False.
+            - reuse (bool, optional): If recipes_path is non-null, reuse the model stored in save_path if it was built from the same recipes, and rebuild only the artifacts whose options changed (see `_reuse_model`). Defaults to False.
             
         Raise:
-            - ValueError: The path of these files has a null value. The `graphs_path` or `recipes_path` parameter must have a value.
+            - ValueError: The path of these files has a null value. The `graphs_path` or `recipes_path` parameter must have a value. Or the pruning options or the number of dimensions are out of range.
             
         """ 
+        self._graphs = dict()
+        self._model = None
+        self._postings = None
+        # Number of changes made to the model. The cached query results of previous versions are discarded.
+        self.version = 0
+        self._cache = QueryCache(cache_size, cache_ttl)
+        self.metrics = DISABLED if metrics is None else metrics
+        # Votes of the substitution feedback already folded into the model (see `apply_substitution_feedback`)
+        self._feedback_cursor = None
+        self._feedback_votes = dict()
+        # Held from reading the cursor to folding the votes, so concurrent callers never fold the same votes twice
+        self._feedback_lock = threading.Lock()
+        # Substitution relations (ingredients -> recipes in which they appear), relations of each recipe, and number of times each repeated recipe was read. Read from the model metadata on first update (see `_load_update_statistics`)
+        self._relations = None
+        self._recipe_relations = None
+        self._entries = None
+        # Whether the correlation values must be recomputed from the co-occurrence counts (see `add_recipes`), and the number of recipes of each ingredient to recompute them
+        self._stale_correlations = False
+        self._frequency = None
+        # Whether the inferred substitutions must be inferred again, when the model is stored
+        self._stale_inferred = False
+        # Sorted labels of the recipes and of the ingredients, by kind of node (see `recipes` and `ingredients`), and their search indexes (see `search_recipes` and `search_ingredients`)
+        self._views = dict()
+        self._search_indexes = dict()
+        # Artifacts produced by the construction of the model, by name (see `_artifact_keys`). None if the model was loaded.
+        self.rebuilt = None
+        
         if graphs_path is None and recipes_path is None:
             raise ValueError('Both parameters (graphs_path, recipes_csv_path) have null value. Unable to build or load model.')
         elif not graphs_path is None:
-            self._load_model(graphs_path) 
+            self._load_model(graphs_path, prefetch)
         else: 
-            self._build_model(recipes_path, save_path)
+            if min_support < 1 or (not top_k is None and top_k < 1) or (not min_npmi is None and not -1 <= min_npmi <= 1):
+                raise ValueError('Invalid pruning of the correlations: `min_support` and `top_k` must be at least 1, and `min_npmi` between -1 and 1.')
+            if not sketch_memory_mb is None and sketch_memory_mb <= 0:
+                raise ValueError('The memory of the sketch (`sketch_memory_mb`) must be positive.')
+            if embedding_dim < 1:
+                raise ValueError('The number of dimensions of the vectors (`embedding_dim`) must be at least 1.')
+            pruning = dict([('min_support', int(min_support)), ('min_npmi', None if min_npmi is None else float(min_npmi)), ('top_k', None if top_k is None else int(top_k))])
+            if not sketch_memory_mb is None:
+                pruning['sketch_memory'] = int(sketch_memory_mb * (1 << 20))
+            if prune_counts:
+                pruning['prune_counts'] = True
+            self._build_model(recipes_path, save_path, workers, pruning, int(embedding_dim), dict(DEFAULT_INFERENCE) if infer_substitutions else None, reuse)
             
             
     ###################
     ### DATA UPLOAD ###
     ###################
     
-    def _load_model(self, graphs_path):
-        """Load graphs from a containing folder
+    def _load_model(self, graphs_path, prefetch=False):
+        """Load the model from a containing folder. The snapshot is memory-mapped, and the NetworkX graphs are only produced if they are accessed. If there is no snapshot, the graphs are imported from the GraphML files. Either way, each graph is loaded on first access, except the recipe-ingredient relationship graph, which the query indexes need (see `analysis.compact.LazyGraphs`).
 
         Args:
-            - graphs_path (str): Path of the folder that contains the graphs. The `ingredient_substitution_graph.graphml`, `ingredient_correlation_graph.graphml` and `recipe_ingredient_relationship_graph.graphml` files are expected to exist inside the folder.
+            - graphs_path (str): Path of the folder that contains the model. The `model.snapshot` file, or else the `ingredient_substitution_graph.graphml`, `ingredient_correlation_graph.graphml` and `recipe_ingredient_relationship_graph.graphml` files, are expected to exist inside the folder.
+            - prefetch (bool, optional): Whether to start reading the other graphs in background threads. Defaults to False.
             
         Raises:
             - NotADirectoryError: If the folder path (parameter) does not exist.
@@ -58,42 +199,241 @@ class FoodGraph():
         if not path.isdir(graphs_path):
             raise NotADirectoryError('Path folder `' + graphs_path + '` does not exist.')
         
-        file = path.join(graphs_path, INGREDIENT_SUBSTITUTION_GRAPH_FILE)
-        if not path.isfile(file):
-            raise FileNotFoundError('Cannot find `' + INGREDIENT_SUBSTITUTION_GRAPH_FILE + '` file, inside `' + graphs_path + '`.')
-        else:
-            self.ingredient_substitution_graph = nx.read_graphml(file) 
+        metrics = self.metrics
+        with metrics.profiling(), metrics.phase('load'):
+            file = path.join(graphs_path, MODEL_FILE)
+            if path.isfile(file):
+                with metrics.phase('load.snapshot'):
+                    self._model = CompactModel.load(file, on_load=self._graph_loaded)
+            else:
+                with metrics.phase('load.graphml'):
+                    self._import_graphml(graphs_path)
+                
+            with metrics.phase('load.indexes'):
+                self._create_indexes()
+                
+            if prefetch:
+                self._model.graphs.prefetch()
             
-        file = path.join(graphs_path, INGREDIENT_CORRELATION_GRAPH_FILE)
-        if not path.isfile(file):
-            raise FileNotFoundError('Cannot find `' + INGREDIENT_CORRELATION_GRAPH_FILE + '` file, inside `' + graphs_path + '`.')
-        else:
-            self.ingredient_correlation_graph = nx.read_graphml(file)
             
-        file = path.join(graphs_path, RECIPE_INGREDIENT_RELATIONSHIP_GRAPH_FILE)
-        if not path.isfile(file):
-            raise FileNotFoundError('Cannot find `' + RECIPE_INGREDIENT_RELATIONSHIP_GRAPH_FILE + '` file, inside `' + graphs_path + '`.')
-        else:
-            self.recipe_ingredient_relationship_graph = nx.read_graphml(file)
+    def _import_graphml(self, graphs_path):
+        """Load graphs from the GraphML files of a containing folder. Only the recipe-ingredient relationship graph is read right away; the others are read on first access, or in the background (see `_load_model`). Their labels are interned as they are read, so an ingredient that appears in no recipe is only known once a graph that contains it has been read.
+
+        Args:
+            - graphs_path (str): Path of the folder that contains the graphs. The `ingredient_substitution_graph.graphml`, `ingredient_correlation_graph.graphml` and `recipe_ingredient_relationship_graph.graphml` files are expected to exist inside the folder.
+            
+        Raises:
+            - FileNotFoundError: If any expected file is not found, inside the defined folder.
+            
+        """  
+        files = dict()
+        for name, fname in [(INGREDIENT_SUBSTITUTION_GRAPH, INGREDIENT_SUBSTITUTION_GRAPH_FILE), (INGREDIENT_CORRELATION_GRAPH, INGREDIENT_CORRELATION_GRAPH_FILE), (RECIPE_INGREDIENT_RELATIONSHIP_GRAPH, RECIPE_INGREDIENT_RELATIONSHIP_GRAPH_FILE)]:
+            file = path.join(graphs_path, fname)
+            if not path.isfile(file):
+                raise FileNotFoundError('Cannot find `' + MODEL_FILE + '` or `' + fname + '` file, inside `' + graphs_path + '`.')
+            files[name] = file
+            
+        # The recipe-ingredient relationship graph comes first, so the positions of its nodes follow their insertion order
+        index = dict()
+        loaders = dict(
+            (name, (partial(nx.read_graphml, files[name]), partial(self._import_graph, name, files[name], index)))
+            for name in (RECIPE_INGREDIENT_RELATIONSHIP_GRAPH, INGREDIENT_SUBSTITUTION_GRAPH, INGREDIENT_CORRELATION_GRAPH)
+        )
+        self._model = CompactModel(StringTable.from_strings([]), LazyGraphs(loaders=loaders, on_load=self._graph_loaded), dict())
+        self._model.graphs[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]
+        
+        
+    def _import_graph(self, name, file, index, graph=None):
+        """Returns the array-backed copy of a graph imported from a GraphML file, interning the labels not seen in the graphs imported before. The NetworkX graph is kept.
+
+        Args:
+            - name (str): Graph name.
+            - file (str): Path of the GraphML file.
+            - index (dict(str, int)): Position of every label interned so far. The new labels are added.
+            - graph (networkx.Graph, optional): Graph already read from the file. Defaults to None (it is read).
+            
+        Returns:
+            CSRGraph: Graph.
+            
+        """
+        if graph is None:
+            graph = nx.read_graphml(file)
+        
+        strings = self._model.strings
+        for node in graph.nodes:
+            if not node in index:
+                index[node] = strings.append(node)
+                
+        compact, self._model.metadata[name] = compact_networkx(graph, index, EDGE_SCHEMAS[name])
+        self._graphs[name] = graph
+        return compact
+    
+    
+    def _graph_loaded(self, name, graph):
+        """Account for a graph of the model loaded on first access: its load time, and the ingredients that only appear in it (see `_import_graphml`)
+
+        """
+        self.metrics.add_time('load.graph.' + name, self._model.graphs.timings[name]['seconds'])
+        if self._postings is None or not name in (INGREDIENT_SUBSTITUTION_GRAPH, INGREDIENT_CORRELATION_GRAPH):
+            return
+        
+        self._postings.grow(len(self._model.strings))
+        kinds = self._postings.kinds
+        found = graph.nodes[kinds[graph.nodes] == NO_NODE]
+        if len(found) > 0:
+            kinds[found] = INGREDIENT
+            self._views = dict()
+            self._search_indexes = dict()
+            self.version += 1
+            
+            
+    def _load_ingredient_graphs(self):
+        """Load the graphs that may hold ingredients that appear in no recipe, if they are not loaded yet
+
+        """
+        graphs = self._model.graphs
+        for name in (INGREDIENT_SUBSTITUTION_GRAPH, INGREDIENT_CORRELATION_GRAPH):
+            if name in graphs:
+                graphs[name]
+        
+        
+    def save(self, fdest):
+        """Store the model as a snapshot, including the changes made since it was built or loaded
+
+        Args:
+            - fdest (str): Folder path. The `model.snapshot` file will be created inside it.
+            
+        Raises:
+            - NotADirectoryError: If the folder path (parameter) does not exist.
+            
+        """
+        if not path.isdir(fdest):
+            raise NotADirectoryError('Path folder `' + fdest + '` does not exist')
+        
+        with self.metrics.phase('save'):
+            if self._stale_correlations:
+                self._refresh_correlations()
+            if self._stale_inferred:
+                self._infer_substitutions()
+                self.version += 1
+            self._store_update_statistics()
+                
+            if self._model.has_changes():
+                self._model = self._model.compacted()
+                self._create_indexes()
+            self._substitution_candidates()
+            if not RECIPE_EMBEDDINGS in self._model.embeddings:
+                self._create_embeddings()
+                
+            self._model.save(path.join(fdest, MODEL_FILE))
+        
+        
+    def export_graphml(self, fdest):
+        """Store the graphs as GraphML files
+
+        Args:
+            - fdest (str): Folder path. The `ingredient_substitution_graph.graphml`, `ingredient_correlation_graph.graphml` and `recipe_ingredient_relationship_graph.graphml` files will be created inside it.
+            
+        Raises:
+            - NotADirectoryError: If the folder path (parameter) does not exist.
+            
+        """
+        if not path.isdir(fdest):
+            raise NotADirectoryError('Path folder `' + fdest + '` does not exist')
+        
+        with self.metrics.phase('export_graphml.' + INGREDIENT_SUBSTITUTION_GRAPH):
+            nx.write_graphml_xml(self.ingredient_substitution_graph, path.join(fdest, INGREDIENT_SUBSTITUTION_GRAPH_FILE))
+        with self.metrics.phase('export_graphml.' + INGREDIENT_CORRELATION_GRAPH):
+            nx.write_graphml_xml(self.ingredient_correlation_graph, path.join(fdest, INGREDIENT_CORRELATION_GRAPH_FILE))
+        with self.metrics.phase('export_graphml.' + RECIPE_INGREDIENT_RELATIONSHIP_GRAPH):
+            nx.write_graphml_xml(self.recipe_ingredient_relationship_graph, path.join(fdest, RECIPE_INGREDIENT_RELATIONSHIP_GRAPH_FILE))
+        
+        
+    def _cooccurrence_metadata(self, model):
+        return dict([
+            ('types', list(model.metadata[INGREDIENT_CORRELATION_GRAPH]['types'])),
+            ('schema', EDGE_SCHEMAS[INGREDIENT_COOCCURRENCE_GRAPH]),
+            ('extra', [])
+        ])
+        
+    
+    def _create_indexes(self):
+        """Create the query indexes over the array-backed model
+
+        """
+        graphs = self._model.graphs
+        graph = graphs[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]
+        types = self._model.metadata[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]['types']
+        
+        kinds = np.zeros(len(self._model.strings), dtype=np.uint8)
+        # The ingredients of the graphs not loaded yet are marked when they are loaded (see `_graph_loaded`)
+        for other in graphs.loaded().values():
+            kinds[other.nodes] = INGREDIENT
+        if RECIPE_NODE_TYPE in types:
+            kinds[graph.nodes[graph.kinds == types.index(RECIPE_NODE_TYPE)]] = RECIPE
+            
+        self._postings = PostingIndex(graph, kinds)
+        self._model.metadata[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH].setdefault('n_recipes', int(np.count_nonzero(kinds == RECIPE)))
+        
+        if not INGREDIENT_COOCCURRENCE_GRAPH in graphs:
+            graphs.add(INGREDIENT_COOCCURRENCE_GRAPH, lambda fetched: self._count_cooccurrences())
+            
+        self._relations = self._recipe_relations = self._entries = None
+        self._stale_correlations = False
+        self._stale_inferred = False
+        self._frequency = None
+        self._views = dict()
+        self._search_indexes = dict()
+        
+        
+    def _count_cooccurrences(self):
+        """Derive the co-occurrence counts from the relationship graph, for the models stored without them (GraphML files), on first access. The number of recipes is taken to be the number of recipe nodes, and the substitution relations are unknown, so removing recipes does not change the substitution weights.
+
+        Returns:
+            CSRGraph: Co-occurrence graph.
+            
+        """
+        graphs, metadata = self._model.graphs, self._model.metadata
+        # Loaded first, since it may add positions
+        correlation = graphs[INGREDIENT_CORRELATION_GRAPH]
+        kinds = self._postings.kinds
+        n_positions = len(kinds)
+        
+        firsts, seconds, _ = graphs[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH].edges()
+        recipes = np.where(kinds[firsts] == RECIPE, firsts, seconds)
+        ingredients = np.where(kinds[firsts] == RECIPE, seconds, firsts)
+        incidence = sparse.coo_matrix((np.ones(len(recipes), dtype=np.int64), (recipes, ingredients)), shape=(n_positions, n_positions))
+        _, counts = cooccurrence_counts(incidence)
+        
+        metadata[INGREDIENT_COOCCURRENCE_GRAPH] = self._cooccurrence_metadata(self._model)
+        return CSRGraph.from_edges(n_positions, correlation.nodes, correlation.kinds, counts.row.astype(np.int64), counts.col.astype(np.int64), counts.data.astype(np.float64))
         
     
     #########################
     ### DATA CONSTRUCTION ###
     #########################
     
-    def _build_model(self, data_path, fdest = None):
+    def _build_model(self, data_path, fdest = None, workers = 1, pruning = None, embedding_dim = DEFAULT_EMBEDDING_DIM, inference = None, reuse = False):
         """Construct the relationship graph between the ingredients. Two ingredients are related if they appear in the same recipe.
 
         Args:
-            - data_path (str): JSON file path, which contains the information to build the relationship graph. The file is expected to have the columns:
-                - recipe (str) Indicates the name of the recipe
-                - ner (list of str) Indicates recipe ingredients
+            - data_path (str): JSON or JSON Lines file path, which contains the information to build the relationship graph (see `parser.RecipeJSON`). The file is read once, one recipe at a time.
                 
-            - fdest (str): Folder path to store the model. If it does not have a defined value, the file will not be created; otherwise, the file will be created with the extension `.graphml` and with name `ingredient_graph`, concatenated from the date the file was created. Defaults to None.
+            - fdest (str): Folder path to store the model. If it does not have a defined value, the file will not be created; otherwise, the model will be stored inside it as a `model.snapshot` file (see `export_graphml` to store it as GraphML). Defaults to None.
+            
+            - workers (int): Number of processes. If greater than 1, the recipes are split into shards whose statistics are collected in parallel (see `_create_graphs_in_parallel`). The resulting graphs are the same. Defaults to 1.
+            
+            - pruning (dict): Options of the correlation graph: its pruning (`min_support`, `min_npmi` and `top_k`), whether only the counts of the pairs kept are stored (`prune_counts`) and, in approximate mode, the memory of the sketch in bytes (`sketch_memory`). See `__init__`. Defaults to None (exact, without pruning).
+            
+            - embedding_dim (int): Number of dimensions of the vectors of the ingredients and recipes (see `_create_embeddings`). Defaults to 64.
+            
+            - inference (dict): Options of the inference of substitutions (see `_infer_substitutions`). Defaults to None (no inference).
+            
+            - reuse (bool): Whether to reuse the model stored in `fdest`, if it was built from the same recipes (see `_reuse_model`). Whether or not it is reused, the digest of the inputs is stored next to the model, in a `build.json` file. Defaults to False.
             
         Raises:
             - FileNotFoundError: If the information in the `data_path` parameter is not a valid file path.
-            - EOFError: If the extension of the `model_file` file is not 'csv'.
+            - EOFError: If the extension of the `data_path` file is not '.json', '.jsonl' or '.ndjson'.
             - NotADirectoryError: If the data in the `data_path` parameter is not a valid folder path.
             
         """     
@@ -101,247 +441,1221 @@ class FoodGraph():
             raise FileNotFoundError('Path file `' + data_path + '` does not exist')
         
         _, file_extension = path.splitext(data_path)
-        if file_extension != '.json':
-            raise EOFError('File defined in the `data_path` parameter does not have the expected extension (.json). Extension found ' + file_extension)
+        if file_extension not in ('.json',) + JSON_LINES_EXTENSIONS:
+            raise EOFError('File defined in the `data_path` parameter does not have the expected extension (.json, .jsonl or .ndjson). Extension found ' + file_extension)
         
         if not (fdest is None or path.isdir(fdest)):
             raise NotADirectoryError('Path folder `' + fdest + '` does not exist')
         
-        data = RecipeJSON(data_path)
+        metrics = self.metrics
+        data = RecipeJSON(data_path, metrics=metrics)
+        pruning = dict(DEFAULT_PRUNING, **(pruning or dict()))
+        
+        with metrics.profiling(), metrics.phase('build'):
+            if not fdest is None:
+                manifest = read_manifest(path.join(fdest, BUILD_MANIFEST_FILE))
+                with metrics.phase('build.digest'):
+                    recipes = file_digest(data_path, None if manifest is None else manifest.get('recipes'))
+                keys = self._artifact_keys(recipes['sha256'], pruning, embedding_dim, inference)
+                if reuse and self._reuse_model(fdest, manifest, keys, pruning, embedding_dim, inference):
+                    self._write_build_manifest(fdest, recipes, keys, pruning, embedding_dim, inference)
+                    return
+            
+            if workers > 1:
+                self._model = self._create_graphs_in_parallel(data, workers, pruning)
+            else:
+                self._model = self._create_graphs(data.get_recipes(), pruning)
+            self._model.metadata[INGREDIENT_CORRELATION_GRAPH][EMBEDDING_DIM] = embedding_dim
+            with metrics.phase('build.indexes'):
+                self._create_indexes()
+            if not inference is None:
+                with metrics.phase('build.inferred_substitutions'):
+                    self._infer_substitutions(inference)
+            with metrics.phase('build.embeddings'):
+                self._create_embeddings()
+            self.rebuilt = [RECIPE_INGREDIENT_RELATIONSHIP_GRAPH, INGREDIENT_SUBSTITUTION_GRAPH, INGREDIENT_COOCCURRENCE_GRAPH, INGREDIENT_CORRELATION_GRAPH] + ([] if inference is None else [INGREDIENT_INFERRED_SUBSTITUTION_GRAPH]) + [RECIPE_EMBEDDINGS]
+            
+            if not fdest is None:
+                self.save(fdest)
+                self._write_build_manifest(fdest, recipes, keys, pruning, embedding_dim, inference)
+            
+            
+    def _artifact_keys(self, recipes, pruning, embedding_dim, inference):
+        """Returns the key of every artifact of the model: a digest of everything it is derived from, so an artifact whose key did not change is the same one that would be built again
+
+        Args:
+            - recipes (str): Digest of the recipes file.
+            - pruning (dict): Options of the correlation graph (see `_create_model`).
+            - embedding_dim (int): Number of dimensions of the vectors.
+            - inference (dict): Options of the inference of substitutions, or None.
+            
+        Returns:
+            dict(str, str): Key of each graph, and of the vectors (`RECIPE_EMBEDDINGS`). None for the inferred substitutions, if they are not inferred.
+            
+        """
+        # With a sketch or `prune_counts`, only the counts of the pairs kept by the pruning are stored
+        counting = pruning if 'sketch_memory' in pruning or pruning.get('prune_counts') else None
+        return dict([
+            (RECIPE_INGREDIENT_RELATIONSHIP_GRAPH, content_key(RECIPE_INGREDIENT_RELATIONSHIP_GRAPH, recipes)),
+            (INGREDIENT_SUBSTITUTION_GRAPH, content_key(INGREDIENT_SUBSTITUTION_GRAPH, recipes)),
+            (INGREDIENT_COOCCURRENCE_GRAPH, content_key(INGREDIENT_COOCCURRENCE_GRAPH, recipes, counting)),
+            (INGREDIENT_CORRELATION_GRAPH, content_key(INGREDIENT_CORRELATION_GRAPH, recipes, pruning)),
+            (INGREDIENT_INFERRED_SUBSTITUTION_GRAPH, None if inference is None else content_key(INGREDIENT_INFERRED_SUBSTITUTION_GRAPH, recipes, counting, inference)),
+            (RECIPE_EMBEDDINGS, content_key(RECIPE_EMBEDDINGS, recipes, pruning, embedding_dim))
+        ])
+    
+    
+    def _reuse_model(self, fdest, manifest, keys, pruning, embedding_dim, inference):
+        """Load the model stored in a folder instead of building it, if it was built from the same recipes. The correlations, the inferred substitutions and the vectors are derived from the co-occurrence counts, so those whose options changed are derived again and the model is stored again; any other change requires a new construction.
+
+        Args:
+            - fdest (str): Folder of the model.
+            - manifest (dict): Manifest stored with the model (see `_write_build_manifest`), or None.
+            - keys (dict(str, str)): Keys of the artifacts to build (see `_artifact_keys`).
+            - pruning (dict): Options of the correlation graph.
+            - embedding_dim (int): Number of dimensions of the vectors.
+            - inference (dict): Options of the inference of substitutions, or None.
+            
+        Returns:
+            bool: Whether the model was reused. If not, nothing was loaded.
+            
+        """
+        file = path.join(fdest, MODEL_FILE)
+        # A model stored again after the construction (e.g. with updates) no longer matches the manifest
+        if manifest is None or not 'snapshot' in manifest or not path.isfile(file) or file_digest(file, manifest['snapshot'])['sha256'] != manifest['snapshot']['sha256']:
+            return False
+        
+        stored = manifest.get('artifacts', dict())
+        changed = [name for name in keys if stored.get(name) != keys[name]]
+        if any(name in changed for name in (RECIPE_INGREDIENT_RELATIONSHIP_GRAPH, INGREDIENT_SUBSTITUTION_GRAPH, INGREDIENT_COOCCURRENCE_GRAPH)):
+            return False
+        
+        metrics = self.metrics
+        self._load_model(fdest)
+        metadata = self._model.metadata
+        with metrics.phase('build.reuse'):
+            if INGREDIENT_CORRELATION_GRAPH in changed:
+                metadata[INGREDIENT_CORRELATION_GRAPH][CORRELATION_PRUNING] = pruning
+                self._refresh_correlations()
+            if INGREDIENT_INFERRED_SUBSTITUTION_GRAPH in changed:
+                if inference is None:
+                    del self._model.graphs[INGREDIENT_INFERRED_SUBSTITUTION_GRAPH]
+                    del metadata[INGREDIENT_INFERRED_SUBSTITUTION_GRAPH]
+                else:
+                    self._infer_substitutions(inference)
+            if RECIPE_EMBEDDINGS in changed:
+                metadata[INGREDIENT_CORRELATION_GRAPH][EMBEDDING_DIM] = embedding_dim
+                self._model.embeddings.clear()
+        
+        self.rebuilt = changed
+        if changed:
+            self.version += 1
+            self.save(fdest)
+        return True
+    
+    
+    def _write_build_manifest(self, fdest, recipes, keys, pruning, embedding_dim, inference):
+        """Store, next to the model, the digest of the recipes it was built from, its options and the keys of its artifacts (see `_reuse_model`)
+
+        """
+        write_manifest(path.join(fdest, BUILD_MANIFEST_FILE), dict([
+            ('recipes', recipes),
+            ('options', dict([('pruning', pruning), ('embedding_dim', embedding_dim), ('inference', inference)])),
+            ('artifacts', keys),
+            ('snapshot', file_digest(path.join(fdest, MODEL_FILE)))
+        ]))
+            
+            
+    def _create_graphs(self, recipes, pruning=None):
+        """Create the three graphs, in a single pass over the recipes. Only the nodes and the attributes of the belonging edges are recorded as the recipes are read; the edges are derived at the end, from the statistics collected along the way, directly as arrays (see `_create_model`).
+
+        Args:
+            recipes (iterable of dict): Recipes. Each object is expected to be a dictionary with the fields:
+                - name (str): Recipe name.
+                - ingredients (list of dict): List of ingredients. Its fields are:
+                    - name (str): Ingredient name.
+                    - variants (list of int): List of ingredients that can be substituted. The list contains positions within the `ingredients` list.
+            pruning (dict, optional): Options of the correlation graph (see `_create_model`). Defaults to None.
+                    
+        Returns:
+            CompactModel: Model.
+            
+        """
+        statistics = CorpusStatistics()
+        nodes, belonging = dict(), dict()
         
-        self.ingredient_substitution_graph = nx.Graph()
-        self.ingredient_correlation_graph = nx.Graph()
-        self.recipe_ingredient_relationship_graph = nx.Graph()
+        if self.metrics.enabled:
+            self._create_graphs_timed(recipes, statistics, nodes, belonging)
+        else:
+            for recipe in recipes:
+                statistics.add(recipe)
+                self._create_nodes(recipe, nodes)
+                self._create_edges_of_belonging(recipe, belonging)
+            
+        return self._create_model(statistics, nodes, belonging, pruning)
+    
+    
+    def _create_graphs_timed(self, recipes, statistics, nodes, belonging):
+        """The loop of `_create_graphs`, timing each step. The steps are too short to be timed as separate phases, so their times are accumulated over the recipes and reported once.
+
+        Args:
+            recipes (iterable of dict): Recipes.
+            statistics (CorpusStatistics | None): Statistics of the recipes, or None if they are collected elsewhere (see `_create_graphs_in_parallel`).
+            nodes (dict(str, str)): Type of every node read so far, by name.
+            belonging (dict((str, str), dict)): Attributes of the belonging edges.
+            
+        """
+        metrics = self.metrics
+        clock = time.perf_counter
+        collecting = creating_nodes = creating_edges = 0.0
+        
+        for recipe in metrics.iterate(recipes, 'build.read'):
+            start = clock()
+            if not statistics is None:
+                statistics.add(recipe)
+            collected = clock()
+            self._create_nodes(recipe, nodes)
+            created = clock()
+            self._create_edges_of_belonging(recipe, belonging)
+            
+            collecting += collected - start
+            creating_nodes += created - collected
+            creating_edges += clock() - created
+            
+        if not statistics is None:
+            metrics.add_time('build.statistics', collecting)
+        metrics.add_time('build.nodes', creating_nodes)
+        metrics.add_time('build.belonging', creating_edges)
+            
+            
+    def _create_graphs_in_parallel(self, data, workers, pruning=None):
+        """Create the three graphs, distributing the work among several processes. Each process collects and counts the statistics of a shard of the recipes (document counts, pair co-occurrence counts, substitution relations); the shards are merged in order, so the graphs are the same as those of `_create_graphs`.
+
+        Args:
+            data (parser.RecipeJSON): Recipes.
+            workers (int): Number of processes.
+            pruning (dict, optional): Options of the correlation graph (see `_create_model`). Defaults to None.
+            
+        Returns:
+            CompactModel: Model.
+            
+        """
+        statistics = CorpusStatistics()
+        nodes, belonging = dict(), dict()
         
-        self._create_nodes(data.get_recipes())
-        self._create_edges(data.get_recipes)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            shards = data.get_shards(SHARDS_PER_WORKER * workers)
+            
+            # The time spent waiting for the shards is that of the processes that collect their statistics, net of the merge
+            # In approximate mode, the pairs are not counted by the processes either
+            collect = partial(collect_statistics, count=(pruning or dict()).get('sketch_memory') is None)
+            for (shard_statistics, recipes) in self.metrics.iterate(ordered_map(executor, collect, shards, 2 * workers), 'build.shards'):
+                with self.metrics.phase('build.merge'):
+                    statistics.merge(shard_statistics)
                 
-        if not fdest is None:
-            nx.write_graphml_xml(self.ingredient_substitution_graph, path.join(fdest, INGREDIENT_SUBSTITUTION_GRAPH_FILE))
-            nx.write_graphml_xml(self.ingredient_correlation_graph, path.join(fdest, INGREDIENT_CORRELATION_GRAPH_FILE))
-            nx.write_graphml_xml(self.recipe_ingredient_relationship_graph, path.join(fdest, RECIPE_INGREDIENT_RELATIONSHIP_GRAPH_FILE))
+                if self.metrics.enabled:
+                    self._create_graphs_timed(recipes, None, nodes, belonging)
+                else:
+                    for recipe in recipes:
+                        self._create_nodes(recipe, nodes)
+                        self._create_edges_of_belonging(recipe, belonging)
             
+        return self._create_model(statistics, nodes, belonging, pruning)
             
-    def _create_nodes(self, recipes):
-        """Create the graph nodes
+            
+    def _create_nodes(self, recipe, nodes):
+        """Record the nodes of a recipe and its ingredients. Nodes keep the order in which they first appear, and the type with which they last appear.
 
         Args:
-            recipes (list of dict): Recipes list.
+            recipe (dict): Recipe.
+            nodes (dict(str, str)): Type of every node read so far, by name.
             
         """
-        for recipe in recipes:
-            node_name = recipe['name']
-            tags = dict([
-                ('type', 'recipe_name'),
-                ('label', node_name)
+        nodes[recipe['name']] = RECIPE_NODE_TYPE
+        for ingredient in recipe['ingredients']:
+            nodes[ingredient['name']] = INGREDIENT_NODE_TYPE
+            
+            
+    def _create_edges_of_belonging(self, recipe, belonging):
+        """Record the attributes of the edges that relate a recipe with the ingredients that make it up. The edges themselves are derived from the statistics (see `_create_model`).
+
+        Args:
+            recipe (dict): Recipe.
+            belonging (dict((str, str), dict)): Attributes of the belonging edges that have any, by pair of names.
+            
+        """  
+        recipe_name = recipe['name']
+        
+        for ingredient in recipe['ingredients']:
+            #todo: ver si las propiedades de los nodos y las aristas, serán en español o inglés
+            tags = dict(filter(lambda elem: elem[0] in BELONGING_EDGE_ATTRIBUTES, ingredient.items()))
+            if tags:
+                pair = (recipe_name, ingredient['name']) if recipe_name <= ingredient['name'] else (ingredient['name'], recipe_name)
+                belonging.setdefault(pair, dict()).update(tags)
+                
+                
+    def _create_model(self, statistics, nodes, belonging, pruning=None):
+        """Create the array-backed model from the statistics of the recipes. Names are interned in the order in which they first appear, and every graph is built directly in CSR layout; NetworkX graphs are only produced on demand (see `_graph_property`).
+
+        Args:
+            statistics (CorpusStatistics): Statistics of the recipes. They are kept with the model, so it can be updated (see `add_recipes`).
+            nodes (dict(str, str)): Type of every node, by name (see `_create_nodes`).
+            belonging (dict((str, str), dict)): Attributes of the belonging edges (see `_create_edges_of_belonging`).
+            pruning (dict, optional): Options of `CorpusStatistics.correlations` that prune the correlation graph. The pairs are pruned before their PMI is computed, and the co-occurrence counts of every pair are still kept, so the updates are exact. With `prune_counts`, only the counts of the pairs of the correlation graph are kept, so the model is smaller but the updates are approximate. With `sketch_memory`, the counts are estimated instead (see `CorpusStatistics.approximate_correlations`), and only those of the pairs of the correlation graph are kept, so the updates are approximate too. Defaults to None (exact, without pruning).
+
+        Returns:
+            CompactModel: Model.
+            
+        """
+        metrics = self.metrics
+        pruning = dict(DEFAULT_PRUNING, **(pruning or dict()))
+        sketch_memory = pruning.pop('sketch_memory', None)
+        prune_counts = pruning.pop('prune_counts', False)
+        
+        with metrics.phase('build.strings'):
+            strings = StringTable.from_strings(list(nodes))
+            index = dict(zip(nodes, range(len(nodes))))
+            n_positions = len(index)
+            
+            recipes = np.fromiter((index[name] for name in statistics.recipes), dtype=np.int64, count=len(statistics.recipes))
+            ingredients = np.fromiter((index[name] for name in statistics.ingredients), dtype=np.int64, count=len(statistics.ingredients))
+            
+            types = list(dict.fromkeys(nodes.values()))
+            kinds = np.fromiter((types.index(node_type) for node_type in nodes.values()), dtype=np.uint8, count=n_positions)
+            ingredient_types = [INGREDIENT_NODE_TYPE] if len(ingredients) > 0 else []
+            ingredient_nodes, ingredient_kinds = ingredients.astype(np.int32), np.zeros(len(ingredients), dtype=np.uint8)
+        
+        with metrics.phase('build.belonging_edges'):
+            # Every entry of the incidence matrix is a belonging edge
+            rows = recipes[np.frombuffer(statistics.rows, dtype=np.int32)]
+            cols = ingredients[np.frombuffer(statistics.cols, dtype=np.int32)]
+            pairs = np.unique(np.minimum(rows, cols) * n_positions + np.maximum(rows, cols))
+        
+        sketch = None
+        if sketch_memory is None:
+            with metrics.phase('build.cooccurrence'):
+                _, counts = statistics.cooccurrence()
+            with metrics.phase('build.correlations'):
+                firsts, seconds, values = statistics.correlations(**pruning)
+            pairs_evaluated = counts.nnz
+            if prune_counts:
+                # The pairs of the correlations are in the upper triangle, as the counts
+                counts = (firsts, seconds, np.asarray(counts.tocsr()[firsts, seconds]).ravel())
+            else:
+                counts = (counts.row, counts.col, counts.data)
+        else:
+            with metrics.phase('build.correlations'):
+                firsts, seconds, values, estimates, sketch, kept = statistics.approximate_correlations(sketch_memory, **pruning)
+            # Every pair of every recipe is added to the sketch
+            pairs_evaluated = sketch.total
+            counts = (firsts, seconds, estimates)
+        with metrics.phase('build.substitutions'):
+            weights = statistics.substitution_weights()
+        
+        with metrics.phase('build.graphs'):
+            graphs = dict([
+                (RECIPE_INGREDIENT_RELATIONSHIP_GRAPH, CSRGraph.from_edges(n_positions, np.arange(n_positions, dtype=np.int32), kinds, pairs // n_positions, pairs % n_positions, np.ones(len(pairs), dtype=np.float64))),
+                (INGREDIENT_SUBSTITUTION_GRAPH, CSRGraph.from_edges(
+                    n_positions, ingredient_nodes, ingredient_kinds,
+                    np.fromiter((index[u] for u, _ in weights), dtype=np.int64, count=len(weights)),
+                    np.fromiter((index[v] for _, v in weights), dtype=np.int64, count=len(weights)),
+                    np.fromiter(weights.values(), dtype=np.float64, count=len(weights))
+                )),
+                (INGREDIENT_CORRELATION_GRAPH, CSRGraph.from_edges(n_positions, ingredient_nodes, ingredient_kinds, ingredients[firsts], ingredients[seconds], values)),
+                (INGREDIENT_COOCCURRENCE_GRAPH, CSRGraph.from_edges(n_positions, ingredient_nodes, ingredient_kinds, ingredients[counts[0]], ingredients[counts[1]], counts[2].astype(np.float64)))
             ])
-            self.recipe_ingredient_relationship_graph.add_node(node_name, **tags)
+        
+        with metrics.phase('build.metadata'):
+            metadata = dict((name, dict([('types', list(ingredient_types)), ('schema', EDGE_SCHEMAS[name]), ('extra', [])])) for name in graphs)
+            metadata[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]['types'] = types
+            metadata[INGREDIENT_CORRELATION_GRAPH][CORRELATION_PRUNING] = pruning
+            if not sketch is None:
+                metadata[INGREDIENT_CORRELATION_GRAPH][CORRELATION_SKETCH] = dict([('width', sketch.width), ('depth', sketch.depth), ('memory', sketch.nbytes), ('pairs', sketch.total), ('error', sketch.epsilon * sketch.total), ('confidence', 1 - sketch.delta), ('max_pairs', kept.capacity), ('truncated', kept.truncated)])
+            metadata[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]['extra'] = [[index[u], index[v], tags, []] for (u, v), tags in belonging.items()]
             
-            for ingredient in recipe['ingredients']:
-                node_name = ingredient['name']
-                tags = dict([
-                    ('type', 'ingredient_name'),
-                    ('label', node_name)
-                ])
-                self.ingredient_substitution_graph.add_node(node_name, **tags)
-                self.ingredient_correlation_graph.add_node(node_name, **tags)
-                self.recipe_ingredient_relationship_graph.add_node(node_name, **tags)
+            names = list(statistics.recipes)
+            metadata[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]['n_recipes'] = statistics.n_recipes
+            metadata[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]['entries'] = [[index[name], count] for name, count in statistics.entries.items()]
+            metadata[INGREDIENT_SUBSTITUTION_GRAPH]['relations'] = [
+                [sorted(index[name] for name in relation), sorted(index[names[row]] for row in rows)]
+                for relation, rows in statistics.substitutions.items()
+            ]
         
+        if metrics.enabled:
+            metrics.count('recipes', statistics.n_recipes)
+            metrics.count('nodes', len(recipes), kind='recipe')
+            metrics.count('nodes', len(ingredients), kind='ingredient')
+            metrics.count('ingredient_mentions', len(statistics.rows))
+            # Pairs of ingredients that appear together in some recipe, whose correlation is evaluated
+            metrics.count('pairs_evaluated', pairs_evaluated)
+            metrics.count('substitution_relations', len(statistics.substitutions))
+            for name, n_edges in [(RECIPE_INGREDIENT_RELATIONSHIP_GRAPH, len(pairs)), (INGREDIENT_SUBSTITUTION_GRAPH, len(weights)), (INGREDIENT_CORRELATION_GRAPH, len(values)), (INGREDIENT_COOCCURRENCE_GRAPH, len(counts[0]))]:
+                metrics.count('edges_emitted', n_edges, graph=name)
+            
+        return CompactModel(strings, graphs, metadata)
+                
+                
+    ######################
+    ### MODEL UPDATES ###
+    ######################
+    
+    def apply_substitution_feedback(self, feedback):
+        """Fold the votes of the users into the substitution graph, without rebuilding the model. Each vote adds 1 to the weight of the edge between the ingredient and its substitute, which is created if it does not exist. Only the votes recorded since the previous call are read.
+
+        Args:
+            feedback (SubstitutionFeedback): Store of the votes.
+            
+        Returns:
+            int: Number of votes folded into the graph. Votes for ingredients that do not appear in the graph are ignored.
+            
+        """
+        with self._feedback_lock:
+            votes, self._feedback_cursor, complete = feedback.changes(self._feedback_cursor)
+        
+            if complete:
+                # The journal was compacted: only the difference with the votes already folded is new
+                totals = votes
+                votes = dict((pair, count - self._feedback_votes.get(pair, 0)) for pair, count in totals.items())
+                self._feedback_votes = totals
+            else:
+                for pair, count in votes.items():
+                    self._feedback_votes[pair] = self._feedback_votes.get(pair, 0) + count
+        
+            applied = 0
+            strings = self._model.strings
+            kinds = self._postings.kinds
+            for (ingredient, substitute), count in votes.items():
+                u, v = strings.find(ingredient), strings.find(substitute)
+                if count <= 0 or u < 0 or v < 0 or u == v or kinds[u] != INGREDIENT or kinds[v] != INGREDIENT:
+                    continue
+            
+                self._add_substitution_weight(u, v, count)
+                applied += count
+            
+            if applied > 0:
+                self.version += 1
+        return applied
+    
+    
+    def add_recipes(self, recipes):
+        """Add recipes to the model, without rebuilding it. The model is the same as the one built with the recipes appended to the corpus: a recipe whose name is already in the model is merged with it, as in the construction (see `_create_graphs`).
         
-    def _create_edges(self, recipes):
-        """Create the graph edges
+        Only the nodes and edges of the recipes, the co-occurrence counts of their pairs of ingredients and the substitution weights of their relations are updated, so the cost depends on the recipes added and not on the size of the model. The PMI values also depend on the total number of recipes, so all of them change: they are recomputed from the co-occurrence counts when they are read (see `_correlation_row`), and in a single pass when the correlation graph is produced or the model is stored.
 
         Args:
-            recipes (instance of an enumerator function): Recipes list. Each object returned by the iterator is expected to be a dictionary with the fields:
-                - nombre (str): Recipe name.
-                - ingredientes (list of dict): List of ingredients. Its fields are:
-                    - nombre (str): Nombre del ingrediente.
-                    - variantes (list of int): List of ingredients that can be substituted. The list contains positions within the `ingredients` list. 
+            recipes (iterable of dict): Recipes, with the fields described in `_create_graphs`.
+            
+        Raises:
+            ValueError: If a name is used both as a recipe and as an ingredient.
+            
+        Returns:
+            int: Number of recipes added.
             
         """
-        self._create_correlation_edges_of_ingredients(recipes)
-        self._create_ingredient_substitution_edges(recipes)
-        self._create_edges_of_belonging(recipes)
+        recipes = list(recipes)
+        strings = self._model.strings
+        kinds = self._postings.kinds
+        
+        positions = dict()
+        for recipe in recipes:
+            for name in [recipe['name']] + [ingredient['name'] for ingredient in recipe['ingredients']]:
+                if not name in positions:
+                    positions[name] = strings.find(name)
+        
+        # Validate the names before changing anything
+        recipe_names = set(recipe['name'] for recipe in recipes)
+        conflicts = recipe_names.intersection(ingredient['name'] for recipe in recipes for ingredient in recipe['ingredients'])
+        for name, position in positions.items():
+            if position >= 0 and kinds[position] == (INGREDIENT if name in recipe_names else RECIPE):
+                conflicts.add(name)
+        if conflicts:
+            raise ValueError('Names used both as recipe and as ingredient: `' + '`, `'.join(sorted(conflicts)) + '`.')
+        
+        # Intern the new names in order of appearance, so the indexes grow once
+        for name, position in positions.items():
+            if position < 0:
+                positions[name] = strings.append(name)
+        self._postings.grow(len(strings))
         
+        self._load_update_statistics()
+        for recipe in recipes:
+            self._add_recipe(recipe, positions)
+            
+        self._model_updated()
+        return len(recipes)
     
-    def _create_correlation_edges_of_ingredients(self, recipes):
-        """Creates the edges of the graph, associated to the correlation between the ingredients.
+    
+    def remove_recipes(self, recipes):
+        """Remove recipes from the model, without rebuilding it. The model is the same as the one built without the recipes (every recipe read with each name is removed); ingredients left without recipes are removed too. As in `add_recipes`, the cost depends on the recipes removed.
 
         Args:
-            recipes (instance of an enumerator function): Recipes list. Each object returned by the iterator is expected to be a dictionary with the fields:
-                - nombre (str): Recipe name.
-                - ingredientes (list of dict): List of ingredients. Its fields are:
-                    - nombre (str): Nombre del ingrediente.
-                    - variantes (list of int): List of ingredients that can be substituted. The list contains positions within the `ingredients` list.
+            recipes (list of str): Recipe names.
+            
+        Raises:
+            RecipeNotFoundError: If any recipe does not appear in the graph.
+            
+        Returns:
+            int: Number of recipes removed.
+            
+        """
+        positions = list(dict.fromkeys(self._recipe_position(recipe) for recipe in recipes))
         
+        self._load_update_statistics()
+        for position in positions:
+            self._remove_recipe(position)
+            
+        self._model_updated()
+        return len(positions)
+    
+    
+    def _add_recipe(self, recipe, positions):
+        """Add a recipe whose names are already interned
+
+        Args:
+            recipe (dict): Recipe.
+            positions (dict(str, int)): Position of each name of the recipe.
+            
         """
-        relation = dict()
-        n_recipes = 0
+        metadata = self._model.metadata
+        kinds = self._postings.kinds
+        graph = self._model.graphs[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]
+        position = positions[recipe['name']]
         
-        # Build a comfortable structure for work. ingredient -> recipes in which it appears
-        for recipe in recipes():
-            n_recipes += 1
-            recipe_name = recipe['name']
+        if kinds[position] == RECIPE:
+            current, _ = graph.neighbors(position)
+            current = current.tolist()
+            self._entries[position] = self._entries.get(position, 1) + 1
+        else:
+            current = []
+            kinds[position] = RECIPE
+            graph.add_node(position, self._node_kind(RECIPE_INGREDIENT_RELATIONSHIP_GRAPH, RECIPE_NODE_TYPE))
+        metadata[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]['n_recipes'] += 1
+        
+        added = []
+        for ingredient in recipe['ingredients']:
+            ingredient_position = positions[ingredient['name']]
+            if kinds[ingredient_position] != INGREDIENT:
+                self._add_ingredient_node(ingredient_position)
+            if not graph.weight(position, ingredient_position) is None:
+                continue
             
-            for ingredient in recipe['ingredients']:
-                ingredient_name = ingredient['name']
-                if ingredient_name in relation:
-                    relation[ingredient_name].add(recipe_name)
-                else:
-                    relation[ingredient_name] = set([recipe_name])
-                    
-        # Establish the edges (relationship) between the pairs of ingredients
-        for (ingredient1, ingredient2) in itertools.combinations(relation.keys(), 2):
-            value = pointwise_mutual_information(ingredient1, ingredient2, relation, n_recipes)
-
-            # Ignore the value=None, since it means that the pair of ingredients never appear in the same recipe
-            if not value is None: 
-                tags = dict([
-                    ('type', 'ingredient-ingredient correlation'),
-                    ('value', value),
-                    ('weight', value),
-                    ('label', 'i-i c: ' + str(value))
-                ])
-                self.ingredient_correlation_graph.add_edge(ingredient1, ingredient2, **tags)   
- 
- 
-    def _create_ingredient_substitution_edges(self, recipes):
-        """Create the edges of the graph, to establish the ingredient substitution relationship
-
-        Args:
-            Args:
-            recipes (instance of an enumerator function): Recipes list. Each object returned by the iterator is expected to be a dictionary with the fields:
-                - nombre (str): Recipe name.
-                - ingredientes (list of dict): List of ingredients. Its fields are:
-                    - nombre (str): Nombre del ingrediente.
-                    - variantes (list of int): List of ingredients that can be substituted. The list contains positions within the `ingredients` list.
-            
-        """        
-        relations = []
-        
-        # Extract the relations, according to the recipes
-        for recipe in recipes():
-            ingredients = [ingredient for ingredient in recipe['ingredients']]
-            mark = [True for _ in range(len(ingredients))]
-            
-            for i in range(len(mark)): 
-                substitutions = ingredients[i]['variants']
+            graph.set_weight(position, ingredient_position, 1)
+            added.append(ingredient_position)
+            tags = dict(filter(lambda elem: elem[0] in BELONGING_EDGE_ATTRIBUTES, ingredient.items()))
+            if tags:
+                metadata[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]['extra'].append([position, ingredient_position, tags, []])
+        self._postings.refresh(position)
+        
+        # Only the pairs with some new ingredient of the recipe are counted
+        for i, first in enumerate(added):
+            for second in current + added[:i]:
+                self._add_cooccurrence(first, second, 1)
                 
-                if mark[i] and len(substitutions) > 0:
-                    
-                    # Extract substitution relationships within the recipe
-                    relations.append(set())
-
-                    for j in [i] + ingredients[i]['variants']:
-                        mark[j] = False
-                        relations[-1].add(ingredients[j]['name'])
-                        
-        #todo: Analizar si sería beneficioso eliminar los duplicados. Se pudiese hacer algo como: si una relación ya existe, aumentaré el peso de la arista q existe entre ambos nodos, para indicar un mayor valor entre ellos.
-        # Remove duplicate relationships
-        relations = [relation for i, relation in enumerate(relations) \
-            if not relation in relations[i+1:]]
-        
-        # Establish the edges (relationship) between the pairs of ingredients
-        for relation in relations:
-            for (ingredient1, ingredient2) in itertools.combinations(relation, 2):
-                if self.ingredient_substitution_graph.has_edge(ingredient1,ingredient2):
-                    self.ingredient_substitution_graph.edges[ingredient1,ingredient2]['weight'] += 1
-                else:
-                    value = 1
-                    tags = dict([
-                        ('type', 'ingredient-ingredient substitution'),
-                        ('weight', value),
-                        ('label', 'i-i s: ' + str(value))
-                    ])
+        for relation in substitution_relations(recipe['ingredients']):
+            relation = frozenset(positions[name] for name in relation)
+            recipes = self._relations.setdefault(relation, set())
+            if not recipes:
+                for u, v in itertools.combinations(sorted(relation), 2):
+                    self._add_substitution_weight(u, v, 1)
+            recipes.add(position)
+            self._recipe_relations.setdefault(position, set()).add(relation)
+            
+            
+    def _remove_recipe(self, position):
+        """Remove a recipe, and the ingredients that only appear in it
+
+        Args:
+            position (int): Recipe.
+            
+        """
+        metadata = self._model.metadata
+        kinds = self._postings.kinds
+        graph = self._model.graphs[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]
+        
+        ingredients, _ = graph.neighbors(position)
+        ingredients = ingredients[kinds[ingredients] == INGREDIENT].tolist()
+        for i, first in enumerate(ingredients):
+            for second in ingredients[:i]:
+                self._add_cooccurrence(first, second, -1)
+        
+        graph.remove_node(position)
+        kinds[position] = NO_NODE
+        self._postings.refresh(position)
+        metadata[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]['n_recipes'] -= self._entries.pop(position, 1)
+        
+        extra = metadata[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]['extra']
+        if extra:
+            metadata[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]['extra'] = [edge for edge in extra if not position in edge[:2]]
+        
+        for relation in self._recipe_relations.pop(position, set()):
+            recipes = self._relations[relation]
+            recipes.discard(position)
+            if not recipes:
+                del self._relations[relation]
+                for u, v in itertools.combinations(sorted(relation), 2):
+                    self._add_substitution_weight(u, v, -1)
                     
-                    self.ingredient_substitution_graph.add_edge(ingredient1, ingredient2, **tags)   
+        for ingredient in ingredients:
+            if len(self._postings.postings(ingredient)) == 0:
+                self._remove_ingredient_node(ingredient)
+                
+                
+    def _add_ingredient_node(self, position):
+        self._postings.kinds[position] = INGREDIENT
+        for name in (RECIPE_INGREDIENT_RELATIONSHIP_GRAPH, INGREDIENT_SUBSTITUTION_GRAPH, INGREDIENT_CORRELATION_GRAPH, INGREDIENT_COOCCURRENCE_GRAPH):
+            self._model.graphs[name].add_node(position, self._node_kind(name, INGREDIENT_NODE_TYPE))
+            
+            
+    def _remove_ingredient_node(self, position):
+        self._postings.kinds[position] = NO_NODE
+        for name in (RECIPE_INGREDIENT_RELATIONSHIP_GRAPH, INGREDIENT_SUBSTITUTION_GRAPH, INGREDIENT_CORRELATION_GRAPH, INGREDIENT_COOCCURRENCE_GRAPH):
+            self._model.graphs[name].remove_node(position)
             
+            
+    def _node_kind(self, name, node_type):
+        """Returns the index of a node type within the types of a graph, adding it if needed
+
+        """
+        types = self._model.metadata[name]['types']
+        if not node_type in types:
+            types.append(node_type)
+        return types.index(node_type)
+    
     
-    def _create_edges_of_belonging(self, recipes):
-        """Creates the edges of the graph, which relates the recipes with the ingredients that make it up
+    def _add_cooccurrence(self, u, v, count):
+        graph = self._model.graphs[INGREDIENT_COOCCURRENCE_GRAPH]
+        count = (graph.weight(u, v) or 0) + count
+        graph.set_weight(u, v, count if count > 0 else None)
+    
+    
+    def _add_substitution_weight(self, u, v, weight):
+        """Increase (or decrease) the weight of a substitution edge, creating it if needed. The edge is removed if its weight drops to 0.
 
         Args:
-            recipes (instance of an enumerator function): Recipes list. Each object returned by the iterator is expected to be a dictionary with the fields:
-                - nombre (str): Recipe name.
-                - ingredientes (list of dict): List of ingredients. Its fields are:
-                    - nombre (str): Nombre del ingrediente.
-                    - variantes (list of int): List of ingredients that can be substituted. The list contains positions within the `ingredients` list.
-            
-        """  
-        for recipe in recipes(): 
-            recipe_name = recipe['name']
+            u (int): Position of an ingredient.
+            v (int): Position of the other ingredient.
+            weight (int): Increment.
             
-            for ingredient in recipe['ingredients']:
-                ingredient_name = ingredient['name']
-                
-                #todo: ver si las propiedades de los nodos y las aristas, serán en español o inglés
-                tags = dict(filter(lambda elem: elem[0] in ['opcional', 'cantidad', 'unidad', 'forma'], ingredient.items()))
+        """
+        graph = self._model.graphs[INGREDIENT_SUBSTITUTION_GRAPH]
+        weight = (graph.weight(u, v) or 0) + weight
+        graph.set_weight(u, v, weight if weight > 0 else None)
+        
+        if INGREDIENT_SUBSTITUTION_GRAPH in self._graphs:
+            u, v = self._model.strings[u], self._model.strings[v]
+            if weight > 0:
+                self._graphs[INGREDIENT_SUBSTITUTION_GRAPH].add_edge(u, v, **edge_attributes(EDGE_SCHEMAS[INGREDIENT_SUBSTITUTION_GRAPH], weight))
+            elif self._graphs[INGREDIENT_SUBSTITUTION_GRAPH].has_edge(u, v):
+                self._graphs[INGREDIENT_SUBSTITUTION_GRAPH].remove_edge(u, v)
                 
-                #todo: analizar si poner peso contante a todas las aristas
-                tags['weight'] = 1
-                #todo: analizar si ponerle label a la arista y qué ponerle
                 
-                self.recipe_ingredient_relationship_graph.add_edge(recipe_name, ingredient_name, **tags) 
+    def _model_updated(self):
+        """Account for a change in the recipes of the model: the correlation values are outdated, and so are the NetworkX graphs already produced
+
+        """
+        self._stale_correlations = True
+        self._stale_inferred = INGREDIENT_INFERRED_SUBSTITUTION_GRAPH in self._model.graphs
+        self._frequency = None
+        self._views = dict()
+        self._search_indexes = dict()
+        self._graphs.clear()
+        self._model.embeddings.clear()
+        self.version += 1
+        
+        
+    def _load_update_statistics(self):
+        """Read the statistics needed by the model updates from the model metadata, the first time they are needed
+
+        """
+        if not self._relations is None:
+            return
+        
+        metadata = self._model.metadata
+        self._entries = dict((position, count) for position, count in metadata[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH].get('entries', []))
+        self._relations, self._recipe_relations = dict(), dict()
+        
+        for members, recipes in metadata[INGREDIENT_SUBSTITUTION_GRAPH].get('relations', []):
+            relation = frozenset(members)
+            self._relations[relation] = set(recipes)
+            for recipe in recipes:
+                self._recipe_relations.setdefault(recipe, set()).add(relation)
                 
                 
+    def _store_update_statistics(self):
+        """Write the statistics needed by the model updates back into the model metadata
+
+        """
+        if self._relations is None:
+            return
+        
+        metadata = self._model.metadata
+        metadata[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]['entries'] = [[position, count] for position, count in sorted(self._entries.items())]
+        metadata[INGREDIENT_SUBSTITUTION_GRAPH]['relations'] = [[sorted(relation), sorted(recipes)] for relation, recipes in self._relations.items()]
+        
+        
+    def _refresh_correlations(self):
+        """Recompute every correlation value from the co-occurrence counts, in a single pass, pruned as in the construction
+
+        """
+        graphs = self._model.graphs
+        firsts, seconds, counts = graphs[INGREDIENT_COOCCURRENCE_GRAPH].edges()
+        frequency = self._document_frequency()
+        n_recipes = self._model.metadata[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]['n_recipes']
+        
+        keep = prune_pairs(firsts, seconds, counts, frequency[firsts], frequency[seconds], n_recipes, **self._correlation_pruning())
+        firsts, seconds, counts = firsts[keep], seconds[keep], counts[keep]
+        values = pointwise_mutual_information_values(counts, frequency[firsts], frequency[seconds], n_recipes)
+        
+        nodes, kinds = graphs[INGREDIENT_CORRELATION_GRAPH].members()
+        graphs[INGREDIENT_CORRELATION_GRAPH] = CSRGraph.from_edges(len(self._model.strings), nodes, kinds, firsts.astype(np.int64), seconds.astype(np.int64), values)
+        self._stale_correlations = False
+        
+        
+    def _correlation_row(self, position):
+        """Returns the correlated ingredients of an ingredient, and the PMI values. If the model was updated, the values are computed from the co-occurrence counts.
+
+        Args:
+            position (int): Ingredient.
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray): Sorted ingredients, and PMI values.
+            
+        """
+        pruning = self._correlation_pruning()
+        # The best correlations of an ingredient depend on those of its neighbors, so they are all recomputed
+        if self._stale_correlations and not pruning['top_k'] is None:
+            self._refresh_correlations()
+        if not self._stale_correlations:
+            return self._model.graphs[INGREDIENT_CORRELATION_GRAPH].neighbors(position)
+        
+        neighbors, counts = self._model.graphs[INGREDIENT_COOCCURRENCE_GRAPH].neighbors(position)
+        frequency = self._document_frequency()
+        n_recipes = self._model.metadata[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]['n_recipes']
+        
+        keep = prune_pairs(np.full(len(neighbors), position), neighbors, counts, np.full(len(neighbors), frequency[position]), frequency[neighbors], n_recipes, **pruning)
+        neighbors, counts = neighbors[keep], counts[keep]
+        values = pointwise_mutual_information_values(counts, frequency[neighbors], np.full(len(neighbors), frequency[position]), n_recipes)
+        return neighbors, values
+    
+    
+    def _infer_substitutions(self, inference=None):
+        """Infer the substitutions from the co-occurrence counts: two ingredients are candidate substitutes when they are correlated with the same ingredients, but rarely appear in the same recipe (see `analysis.relation.distributional_substitutes`). The candidates are stored in their own graph, weighted by their similarity, so they are never mistaken for the curated substitutions (from the `variants` of the recipes and the feedback), which come first in `replace_ingredient`.
+
+        Args:
+            inference (dict, optional): Options of `distributional_substitutes`. Defaults to None (those with which the model was built).
+            
+        """
+        graphs, metadata = self._model.graphs, self._model.metadata
+        if inference is None:
+            inference = metadata[INGREDIENT_INFERRED_SUBSTITUTION_GRAPH][SUBSTITUTION_INFERENCE]
+        kinds = self._postings.kinds
+        n_recipes = metadata[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]['n_recipes']
+        
+        ingredients = np.flatnonzero(kinds == INGREDIENT)
+        firsts, seconds, counts = graphs[INGREDIENT_COOCCURRENCE_GRAPH].edges()
+        keep = (kinds[firsts] == INGREDIENT) & (kinds[seconds] == INGREDIENT)
+        firsts, seconds, similarity = distributional_substitutes(
+            np.searchsorted(ingredients, firsts[keep]), np.searchsorted(ingredients, seconds[keep]), counts[keep],
+            self._document_frequency()[ingredients], n_recipes, **inference
+        )
+        
+        nodes, node_kinds = graphs[INGREDIENT_CORRELATION_GRAPH].members()
+        graphs[INGREDIENT_INFERRED_SUBSTITUTION_GRAPH] = CSRGraph.from_edges(len(self._model.strings), nodes, node_kinds, ingredients[firsts], ingredients[seconds], similarity)
+        metadata[INGREDIENT_INFERRED_SUBSTITUTION_GRAPH] = dict([
+            ('types', list(metadata[INGREDIENT_CORRELATION_GRAPH]['types'])),
+            ('schema', EDGE_SCHEMAS[INGREDIENT_INFERRED_SUBSTITUTION_GRAPH]),
+            ('extra', []),
+            (SUBSTITUTION_INFERENCE, dict(inference))
+        ])
+        self._stale_inferred = False
+        self.metrics.count('edges_emitted', len(similarity), graph=INGREDIENT_INFERRED_SUBSTITUTION_GRAPH)
+        
+        
+    def _create_embeddings(self):
+        """Compute the vectors of the ingredients, by factorizing the PMI matrix of the correlation graph (see `analysis.embedding.factorize`), and the vectors of the recipes, as the mean of those of their ingredients (see `analysis.embedding.aggregate`)
+
+        """
+        if self._stale_correlations:
+            self._refresh_correlations()
+        graphs = self._model.graphs
+        kinds = self._postings.kinds
+        dim = self._model.metadata[INGREDIENT_CORRELATION_GRAPH].get(EMBEDDING_DIM, DEFAULT_EMBEDDING_DIM)
+        
+        firsts, seconds, values = graphs[INGREDIENT_CORRELATION_GRAPH].edges()
+        ingredients = factorize(np.flatnonzero(kinds == INGREDIENT), firsts, seconds, values, dim)
+        
+        firsts, seconds, _ = graphs[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH].edges()
+        recipes = np.where(kinds[firsts] == RECIPE, firsts, seconds)
+        members = np.where(kinds[firsts] == RECIPE, seconds, firsts)
+        keep = (kinds[recipes] == RECIPE) & (kinds[members] == INGREDIENT)
+        
+        self._model.embeddings[INGREDIENT_EMBEDDINGS] = ingredients
+        self._model.embeddings[RECIPE_EMBEDDINGS] = aggregate(ingredients, recipes[keep], members[keep])
+        
+        
+    def _embeddings(self, name):
+        """Returns the vectors of the ingredients or of the recipes. They are computed on first use if the model was updated, or stored without them.
+        """
+        if not name in self._model.embeddings:
+            with self.metrics.phase('embeddings'):
+                self._create_embeddings()
+        return self._model.embeddings[name]
+    
+    
+    def _correlation_pruning(self):
+        """Returns the pruning of the correlation graph with which the model was built (see `_create_model`)
+        """
+        return dict(DEFAULT_PRUNING, **self._model.metadata[INGREDIENT_CORRELATION_GRAPH].get(CORRELATION_PRUNING, dict()))
+    
+    
+    def _document_frequency(self):
+        if self._frequency is None:
+            self._frequency = self._postings.frequency()
+        return self._frequency
+            
+    
     ########################################
     ### INFORMATION EXTRACTION FUNCTIONS ###
     ########################################
     
-    def replace_ingredient(self, ingredient):
-        """Returns a list of ingredients that can replace the one defined
+    def recipes(self):
+        """Returns the recipes of the model, sorted by name. The view is created once, and shared by the following calls until the model is updated.
+
+        Returns:
+            LabelView: Recipe names (see `analysis.index.LabelView`).
+            
+        """
+        return self._label_view(RECIPE)
+    
+    
+    def ingredients(self):
+        """Returns the ingredients of the model, sorted by name. The view is created once, and shared by the following calls until the model is updated.
+
+        Returns:
+            LabelView: Ingredient names (see `analysis.index.LabelView`).
+            
+        """
+        return self._label_view(INGREDIENT)
+    
+    
+    def ingredients_of(self, recipe):
+        """Returns the ingredients of a recipe
 
         Args:
-            ingredient (str): Ingredient name.
+            recipe (str): Recipe name.
             
         Raises:
-            networkx.exception.NetworkXError: If the ingredient does not appear in the list of nodes
+            RecipeNotFoundError: If the recipe does not appear in the graph.
 
         Returns:
-            list of str: List of ingredients.
+            list of str: Ingredient names, in the order in which they were added to the model.
             
-        """  
-        values = [i for i in self.ingredient_substitution_graph.neighbors(ingredient)]
-        rnd.shuffle(values)
-        return values
+        """
+        ingredients, _ = self._model.graphs[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH].neighbors(self._recipe_position(recipe))
+        ingredients = ingredients[self._postings.kinds[ingredients] == INGREDIENT]
+        return [self._model.strings[ingredient] for ingredient in ingredients.tolist()]
+    
+    
+    def _label_view(self, kind):
+        if kind == INGREDIENT:
+            self._load_ingredient_graphs()
+        if not kind in self._views:
+            self._views[kind] = LabelView.of_kind(self._model.strings, self._postings.kinds, kind)
+        return self._views[kind]
+    
     
-    def recipes_with(self, ingredients, match_all=False):
-        """Returns recipes that contain the defined ingredients
+    @cached_query(lambda query, limit=DEFAULT_SEARCH_LIMIT: (' '.join(query.lower().split()), limit))
+    def search_recipes(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        """Returns the recipes whose names best match the text typed so far, for type-ahead. Names that start with the text come first, then those in which every typed word starts some word of the name, and then those that match with a few typos (see `analysis.search.SearchIndex`). The search index is built on first use, and rebuilt when the model is updated. Results are cached (see `cache_stats`).
 
         Args:
-            - ingredients (list of str): Lista de ingredientes.
-            - match_all (bool, optional): Indicates if the recipes to be returned must have all the ingredients defined. Defaults to False.
+            query (str): Text typed so far.
+            limit (int, optional): Maximum number of recipes. Defaults to 10.
+
+        Returns:
+            list of str: Recipe names, best first.
             
-        Raises:
-            networkx.exception.NetworkXError: If any ingredient on the list does not appear in the graph.
+        """
+        return self._search_index(RECIPE).search(query, limit)
+    
+    
+    @cached_query(lambda query, limit=DEFAULT_SEARCH_LIMIT: (' '.join(query.lower().split()), limit))
+    def search_ingredients(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        """Returns the ingredients whose names best match the text typed so far, for type-ahead (see `search_recipes`)
+
+        Args:
+            query (str): Text typed so far.
+            limit (int, optional): Maximum number of ingredients. Defaults to 10.
 
         Returns:
-            list of str | list of (str, int): If match_all = True then a list with the name of the recipes is returned, such that all the ingredients defined in `ingredients` appear in it. Otherwise, it returns a list of recipe names and the number of ingredients that appear in it, according to those defined, ordered from greatest intersection to least.
+            list of str: Ingredient names, best first.
             
-        """ 
-        associated_recipes = set(ingredients)
-        for ingredient in ingredients:
-            # Because of the way the graph is built, those adjacent to the ingredients are recipes.
-            for adjacent in self.recipe_ingredient_relationship_graph.neighbors(ingredient):
-                associated_recipes.add(adjacent)
+        """
+        return self._search_index(INGREDIENT).search(query, limit)
+    
+    
+    def _search_index(self, kind):
+        if not kind in self._search_indexes:
+            self._search_indexes[kind] = SearchIndex(self._label_view(kind).labels)
+        return self._search_indexes[kind]
+    
+    
+    def cache_stats(self):
+        """Returns the statistics of the query cache, to size it
+
+        Returns:
+            dict: Number of hits, misses, evictions (by size), expirations (by time) and invalidations (by a change of the model), current number of entries, and maximum number of entries.
+            
+        """
+        return self._cache.stats()
+    
+    
+    def load_stats(self):
+        """Returns how the graphs of the model were loaded, to tell whether the first queries waited for them (see `prefetch` in `__init__`)
+
+        Returns:
+            dict(str, dict): For each graph name: whether it is loaded, the time spent loading it by the query (or the loading of the model) that accessed it first, the time its prefetch took in the background, and the part of the first that was spent waiting for the second, in seconds. Times are None when they do not apply, e.g. for a graph not loaded yet, not prefetched, or built rather than loaded.
+            
+        """
+        graphs = self._model.graphs
+        stats = dict()
+        for name in graphs:
+            timings = graphs.timings.get(name, dict())
+            stats[name] = dict([('loaded', graphs.is_loaded(name))])
+            for field in ['seconds', 'prefetch_seconds', 'waited_seconds']:
+                stats[name][field] = None if timings.get(field) is None else round(timings[field], 6)
+        return stats
+    
+    
+    def _substitution_candidates(self):
+        """Returns the best substitutes of every ingredient (see `replace_ingredient`), ranking them on first use if the model was stored without them
+
+        """
+        lists = self._model.lists
+        if not SUBSTITUTION_CANDIDATES in lists:
+            lists[SUBSTITUTION_CANDIDATES] = RankedLists.top(self._model.graphs[INGREDIENT_SUBSTITUTION_GRAPH], MAX_SUBSTITUTION_CANDIDATES)
+        return lists[SUBSTITUTION_CANDIDATES]
+    
     
-        subgraph = nx.subgraph(self.recipe_ingredient_relationship_graph, associated_recipes)
-        recipe_nodes = [node for node, data in subgraph.nodes(data=True) if data['type'] == 'recipe_name']
-        degrees = sorted(nx.degree(subgraph, recipe_nodes), key=lambda x: x[1], reverse=True)
+    @cached_query(lambda ingredient, limit=None, recipe=None, inferred=True: (ingredient, limit, recipe, bool(inferred)))
+    def replace_ingredient(self, ingredient, limit=None, recipe=None, inferred=True):
+        """Returns a list of ingredients that can replace the one defined, from best to worst
+
+        Without a recipe, the candidates are ranked by their substitution weight, that is, the number of distinct substitution relations they share with the ingredient. The best `MAX_SUBSTITUTION_CANDIDATES` candidates of every ingredient are precomputed, so the lookup is a single array slice.
+        
+        With a recipe, the score of a candidate is its substitution weight plus its compatibility with the rest of the recipe: the mean PMI between the candidate and the other ingredients of the recipe, where a pair that never appears in the same recipe (or whose correlation was pruned, see `__init__`) counts as 0. Candidates already present in the recipe are discarded.
+        
+        If the model was built with `infer_substitutions`, the inferred substitutes (see `_infer_substitutions`) follow the curated ones, ranked in the same way with their similarity in place of the substitution weight. They are inferred again when the model is stored, so the updates made since then do not change them.
+        
+        Ties are broken by the order in which the ingredients were added to the model, so the result is deterministic. Results are cached (see `cache_stats`).
+
+        Args:
+            ingredient (str): Ingredient name.
+            limit (int, optional): Maximum number of ingredients to return. Defaults to None (all of them).
+            recipe (str, optional): Name of the recipe in which the ingredient is replaced. Defaults to None.
+            inferred (bool, optional): Whether to include the inferred substitutes. Defaults to True.
+            
+        Raises:
+            IngredientNotFoundError: If the ingredient does not appear in the graph.
+            RecipeNotFoundError: If the recipe does not appear in the graph.
 
-        return [recipe for (recipe, degree) in degrees if degree == len(ingredients)] \
-            if match_all else degrees
+        Returns:
+            list of str: List of ingredients.
+            
+        """  
+        position = self._ingredient_position(ingredient)
+        strings = self._model.strings
+        graph = self._model.graphs[INGREDIENT_SUBSTITUTION_GRAPH]
+        lists = self._substitution_candidates()
+        
+        if recipe is None:
+            precomputed = position < len(lists.indptr) - 1 and not graph.is_modified(position)
+            if precomputed and (graph.degree(position) <= MAX_SUBSTITUTION_CANDIDATES or (limit is not None and limit <= MAX_SUBSTITUTION_CANDIDATES)):
+                candidates, _ = lists[position]
+            else:
+                candidates, weights = graph.neighbors(position)
+                candidates = candidates[np.lexsort((candidates, -weights))]
+            if inferred and (limit is None or len(candidates) < limit):
+                candidates = np.concatenate([candidates, self._inferred_candidates(position, graph.neighbors(position)[0])])
+            return [strings[candidate] for candidate in candidates[:limit].tolist()]
+        
+        ingredients, _ = self._model.graphs[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH].neighbors(self._recipe_position(recipe))
+        others = ingredients[(ingredients != position) & (self._postings.kinds[ingredients] == INGREDIENT)]
+        
+        curated, weights = graph.neighbors(position)
+        keep = ~np.isin(curated, others)
+        candidates, weights = curated[keep], weights[keep]
+        
+        scores = weights + np.array([self._compatibility(candidate, others) for candidate in candidates.tolist()], dtype=np.float64)
+        candidates = candidates[np.lexsort((candidates, -scores))]
+        if inferred and (limit is None or len(candidates) < limit):
+            candidates = np.concatenate([candidates, self._inferred_candidates(position, np.concatenate([curated, others]), others)])
+        return [strings[candidate] for candidate in candidates[:limit].tolist()]
     
     
+    def _inferred_candidates(self, position, excluded, others=None):
+        """Returns the inferred substitutes of an ingredient, best first (see `replace_ingredient`)
+
+        Args:
+            position (int): Ingredient.
+            excluded (numpy.ndarray): Ingredients left out (the curated substitutes, and those of the recipe).
+            others (numpy.ndarray, optional): Other ingredients of the recipe, whose compatibility with each candidate is added to its similarity. Defaults to None (no recipe).
+
+        Returns:
+            numpy.ndarray: Candidates.
+            
+        """
+        graph = self._model.graphs.get(INGREDIENT_INFERRED_SUBSTITUTION_GRAPH)
+        if graph is None:
+            return np.zeros(0, dtype=np.int32)
+        
+        candidates, scores = graph.neighbors(position)
+        keep = (self._postings.kinds[candidates] == INGREDIENT) & ~np.isin(candidates, excluded)
+        candidates, scores = candidates[keep], scores[keep]
+        if not others is None:
+            scores = scores + np.array([self._compatibility(candidate, others) for candidate in candidates.tolist()], dtype=np.float64)
+        return candidates[np.lexsort((candidates, -scores))]
     
     
+    @cached_query(lambda ingredient, limit=None: (ingredient, limit))
+    def inferred_substitutes(self, ingredient, limit=None):
+        """Returns the substitutes of an ingredient inferred from the recipes (see `_infer_substitutions`), whether or not they are also curated ones, from most to least similar. Results are cached (see `cache_stats`).
+
+        Args:
+            ingredient (str): Ingredient name.
+            limit (int, optional): Maximum number of ingredients to return. Defaults to None (all of them).
+            
+        Raises:
+            IngredientNotFoundError: If the ingredient does not appear in the graph.
+
+        Returns:
+            list of (str, float): Ingredient names and similarities. Empty if the model was built without `infer_substitutions`.
+            
+        """
+        position = self._ingredient_position(ingredient)
+        graph = self._model.graphs.get(INGREDIENT_INFERRED_SUBSTITUTION_GRAPH)
+        if graph is None:
+            return []
         
+        candidates, similarity = graph.neighbors(position)
+        keep = self._postings.kinds[candidates] == INGREDIENT
+        candidates, similarity = candidates[keep], similarity[keep]
+        order = np.lexsort((candidates, -similarity))[:limit]
+        return [(self._model.strings[candidate], value) for candidate, value in zip(candidates[order].tolist(), similarity[order].tolist())]
+    
+    
+    def _compatibility(self, position, others):
+        """Returns the mean PMI between an ingredient and a set of ingredients. Pairs that never appear in the same recipe count as 0.
+
+        Args:
+            position (int): Ingredient.
+            others (numpy.ndarray): Ingredients.
+
+        Returns:
+            float: Compatibility.
+            
+        """
+        if len(others) == 0:
+            return 0.0
         
+        neighbors, values = self._correlation_row(position)
+        found = np.searchsorted(neighbors, others)
+        found = found[found < len(neighbors)]
+        found = found[np.isin(neighbors[found], others)]
         
+        return float(values[found].sum()) / len(others)
+    
+    
+    @cached_query(lambda ingredients, match_all=False, limit=None: (frozenset(ingredients), bool(match_all), limit))
+    def recipes_with(self, ingredients, match_all=False, limit=None):
+        """Returns recipes that contain the defined ingredients. The recipes are obtained from the posting lists of the ingredients (see `analysis.index.PostingIndex`), so the cost depends on the length of those lists and not on the size of the graph. Results are cached (see `cache_stats`); the order of the ingredients does not matter.
+
+        Args:
+            - ingredients (list of str): Lista de ingredientes.
+            - match_all (bool, optional): Indicates if the recipes to be returned must have all the ingredients defined. Defaults to False.
+            - limit (int, optional): Maximum number of recipes to return. Defaults to None (all of them).
+            
+        Raises:
+            IngredientNotFoundError: If any ingredient on the list does not appear in the graph.
+
+        Returns:
+            list of str | list of (str, int): If match_all = True then a list with the name of the recipes is returned, such that all the ingredients defined in `ingredients` appear in it. Otherwise, it returns a list of recipe names and the number of ingredients that appear in it, according to those defined, ordered from greatest intersection to least. Recipes with the same number of ingredients keep the order in which they were added to the model.
+            
+        """ 
+        positions = [self._ingredient_position(ingredient) for ingredient in ingredients]
+        strings = self._model.strings
         
+        if match_all:
+            recipes = self._postings.intersection(positions).tolist()
+            return [strings[recipe] for recipe in recipes[:limit]]
         
+        recipes, counts = self._postings.overlap(positions, limit)
+        return [(strings[recipe], count) for recipe, count in zip(recipes.tolist(), counts.tolist())]
+    
+    
+    @cached_query(lambda pantry, max_missing=0, limit=None: (frozenset(pantry), max_missing, limit), copy=lambda result: [(recipe, list(missing)) for recipe, missing in result])
+    def recipes_from_pantry(self, pantry, max_missing=0, limit=None):
+        """Returns the recipes that can be cooked with the ingredients of a pantry, lacking at most `max_missing` of their ingredients. Results are cached (see `cache_stats`).
+
+        Args:
+            - pantry (list of str): Available ingredients. Those that do not appear in the graph are ignored.
+            - max_missing (int, optional): Maximum number of missing ingredients. Defaults to 0.
+            - limit (int, optional): Maximum number of recipes to return. Defaults to None (all of them).
+
+        Returns:
+            list of (str, list of str): Recipe names and their missing ingredients, ordered from fewest to most missing ingredients. Recipes with the same number of missing ingredients are ordered from most to least ingredients used from the pantry.
+            
+        """
+        strings = self._model.strings
+        kinds = self._postings.kinds
+        graph = self._model.graphs[RECIPE_INGREDIENT_RELATIONSHIP_GRAPH]
         
+        positions = [strings.find(ingredient) for ingredient in pantry]
+        positions = set(position for position in positions if position >= 0 and kinds[position] == INGREDIENT)
         
+        result = []
+        recipes, _ = self._postings.makeable(list(positions), max_missing, limit)
+        for recipe in recipes.tolist():
+            ingredients, _ = graph.neighbors(recipe)
+            missing = [strings[ingredient] for ingredient in ingredients.tolist() if not ingredient in positions and kinds[ingredient] == INGREDIENT]
+            result.append((strings[recipe], missing))
+            
+        return result
+    
+    
+    @cached_query(lambda recipe, limit=DEFAULT_SIMILAR_LIMIT: (recipe, limit))
+    def similar_recipes(self, recipe, limit=DEFAULT_SIMILAR_LIMIT):
+        """Returns the recipes most similar to a recipe, by the cosine similarity of their vectors. The vector of a recipe is the mean of the vectors of its ingredients, which are close when the ingredients are correlated with the same ingredients (see `analysis.embedding`), so similar recipes need not share any ingredient. Results are cached (see `cache_stats`).
+
+        Args:
+            recipe (str): Recipe name.
+            limit (int, optional): Maximum number of recipes. Defaults to 10.
+            
+        Raises:
+            RecipeNotFoundError: If the recipe does not appear in the graph.
+
+        Returns:
+            list of (str, float): Recipe names and similarities (between -1 and 1), from most to least similar. Empty if none of the ingredients of the recipe has a vector.
+            
+        """
+        return self.similar_recipes_batch([recipe], limit)[0]
+    
+    
+    def similar_recipes_batch(self, recipes, limit=DEFAULT_SIMILAR_LIMIT):
+        """Returns the recipes most similar to each recipe of a batch (see `similar_recipes`). The whole batch is scored with a single matrix product per block of recipes, so it costs little more than one query.
+
+        Args:
+            recipes (list of str): Recipe names.
+            limit (int, optional): Maximum number of recipes per query. Defaults to 10.
+            
+        Raises:
+            RecipeNotFoundError: If any recipe does not appear in the graph.
+
+        Returns:
+            list of list of (str, float): Result of each recipe.
+            
+        """
+        return self._similar(RECIPE_EMBEDDINGS, [self._recipe_position(recipe) for recipe in recipes], limit)
+    
+    
+    @cached_query(lambda ingredient, limit=DEFAULT_SIMILAR_LIMIT: (ingredient, limit))
+    def similar_ingredients(self, ingredient, limit=DEFAULT_SIMILAR_LIMIT):
+        """Returns the ingredients that behave most like an ingredient: those correlated with the same ingredients, by the cosine similarity of their vectors (see `analysis.embedding.factorize`). Results are cached (see `cache_stats`).
+
+        Args:
+            ingredient (str): Ingredient name.
+            limit (int, optional): Maximum number of ingredients. Defaults to 10.
+            
+        Raises:
+            IngredientNotFoundError: If the ingredient does not appear in the graph.
+
+        Returns:
+            list of (str, float): Ingredient names and similarities (between -1 and 1), from most to least similar. Empty if the ingredient has no vector (it has no positive correlation).
+            
+        """
+        return self.similar_ingredients_batch([ingredient], limit)[0]
+    
+    
+    def similar_ingredients_batch(self, ingredients, limit=DEFAULT_SIMILAR_LIMIT):
+        """Returns the ingredients most similar to each ingredient of a batch (see `similar_ingredients` and `similar_recipes_batch`)
+
+        Args:
+            ingredients (list of str): Ingredient names.
+            limit (int, optional): Maximum number of ingredients per query. Defaults to 10.
+            
+        Raises:
+            IngredientNotFoundError: If any ingredient does not appear in the graph.
+
+        Returns:
+            list of list of (str, float): Result of each ingredient.
+            
+        """
+        return self._similar(INGREDIENT_EMBEDDINGS, [self._ingredient_position(ingredient) for ingredient in ingredients], limit)
+    
+    
+    def _similar(self, name, positions, limit):
+        """Returns the nearest neighbours of a batch of nodes, excluding the nodes themselves
+
+        Args:
+            name (str): Embeddings searched.
+            positions (list of int): Nodes.
+            limit (int): Maximum number of neighbours per node.
+
+        Returns:
+            list of list of (str, float): Names and similarities of the neighbours of each node.
+            
+        """
+        strings = self._model.strings
+        embeddings = self._embeddings(name)
+        results = [[] for _ in positions]
         
+        rows = embeddings.rows(positions)
+        found = np.flatnonzero(rows >= 0)
+        if len(found) == 0:
+            return results
         
- 
\ No newline at end of file
+        neighbors, scores = embeddings.nearest(embeddings.vectors[rows[found]], limit, exclude=rows[found])
+        for i, row_neighbors, row_scores in zip(found.tolist(), neighbors, scores):
+            keep = row_neighbors >= 0
+            results[i] = [(strings[position], round(score, 4)) for position, score in zip(embeddings.positions[row_neighbors[keep]].tolist(), row_scores[keep].tolist())]
+        return results
+    
+    
+    def _recipe_position(self, recipe):
+        """Returns the position of a recipe in the model
+
+        Args:
+            recipe (str): Recipe name.
+            
+        Raises:
+            RecipeNotFoundError: If the recipe does not appear in the graph.
+
+        Returns:
+            int: Position.
+            
+        """
+        position = self._model.strings.find(recipe)
+        if position < 0 or self._postings.kinds[position] != RECIPE:
+            raise RecipeNotFoundError('Recipe `' + str(recipe) + '` does not appear in the graph.')
+        return position
+    
+    
+    def _ingredient_position(self, ingredient):
+        """Returns the position of an ingredient in the model
+
+        Args:
+            ingredient (str): Ingredient name.
+            
+        Raises:
+            IngredientNotFoundError: If the ingredient does not appear in the graph.
+
+        Returns:
+            int: Position.
+            
+        """
+        position = self._model.strings.find(ingredient)
+        if position >= 0 and self._postings.kinds[position] == NO_NODE:
+            self._load_ingredient_graphs()
+        if position < 0 or self._postings.kinds[position] != INGREDIENT:
+            raise IngredientNotFoundError('Ingredient `' + str(ingredient) + '` does not appear in the graph.')
+        return position
@@ -0,0 +1,87 @@
+# -*- coding:utf-8 -*-
+
+import hashlib
+import json
+import os
+
+# Format of the manifest, and of the keys of the artifacts. Changing it invalidates every stored manifest, so the next build starts from scratch.
+MANIFEST_VERSION = 3
+# Size of the blocks in which the files are hashed
+HASH_BLOCK = 1 << 20
+
+
+def file_digest(fpath, previous=None):
+    """Returns the SHA-256 of the contents of a file. A file whose size and modification time did not change since a previous digest is not read again.
+
+    Args:
+        fpath (str): Path of the file.
+        previous (dict, optional): Digest returned for the same file by a previous call. Defaults to None.
+
+    Returns:
+        dict: Path, size, modification time (in nanoseconds) and SHA-256 (hexadecimal) of the file.
+
+    """
+    stat = os.stat(fpath)
+    if not previous is None and previous.get('size') == stat.st_size and previous.get('mtime_ns') == stat.st_mtime_ns:
+        return dict(previous, path=fpath)
+
+    sha256 = hashlib.sha256()
+    with open(fpath, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            sha256.update(block)
+
+    return dict([
+        ('path', fpath),
+        ('size', stat.st_size),
+        ('mtime_ns', stat.st_mtime_ns),
+        ('sha256', sha256.hexdigest())
+    ])
+
+
+def content_key(*values):
+    """Returns the key of an artifact, from everything it is derived from (e.g. the digest of its input files and its options)
+
+    Args:
+        values: JSON serializable values.
+
+    Returns:
+        str: SHA-256 (hexadecimal) of the values.
+
+    """
+    encoded = json.dumps([MANIFEST_VERSION] + list(values), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf8')).hexdigest()
+
+
+def write_manifest(fpath, manifest):
+    """Store a manifest as JSON. It is written next to its destination and then renamed, so readers never see a partial manifest.
+
+    Args:
+        fpath (str): Path of the file.
+        manifest (dict): JSON serializable manifest.
+
+    """
+    temporary = fpath + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(dict(manifest, version=MANIFEST_VERSION), f, indent=2, sort_keys=True)
+    os.replace(temporary, fpath)
+
+
+def read_manifest(fpath):
+    """Read a manifest stored with `write_manifest`
+
+    Args:
+        fpath (str): Path of the file.
+
+    Returns:
+        dict | None: Manifest, or None if the file does not exist, cannot be read, or was written with another `MANIFEST_VERSION`.
+
+    """
+    try:
+        with open(fpath) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
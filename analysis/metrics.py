@@ -0,0 +1,319 @@
+# -*- coding:utf-8 -*-
+
+import cProfile
+import contextlib
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds of the buckets of the latency histograms, in seconds
+LATENCY_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+# Prefix of the names of the metrics in the Prometheus text format
+METRICS_PREFIX = 'recipes_engine_'
+
+logger = logging.getLogger(__name__)
+
+_NO_PHASE = contextlib.nullcontext()
+
+
+class Metrics:
+    """
+    Opt-in instrumentation of the construction, loading and queries of a `FoodGraph`. It records:
+        - Phase timers: time spent in each phase (e.g. 'build.correlations'), and number of times it ran.
+        - Counters: number of items processed (e.g. pairs of ingredients evaluated, edges emitted), optionally by labels (e.g. `graph`).
+        - Histograms: query latencies, by query and by whether the result was cached, in the buckets of `LATENCY_BUCKETS`.
+    Every phase is logged as a structured (JSON) record when it ends; `records` returns all the metrics in the same form, and `prometheus` in the Prometheus text format. With `profile`, the code run inside `profiling` blocks is also profiled with `cProfile`.
+
+    A disabled instance records nothing, and its phases are a shared no-op context, so the instrumented code costs almost nothing when nobody asked for the metrics.
+    """
+
+    def __init__(self, enabled=True, profile=False, log_phases=True):
+        """
+        Args:
+            enabled (bool, optional): Whether to record anything. Defaults to True.
+            profile (bool, optional): Whether to profile the `profiling` blocks with `cProfile` (see `profile_stats`). Defaults to False.
+            log_phases (bool, optional): Whether to log every phase as it ends. Defaults to True.
+
+        """
+        self.enabled = enabled
+        self.log_phases = log_phases
+        self._profiler = cProfile.Profile() if enabled and profile else None
+        self._profiling = 0
+        self._lock = threading.Lock()
+        # phase -> [seconds, runs]
+        self._phases = dict()
+        # (name, labels) -> value
+        self._counters = dict()
+        # (name, labels) -> [count of each bucket, sum, count]
+        self._histograms = dict()
+
+
+    def phase(self, name):
+        """Context that times a phase. Phases may be nested; each one accounts for its whole duration.
+
+        Args:
+            name (str): Phase name.
+
+        Returns:
+            context manager: Timer.
+
+        """
+        if not self.enabled:
+            return _NO_PHASE
+        return self._phase(name)
+
+
+    @contextlib.contextmanager
+    def _phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+
+    def add_time(self, name, seconds, runs=1):
+        """Account for time spent in a phase, measured by the caller (e.g. accumulated over the iterations of a loop)
+
+        Args:
+            name (str): Phase name.
+            seconds (float): Time spent.
+            runs (int, optional): Number of runs of the phase. Defaults to 1.
+
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            phase = self._phases.setdefault(name, [0.0, 0])
+            phase[0] += seconds
+            phase[1] += runs
+        if self.log_phases:
+            logger.info(json.dumps(dict([('event', 'phase'), ('phase', name), ('seconds', round(seconds, 6))])))
+
+
+    def iterate(self, iterable, name):
+        """Yields the items of an iterable, accounting the time spent producing them (e.g. reading and decoding the recipes of a file) as a phase, reported when the iteration ends
+
+        Args:
+            iterable (iterable): Items.
+            name (str): Phase name.
+
+        Returns:
+            iterable: The same items.
+
+        """
+        if not self.enabled:
+            return iterable
+        return self._iterate(iterable, name)
+
+
+    def _iterate(self, iterable, name):
+        clock = time.perf_counter
+        iterator = iter(iterable)
+        seconds = 0.0
+        try:
+            while True:
+                start = clock()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += clock() - start
+                yield item
+        finally:
+            self.add_time(name, seconds)
+
+
+    def count(self, name, value=1, **labels):
+        """Increase a counter
+
+        Args:
+            name (str): Counter name.
+            value (int, optional): Increment. Defaults to 1.
+            labels (str): Labels of the counter, e.g. `graph='ingredient_correlation_graph'`.
+
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+
+    def observe(self, name, seconds, **labels):
+        """Record a latency in a histogram
+
+        Args:
+            name (str): Histogram name.
+            seconds (float): Latency.
+            labels (str): Labels of the histogram, e.g. `query='recipes_with'`.
+
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+            histogram[0][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+
+    @contextlib.contextmanager
+    def profiling(self):
+        """Context whose code is profiled, if the instance was created with `profile`. Nested blocks are profiled once.
+        """
+        if self._profiler is None:
+            yield
+            return
+
+        self._profiling += 1
+        if self._profiling == 1:
+            self._profiler.enable()
+        try:
+            yield
+        finally:
+            self._profiling -= 1
+            if self._profiling == 0:
+                self._profiler.disable()
+
+
+    def profile_stats(self, sort='cumulative', limit=30):
+        """Returns the report of the profiled code
+
+        Args:
+            sort (str, optional): Sort key of `pstats.Stats`. Defaults to 'cumulative'.
+            limit (int, optional): Number of functions reported. Defaults to 30.
+
+        Returns:
+            str | None: Report, or None if nothing was profiled.
+
+        """
+        if self._profiler is None or not self._profiler.getstats():
+            return None
+        stream = io.StringIO()
+        pstats.Stats(self._profiler, stream=stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+    def dump_profile(self, fpath):
+        """Store the profile in a file that `pstats` or a viewer (e.g. snakeviz) can read
+
+        Args:
+            fpath (str): File path.
+
+        Raises:
+            ValueError: If the instance was not created with `profile`.
+
+        """
+        if self._profiler is None:
+            raise ValueError('The metrics were not created with `profile`.')
+        self._profiler.dump_stats(fpath)
+
+
+    def records(self):
+        """Returns every metric as a structured record
+
+        Returns:
+            list of dict: Records. Their `type` is 'phase' (with `phase`, `seconds` and `runs`), 'counter' (with `name`, `labels` and `value`) or 'histogram' (with `name`, `labels`, `count`, `sum` and the cumulative count of every bucket, by upper bound, in `buckets`).
+
+        """
+        with self._lock:
+            records = [dict([('type', 'phase'), ('phase', name), ('seconds', round(seconds, 6)), ('runs', runs)]) for name, (seconds, runs) in self._phases.items()]
+            records += [dict([('type', 'counter'), ('name', name), ('labels', dict(labels)), ('value', value)]) for (name, labels), value in self._counters.items()]
+            for (name, labels), (buckets, total, count) in self._histograms.items():
+                cumulative = list(_cumulative(buckets))
+                records.append(dict([
+                    ('type', 'histogram'), ('name', name), ('labels', dict(labels)), ('count', count), ('sum', round(total, 6)),
+                    ('buckets', dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'], cumulative)))
+                ]))
+        return records
+
+
+    def log(self, level=logging.INFO):
+        """Log every metric as a structured (JSON) record (see `records`)
+        """
+        for record in self.records():
+            logger.log(level, json.dumps(record))
+
+
+    def prometheus(self):
+        """Returns every metric in the Prometheus text format
+
+        Returns:
+            str: Phase times as `recipes_engine_phase_seconds_total` and `recipes_engine_phase_runs_total` (label `phase`), every counter as `recipes_engine_<name>_total`, and every histogram as `recipes_engine_<name>`.
+
+        """
+        lines = []
+        with self._lock:
+            if self._phases:
+                lines.append('# TYPE ' + METRICS_PREFIX + 'phase_seconds_total counter')
+                lines += [METRICS_PREFIX + 'phase_seconds_total' + _labels(dict(phase=name)) + ' ' + repr(seconds) for name, (seconds, _) in self._phases.items()]
+                lines.append('# TYPE ' + METRICS_PREFIX + 'phase_runs_total counter')
+                lines += [METRICS_PREFIX + 'phase_runs_total' + _labels(dict(phase=name)) + ' ' + str(runs) for name, (_, runs) in self._phases.items()]
+
+            for name in dict.fromkeys(name for name, _ in self._counters):
+                lines.append('# TYPE ' + METRICS_PREFIX + name + '_total counter')
+                lines += [METRICS_PREFIX + name + '_total' + _labels(dict(labels)) + ' ' + str(value) for (other, labels), value in self._counters.items() if other == name]
+
+            for name in dict.fromkeys(name for name, _ in self._histograms):
+                lines.append('# TYPE ' + METRICS_PREFIX + name + ' histogram')
+                for (other, labels), (buckets, total, count) in self._histograms.items():
+                    if other != name:
+                        continue
+                    labels = dict(labels)
+                    for bound, cumulative in zip([repr(bound) for bound in LATENCY_BUCKETS] + ['+Inf'], _cumulative(buckets)):
+                        lines.append(METRICS_PREFIX + name + '_bucket' + _labels(dict(labels, le=bound)) + ' ' + str(cumulative))
+                    lines.append(METRICS_PREFIX + name + '_sum' + _labels(labels) + ' ' + repr(total))
+                    lines.append(METRICS_PREFIX + name + '_count' + _labels(labels) + ' ' + str(count))
+
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+    def __getstate__(self):
+        # Sent to other processes without the lock and the profiler
+        state = dict(self.__dict__)
+        del state['_lock']
+        state['_profiler'] = None
+        state['_profiling'] = 0
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+    def reset(self):
+        """Discard every metric recorded so far, and the profile
+        """
+        with self._lock:
+            self._phases.clear()
+            self._counters.clear()
+            self._histograms.clear()
+        if not self._profiler is None and self._profiling == 0:
+            self._profiler = cProfile.Profile()
+
+
+def _cumulative(buckets):
+    total = 0
+    for count in buckets:
+        total += count
+        yield total
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(name + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"' for name, value in labels.items()) + '}'
+
+
+# Shared by the instances that are not instrumented
+DISABLED = Metrics(enabled=False)
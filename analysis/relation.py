@@ -2,6 +2,9 @@
 
 from math import log
 
+import numpy as np
+from scipy import sparse
+
 
 def pointwise_mutual_information(x, y, relation, n_docs, n_decimal_digits = 6):
         """Calculate the relationship between two tokens
@@ -43,4 +46,240 @@ def pointwise_mutual_information(x, y, relation, n_docs, n_decimal_digits = 6):
         
         return None \
             if Lxy == 0 or Lx == 0 or Ly == 0 \
-            else round(log((Lxy * n_docs) / (Lx * Ly), 2), 6)
\ No newline at end of file
+            else round(log((Lxy * n_docs) / (Lx * Ly), 2), 6)
+
+def cooccurrence_counts(incidence):
+        """Count, for every pair of tokens, the number of documents in which both appear
+        
+        The counts are obtained with a single sparse product
+            C = X^T X
+        where X is the binary document x token incidence matrix. The diagonal of C holds the number of documents containing each token, and only the pairs that actually co-occur are stored.
+        
+        Args:
+            incidence (scipy.sparse.spmatrix): Binary matrix of shape (number of documents, number of tokens).
+
+        Returns:
+            (numpy.ndarray, scipy.sparse.coo_matrix): Number of documents containing each token, and the upper triangle (without the diagonal) of the co-occurrence matrix.
+            
+        """
+        incidence = incidence.tocsr().astype(np.int64)
+        incidence.sum_duplicates()
+        incidence.data[:] = 1
+        
+        counts = (incidence.T @ incidence).tocoo()
+        frequency = np.asarray(incidence.sum(axis=0)).ravel()
+        
+        return frequency, sparse.triu(counts, k=1, format='coo')
+    
+
+def pointwise_mutual_information_matrix(frequency, counts, n_docs, n_decimal_digits = 6, min_support = 1, min_npmi = None, top_k = None):
+        """Calculate the relationship between every pair of co-occurring tokens
+        
+        Vectorized version of `pointwise_mutual_information`. The ratio (Lxy * L) / (La * Lb) is computed for all the pairs at once, and the logarithm is evaluated once per distinct ratio, so the rounded values are the same as the ones computed pair by pair.
+        
+        The pairs can be pruned (see `prune_pairs`) before their values are computed.
+            
+        Args:
+            frequency (numpy.ndarray): Number of documents containing each token.
+            counts (scipy.sparse.coo_matrix): Number of documents containing each pair of tokens. Only the stored (non-zero) entries are evaluated.
+            n_docs (int): Total number of documents.
+            n_decimal_digits (int): Number of decimal digits, to approximate.
+            min_support (int): Minimum number of documents containing a pair. Defaults to 1 (every pair).
+            min_npmi (float, optional): Minimum normalized PMI of a pair. Defaults to None (no minimum).
+            top_k (int, optional): Number of best pairs kept per token. Defaults to None (every pair).
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray, numpy.ndarray): Index of the first token, index of the second token and PMI value of each pair. The pairs are sorted by first and second token index.
+            
+        """
+        counts = counts.tocoo()
+        order = np.lexsort((counts.col, counts.row))
+        rows, cols, Lxy = counts.row[order], counts.col[order], counts.data[order].astype(np.int64)
+        
+        keep = prune_pairs(rows, cols, Lxy, frequency[rows], frequency[cols], n_docs, min_support, min_npmi, top_k)
+        rows, cols, Lxy = rows[keep], cols[keep], Lxy[keep]
+        
+        return rows, cols, pointwise_mutual_information_values(Lxy, frequency[rows], frequency[cols], n_docs, n_decimal_digits)
+
+
+def normalized_pointwise_mutual_information_values(Lxy, Lx, Ly, n_docs):
+        """Calculate the normalized relationship of several pairs of tokens, given their counts
+        
+        Normalized PMI is calculated as
+            NPMI = PMI / -log2[ P(x, y) ]
+        It ranges from -1 (the tokens never appear together) through 0 (independent tokens) to 1 (the tokens only appear together), so, unlike PMI, it does not favour the pairs of rare tokens. A pair that appears in every document has NPMI 1.
+            
+        Args:
+            Lxy (numpy.ndarray): Number of documents containing each pair of tokens (greater than 0).
+            Lx (numpy.ndarray): Number of documents containing the first token of each pair.
+            Ly (numpy.ndarray): Number of documents containing the second token of each pair.
+            n_docs (int): Total number of documents.
+
+        Returns:
+            numpy.ndarray: NPMI value of each pair.
+            
+        """
+        Lxy = np.asarray(Lxy, dtype=np.float64)
+        pmi = np.log2(Lxy * n_docs / (np.asarray(Lx, dtype=np.float64) * np.asarray(Ly, dtype=np.float64)))
+        joint = -np.log2(Lxy / n_docs)
+        
+        npmi = np.ones(len(Lxy), dtype=np.float64)
+        np.divide(pmi, joint, out=npmi, where=joint > 0)
+        return npmi
+
+
+def prune_pairs(firsts, seconds, Lxy, Lx, Ly, n_docs, min_support = 1, min_npmi = None, top_k = None):
+        """Select the pairs of tokens whose relationship is worth keeping. The criteria are applied from the cheapest to the most expensive, each one on the pairs left by the previous ones:
+            1. Support: the pair appears in at least `min_support` documents. Pairs seen in a single document, the vast majority of a large corpus, carry little signal and the highest PMI.
+            2. Normalized PMI (see `normalized_pointwise_mutual_information_values`) of at least `min_npmi`.
+            3. Top-k: the pair is among the `top_k` pairs of highest NPMI of both of its tokens (ties are broken by the index of the other token). Every token then keeps at most `top_k` pairs, and the number of pairs is at most `top_k / 2` times the number of tokens, whatever the size of the corpus.
+            
+        Args:
+            firsts (numpy.ndarray): Index of the first token of each pair.
+            seconds (numpy.ndarray): Index of the second token of each pair.
+            Lxy (numpy.ndarray): Number of documents containing each pair of tokens.
+            Lx (numpy.ndarray): Number of documents containing the first token of each pair.
+            Ly (numpy.ndarray): Number of documents containing the second token of each pair.
+            n_docs (int): Total number of documents.
+            min_support (int): Minimum number of documents containing a pair. Defaults to 1 (every pair that co-occurs).
+            min_npmi (float, optional): Minimum normalized PMI. Defaults to None (no minimum).
+            top_k (int, optional): Number of pairs kept per token. Defaults to None (every pair).
+
+        Returns:
+            numpy.ndarray: Whether each pair is kept.
+            
+        """
+        keep = np.asarray(Lxy) >= max(1, min_support)
+        if min_npmi is None and top_k is None:
+            return keep
+        
+        selected = np.flatnonzero(keep)
+        npmi = normalized_pointwise_mutual_information_values(np.asarray(Lxy)[selected], np.asarray(Lx)[selected], np.asarray(Ly)[selected], n_docs)
+        if not min_npmi is None:
+            passed = npmi >= min_npmi
+            selected, npmi = selected[passed], npmi[passed]
+            
+        if not top_k is None:
+            # Every pair is ranked among the pairs of each of its tokens, and kept if it is among the best of both
+            tokens = np.concatenate([np.asarray(firsts)[selected], np.asarray(seconds)[selected]])
+            others = np.concatenate([np.asarray(seconds)[selected], np.asarray(firsts)[selected]])
+            scores = np.concatenate([npmi, npmi])
+            order = np.lexsort((others, -scores, tokens))
+            
+            starts = np.flatnonzero(np.concatenate([[True], tokens[order][1:] != tokens[order][:-1]])) if len(order) > 0 else np.zeros(0, dtype=np.int64)
+            ranks = np.arange(len(order)) - np.repeat(starts, np.diff(np.append(starts, len(order))))
+            best = np.zeros(len(order), dtype=bool)
+            best[order[ranks < top_k]] = True
+            selected = selected[best[:len(selected)] & best[len(selected):]]
+            
+        keep = np.zeros(len(keep), dtype=bool)
+        keep[selected] = True
+        return keep
+
+
+def pointwise_mutual_information_values(Lxy, Lx, Ly, n_docs, n_decimal_digits = 6):
+        """Calculate the relationship of several pairs of tokens, given their counts
+        
+        The logarithm is evaluated once per distinct ratio, so the rounded values are the same as the ones computed by `pointwise_mutual_information`.
+            
+        Args:
+            Lxy (numpy.ndarray): Number of documents containing each pair of tokens.
+            Lx (numpy.ndarray): Number of documents containing the first token of each pair.
+            Ly (numpy.ndarray): Number of documents containing the second token of each pair.
+            n_docs (int): Total number of documents.
+            n_decimal_digits (int): Number of decimal digits, to approximate.
+
+        Returns:
+            numpy.ndarray: PMI value of each pair.
+            
+        """
+        if len(Lxy) == 0:
+            return np.zeros(0, dtype=np.float64)
+        
+        ratios = (np.asarray(Lxy, dtype=np.int64) * n_docs) / (np.asarray(Lx, dtype=np.int64) * np.asarray(Ly, dtype=np.int64))
+        unique_ratios, inverse = np.unique(ratios, return_inverse=True)
+        unique_values = np.array([round(log(ratio, 2), n_decimal_digits) for ratio in unique_ratios.tolist()], dtype=np.float64)
+        
+        return unique_values[inverse]
+
+
+def distributional_substitutes(firsts, seconds, Lxy, frequency, n_docs, contexts = 50, min_similarity = 0.3, max_cooccurrence = 0.05, top_k = 10, min_docs = 5, block = 1024):
+        """Infer which tokens can replace each other from their contexts: two tokens are candidates when they are correlated with the same tokens, but rarely appear together (a substitute is used instead of the token, not next to it).
+        
+        The context of a token is its row of the positive PMI matrix, reduced to its `contexts` highest values, and the similarity of two tokens is the cosine of their contexts. The similarities are computed with a sparse product
+            S = R R^T
+        where R holds the normalized contexts, a block of rows at a time, so the memory is bounded by the pairs of a block and does not grow with the square of the number of tokens. The pairs are then selected in order:
+            1. Similarity of at least `min_similarity`.
+            2. Co-occurrence: the pair appears in at most a `max_cooccurrence` share of the documents of its less frequent token.
+            3. Top-k: the pair is among the `top_k` most similar pairs of either of its tokens.
+        Tokens that appear in fewer than `min_docs` documents have too few contexts to be compared, and are left out.
+            
+        Args:
+            firsts (numpy.ndarray): Index of the first token of each co-occurring pair.
+            seconds (numpy.ndarray): Index of the second token of each pair. Each pair is expected once.
+            Lxy (numpy.ndarray): Number of documents containing each pair of tokens.
+            frequency (numpy.ndarray): Number of documents containing each token, by index.
+            n_docs (int): Total number of documents.
+            contexts (int): Number of contexts kept per token. Defaults to 50.
+            min_similarity (float): Minimum similarity of a pair. Defaults to 0.3.
+            max_cooccurrence (float): Maximum share of co-occurrence of a pair. Defaults to 0.05.
+            top_k (int): Number of pairs kept per token. Defaults to 10.
+            min_docs (int): Minimum number of documents of a token. Defaults to 5.
+            block (int): Number of rows of the similarity matrix computed at a time. Defaults to 1024.
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray, numpy.ndarray): Index of the first token, index of the second token (greater than the first) and similarity of each pair.
+            
+        """
+        frequency = np.asarray(frequency, dtype=np.int64)
+        n_tokens = len(frequency)
+        firsts, seconds, Lxy = np.asarray(firsts, dtype=np.int64), np.asarray(seconds, dtype=np.int64), np.asarray(Lxy, dtype=np.int64)
+        
+        values = pointwise_mutual_information_values(Lxy, frequency[firsts], frequency[seconds], n_docs)
+        positive = values > 0
+        rows = np.concatenate([firsts[positive], seconds[positive]])
+        cols = np.concatenate([seconds[positive], firsts[positive]])
+        values = np.concatenate([values[positive], values[positive]])
+        
+        # Best contexts of each token, normalized
+        order = np.lexsort((cols, -values, rows))
+        rows, cols, values = rows[order], cols[order], values[order]
+        starts = np.searchsorted(rows, rows)
+        keep = (np.arange(len(rows)) - starts < contexts) & (frequency[rows] >= min_docs)
+        rows, cols, values = rows[keep], cols[keep], values[keep]
+        norms = np.sqrt(np.bincount(rows, weights=values * values, minlength=n_tokens))
+        R = sparse.csr_matrix((values / norms[rows], (rows, cols)), shape=(n_tokens, n_tokens))
+        RT = R.T.tocsr()
+        
+        # Co-occurring pairs, by key, to look up their counts
+        keys = np.minimum(firsts, seconds) * n_tokens + np.maximum(firsts, seconds)
+        order = np.argsort(keys)
+        keys, Lxy = keys[order], Lxy[order]
+        
+        selected_rows, selected_cols, selected_values = [], [], []
+        for start in range(0, n_tokens, block):
+            S = (R[start:start + block] @ RT).tocoo()
+            rows, cols, similarity = S.row.astype(np.int64) + start, S.col.astype(np.int64), S.data
+            keep = (rows != cols) & (similarity >= min_similarity)
+            rows, cols, similarity = rows[keep], cols[keep], similarity[keep]
+            
+            pairs = np.minimum(rows, cols) * n_tokens + np.maximum(rows, cols)
+            found = np.minimum(np.searchsorted(keys, pairs), max(len(keys) - 1, 0))
+            together = np.where(keys[found] == pairs, Lxy[found], 0) if len(keys) > 0 else np.zeros(len(pairs), dtype=np.int64)
+            keep = together <= max_cooccurrence * np.minimum(frequency[rows], frequency[cols])
+            rows, cols, similarity = rows[keep], cols[keep], similarity[keep]
+            
+            # Every row of the block is complete, so its best pairs are known
+            order = np.lexsort((cols, -similarity, rows))
+            rows, cols, similarity = rows[order], cols[order], similarity[order]
+            keep = np.arange(len(rows)) - np.searchsorted(rows, rows) < top_k
+            selected_rows.append(rows[keep])
+            selected_cols.append(cols[keep])
+            selected_values.append(similarity[keep])
+            
+        rows, cols, similarity = np.concatenate(selected_rows + [np.zeros(0, dtype=np.int64)]), np.concatenate(selected_cols + [np.zeros(0, dtype=np.int64)]), np.concatenate(selected_values + [np.zeros(0)])
+        # A pair is kept if it is among the best of either token
+        pairs = np.minimum(rows, cols) * n_tokens + np.maximum(rows, cols)
+        pairs, first = np.unique(pairs, return_index=True)
+        
+        return pairs // n_tokens, pairs % n_tokens, np.round(similarity[first], 6)
@@ -0,0 +1,174 @@
+# -*- coding:utf-8 -*-
+
+import re
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+
+# Number of labels returned by a search
+DEFAULT_SEARCH_LIMIT = 10
+# Minimum length of a query word to tolerate one typo, and two typos
+ONE_TYPO_LENGTH = 3
+TWO_TYPOS_LENGTH = 8
+
+# Greater than any character, so every string that starts with a prefix sorts before `prefix + _END`
+_END = '\U0010ffff'
+_SPACES = re.compile(r'\s+')
+
+
+class SearchIndex:
+    """
+    Prefix and typo-tolerant search over sorted labels, for type-ahead. The labels are ranked in three tiers:
+        1. Labels that start with the query, found by binary search over the sorted labels.
+        2. Labels in which every word of the query is the prefix of some word. The distinct words of the labels are kept sorted, with the labels that contain each one in compressed layout, so the labels of every word that starts with a prefix form a single slice.
+        3. Labels in which every word of the query is the prefix of some word up to `max_typos` edits (insertions, deletions or substitutions), with the first character typed right. The sorted words are walked as a trie, pruning the branches whose edit distance to the query word already exceeds the tolerance.
+    Within a tier, the labels with fewer typos come first, and then in sorted order. The later tiers are only evaluated when the earlier ones do not fill the requested number of labels.
+    """
+
+    def __init__(self, labels):
+        """
+        Args:
+            labels (list of str): Sorted labels.
+
+        """
+        self.labels = labels
+
+        ids = dict()
+        rows, cols = array('i'), array('i')
+        for i, label in enumerate(labels):
+            for word in set(label.split()):
+                rows.append(i)
+                cols.append(ids.setdefault(word, len(ids)))
+
+        # Distinct words, sorted, and the labels that contain each one
+        self.words = sorted(ids)
+        rank = np.zeros(len(ids), dtype=np.int64)
+        rank[np.fromiter((ids[word] for word in self.words), dtype=np.int64, count=len(ids))] = np.arange(len(ids))
+
+        rows = np.frombuffer(rows, dtype=np.int32)
+        cols = rank[np.frombuffer(cols, dtype=np.int32)]
+        order = np.lexsort((rows, cols))
+        self.indices = rows[order]
+        self.indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cols, minlength=len(ids)), out=self.indptr[1:])
+
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        """Returns the labels that best match a query
+
+        Args:
+            query (str): Text typed so far. Case and repeated whitespace are ignored.
+            limit (int, optional): Maximum number of labels. Defaults to 10.
+
+        Returns:
+            list of str: Labels, best first. An empty query returns the first labels in sorted order.
+
+        """
+        query = _SPACES.sub(' ', query.lower()).strip()
+        if not query:
+            return self.labels[:limit]
+
+        # 1. Labels that start with the query
+        start = bisect_left(self.labels, query)
+        end = bisect_left(self.labels, query + _END, start, min(len(self.labels), start + limit))
+        found = list(range(start, end))
+        if len(found) >= limit:
+            return [self.labels[i] for i in found]
+
+        # 2. Every word is a prefix, and 3. every word is a prefix up to some typos
+        for typos in (False, True):
+            matching = self._matching(query.split(), typos)[:limit + len(found)]
+            found = list(dict.fromkeys(found + matching.tolist()))
+            if len(found) >= limit:
+                break
+
+        return [self.labels[i] for i in found[:limit]]
+
+
+    def _matching(self, words, typos):
+        """Returns the labels in which every word is the prefix of some word of the label
+
+        Args:
+            words (list of str): Query words.
+            typos (bool): Whether to tolerate typos in the words.
+
+        Returns:
+            numpy.ndarray: Labels, with fewer typos first and then sorted.
+
+        """
+        labels, costs = None, None
+        # The longest words first, since they usually match the fewest labels
+        for word in sorted(words, key=len, reverse=True):
+            ranges = self._fuzzy_ranges(word, max_typos(word)) if typos else [(bisect_left(self.words, word), bisect_left(self.words, word + _END), 0)]
+            word_labels = np.concatenate([self.indices[self.indptr[lo]:self.indptr[hi]] for lo, hi, _ in ranges] + [self.indices[:0]])
+            word_costs = np.concatenate([np.full(self.indptr[hi] - self.indptr[lo], cost, dtype=np.int64) for lo, hi, cost in ranges] + [np.zeros(0, dtype=np.int64)])
+
+            # Fewest typos of each label
+            order = np.lexsort((word_costs, word_labels))
+            word_labels, word_costs = word_labels[order], word_costs[order]
+            first = np.ones(len(word_labels), dtype=bool)
+            first[1:] = word_labels[1:] != word_labels[:-1]
+            word_labels, word_costs = word_labels[first], word_costs[first]
+
+            if labels is None:
+                labels, costs = word_labels, word_costs
+            else:
+                labels, left, right = np.intersect1d(labels, word_labels, assume_unique=True, return_indices=True)
+                costs = costs[left] + word_costs[right]
+            if len(labels) == 0:
+                break
+
+        return labels[np.lexsort((labels, costs))]
+
+
+    def _fuzzy_ranges(self, word, max_typos):
+        """Find the words that start with a prefix within `max_typos` edits of a query word. The sorted words are walked as a trie: a node is a prefix, and its children are found by binary search. Each node keeps the row of the edit distance matrix between its prefix and the query word. The walk starts at the first character of the word, which is assumed to be right, as in most type-ahead; otherwise every branch of the root would be visited.
+
+        Args:
+            word (str): Query word.
+            max_typos (int): Maximum number of edits.
+
+        Returns:
+            list of (int, int, int): Ranges of the sorted words, and the number of edits of each range. Ranges may be nested; a word takes the fewest edits of the ranges that contain it.
+
+        """
+        ranges = []
+        lo = bisect_left(self.words, word[0])
+        hi = bisect_left(self.words, word[0] + _END, lo)
+        stack = [(word[0], lo, hi, [1] + list(range(len(word))))]
+
+        while stack:
+            prefix, lo, hi, row = stack.pop()
+            if row[-1] <= max_typos:
+                ranges.append((lo, hi, row[-1]))
+            # A deeper prefix can only lower the edits if some shorter alignment is cheaper
+            if min(row[:-1]) > max_typos or (row[-1] <= max_typos and min(row[:-1]) >= row[-1]):
+                continue
+
+            depth = len(prefix)
+            if lo < hi and len(self.words[lo]) == depth:
+                lo += 1
+            while lo < hi:
+                character = self.words[lo][depth]
+                child = prefix + character
+                end = bisect_left(self.words, child + _END, lo, hi)
+
+                next_row = [row[0] + 1]
+                for i in range(1, len(row)):
+                    next_row.append(min(row[i] + 1, next_row[i - 1] + 1, row[i - 1] + (word[i - 1] != character)))
+                if min(next_row) <= max_typos:
+                    stack.append((child, lo, end, next_row))
+                lo = end
+
+        return ranges
+
+
+def max_typos(word):
+    """Returns the number of typos tolerated in a query word, which grows with its length
+    """
+    if len(word) >= TWO_TYPOS_LENGTH:
+        return 2
+    if len(word) >= ONE_TYPO_LENGTH:
+        return 1
+    return 0
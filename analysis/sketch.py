@@ -0,0 +1,269 @@
+# -*- coding:utf-8 -*-
+
+import math
+
+import numpy as np
+
+# Number of rows of a count-min sketch. The probability that an estimate exceeds the error bound is e^-depth (about 1.8%).
+DEFAULT_SKETCH_DEPTH = 4
+# Maximum number of incidence entries (ingredient mentions) whose pairs are generated at a time
+SKETCH_BATCH = 1 << 20
+# Share of the memory budget of `sketch_cooccurrence` taken by the pairs kept, the rest is for the counters of the sketch
+PAIRS_SHARE = 0.5
+
+_COUNTER = np.dtype(np.int64)
+# A pair kept is its key and its estimate
+_PAIR_BYTES = 2 * _COUNTER.itemsize
+
+
+class CountMinSketch:
+    """
+    Count-min sketch of the frequencies of integer keys, in fixed memory: `depth` rows of `width` counters, each row with its own hash function. A key adds to one counter per row, and its estimate is the minimum of them.
+
+    The estimates never fall below the true counts. With `N` the total of the counts, an estimate exceeds the true count by more than `e / width * N` with probability at most `e^-depth`.
+    """
+
+    def __init__(self, width, depth=DEFAULT_SKETCH_DEPTH, seed=0):
+        """
+        Args:
+            width (int): Number of counters of each row. It is rounded down to a power of two.
+            depth (int, optional): Number of rows. Defaults to 4.
+            seed (int, optional): Seed of the hash functions. Defaults to 0.
+
+        """
+        self.bits = max(1, int(width).bit_length() - 1)
+        self.width = 1 << self.bits
+        self.depth = depth
+        self.total = 0
+        self.counters = np.zeros((depth, self.width), dtype=_COUNTER)
+
+        # Multiply-shift hashing, with odd multipliers
+        rng = np.random.default_rng(seed)
+        self._multipliers = rng.integers(1, 1 << 63, size=depth, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._increments = rng.integers(0, 1 << 63, size=depth, dtype=np.uint64)
+
+
+    @classmethod
+    def from_memory(cls, memory, depth=DEFAULT_SKETCH_DEPTH, seed=0):
+        """Returns the widest sketch whose counters fit in a memory budget
+
+        Args:
+            memory (int): Memory of the counters, in bytes.
+            depth (int, optional): Number of rows. Defaults to 4.
+            seed (int, optional): Seed of the hash functions. Defaults to 0.
+
+        Raises:
+            ValueError: If the budget does not fit two counters per row.
+
+        Returns:
+            CountMinSketch: Sketch.
+
+        """
+        width = int(memory) // (depth * _COUNTER.itemsize)
+        if width < 2:
+            raise ValueError('A memory of ' + str(memory) + ' bytes does not fit a count-min sketch of depth ' + str(depth) + '.')
+        return cls(width, depth, seed)
+
+
+    @property
+    def nbytes(self):
+        return self.counters.nbytes
+
+
+    @property
+    def epsilon(self):
+        """Relative error bound: an estimate exceeds the true count by at most `epsilon * total`, with probability `1 - delta`
+        """
+        return math.e / self.width
+
+
+    @property
+    def delta(self):
+        return math.exp(-self.depth)
+
+
+    def _hashes(self, keys, row):
+        with np.errstate(over='ignore'):
+            return ((keys * self._multipliers[row] + self._increments[row]) >> np.uint64(64 - self.bits)).astype(np.int64)
+
+
+    def add(self, keys, counts=None):
+        """Account for occurrences of keys
+
+        Args:
+            keys (numpy.ndarray): Keys (non-negative integers). Repeated keys are counted as many times.
+            counts (numpy.ndarray, optional): Number of occurrences of each key. Defaults to None (1 each).
+
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        counts = np.ones(len(keys), dtype=_COUNTER) if counts is None else np.asarray(counts, dtype=_COUNTER)
+        for row in range(self.depth):
+            np.add.at(self.counters[row], self._hashes(keys, row), counts)
+        self.total += int(counts.sum())
+
+
+    def query(self, keys):
+        """Returns the estimated counts of keys
+
+        Args:
+            keys (numpy.ndarray): Keys.
+
+        Returns:
+            numpy.ndarray: Estimates, never below the true counts.
+
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        estimates = self.counters[0][self._hashes(keys, 0)]
+        for row in range(1, self.depth):
+            np.minimum(estimates, self.counters[row][self._hashes(keys, row)], out=estimates)
+        return estimates
+
+
+class TopPairs:
+    """
+    The pairs of highest estimated count seen so far, at most `capacity` of them. Each pair has a single estimate (the sketch is complete before the pairs are selected), so the pairs kept after adding every batch are the best `capacity` pairs overall, whatever the batches.
+    """
+
+    def __init__(self, capacity):
+        """
+        Args:
+            capacity (int): Maximum number of pairs kept.
+
+        """
+        self.capacity = capacity
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.estimates = np.zeros(0, dtype=_COUNTER)
+        # Largest number of pairs held at once
+        self.peak = 0
+        # Whether some pair was left out for lack of room
+        self.truncated = False
+
+
+    def __len__(self):
+        return len(self.keys)
+
+
+    def add(self, keys, estimates):
+        """Add a batch of pairs, keeping the best `capacity` of those seen so far (ties by key)
+
+        Args:
+            keys (numpy.ndarray): Keys of the pairs. Repeated keys are kept once.
+            estimates (numpy.ndarray): Estimated count of each pair.
+
+        """
+        keys, first = np.unique(keys, return_index=True)
+        keys, estimates = self._best(keys, np.asarray(estimates, dtype=_COUNTER)[first])
+
+        keys, first = np.unique(np.concatenate([self.keys, keys]), return_index=True)
+        keys, estimates = self._best(keys, np.concatenate([self.estimates, estimates])[first])
+        order = np.argsort(keys)
+        self.keys, self.estimates = keys[order], estimates[order]
+        self.peak = max(self.peak, len(self.keys))
+
+
+    def _best(self, keys, estimates):
+        if len(keys) <= self.capacity:
+            return keys, estimates
+        self.truncated = True
+        best = np.lexsort((keys, -estimates))[:self.capacity]
+        return keys[best], estimates[best]
+
+
+def pairs_budget(memory):
+    """Split the memory budget of `sketch_cooccurrence` between the counters of the sketch and the pairs kept
+
+    Args:
+        memory (int): Memory budget, in bytes.
+
+    Returns:
+        (int, int): Memory of the counters, in bytes, and maximum number of pairs kept.
+
+    """
+    pairs_memory = int(memory * PAIRS_SHARE)
+    return int(memory) - pairs_memory, pairs_memory // _PAIR_BYTES
+
+
+def iter_pairs(incidence, batch=SKETCH_BATCH):
+    """Generate the pairs of tokens of every document, a batch of documents at a time, so the memory does not depend on the size of the corpus
+
+    Args:
+        incidence (scipy.sparse.csr_matrix): Binary document x token matrix, with sorted indices and without duplicates.
+        batch (int, optional): Maximum number of entries of the documents of a batch (a larger document is a batch of its own). Defaults to 2^20.
+
+    Yields:
+        (numpy.ndarray, numpy.ndarray): First and second token of each pair of a batch, with the first smaller than the second.
+
+    """
+    indptr, indices = incidence.indptr, incidence.indices
+    n_docs = len(indptr) - 1
+    start = 0
+    while start < n_docs:
+        end = max(start + 1, int(np.searchsorted(indptr, indptr[start] + batch, side='right')) - 1)
+        end = min(end, n_docs)
+
+        tokens = indices[indptr[start]:indptr[end]].astype(np.int64)
+        sizes = np.diff(indptr[start:end + 1])
+        # Position of each entry within its document, and its distance to the end of it
+        offsets = np.arange(len(tokens)) - np.repeat(indptr[start:end] - indptr[start], sizes)
+        remaining = np.repeat(sizes, sizes) - offsets - 1
+
+        # The pairs at distance d within a document, for d = 1, 2, ...
+        for distance in range(1, int(sizes.max()) if len(sizes) > 0 else 0):
+            firsts = np.flatnonzero(remaining >= distance)
+            yield tokens[firsts], tokens[firsts + distance]
+
+        start = end
+
+
+def sketch_cooccurrence(incidence, memory, min_support=1, depth=DEFAULT_SKETCH_DEPTH, seed=0, batch=SKETCH_BATCH):
+    """Estimate the number of documents containing each pair of tokens with a count-min sketch, in two passes over the pairs:
+        1. Every pair of every document is added to the sketch.
+        2. The pairs whose estimated count reaches `min_support` are kept, with their estimate, in a table of the best pairs (see `TopPairs`).
+    The memory budget is split between the counters of the sketch and the table (see `pairs_budget`), so neither grows with the corpus: when more pairs reach `min_support` than fit in the table, those of highest estimate are kept, which raises the support of the pairs kept instead of the memory. Besides the budget, only the pairs of one batch of documents are held at a time. The incidence matrix is an input, held in full by the caller.
+
+    Error bounds, with probability at least `1 - e^-depth` for each pair (see `CountMinSketch`):
+        - Count: `Lxy <= estimate <= Lxy + e * N / width`, where `N` is the total number of pairs of the documents. The estimate is also capped by the number of documents of each token.
+        - PMI: the estimate never falls below the exact PMI, and exceeds it by at most `log2(1 + e * N / (width * Lxy))`, so the error shrinks with the support of the pair, e.g. at most 0.14 bits for a pair whose support is 10 times the count error bound.
+        - Pairs whose true count is below `min_support` may be kept (false positives). No pair that reaches it is lost, unless the table is full (see `TopPairs.truncated`).
+
+    Args:
+        incidence (scipy.sparse.spmatrix): Binary document x token matrix.
+        memory (int): Memory budget of the sketch and of the pairs kept, in bytes.
+        min_support (int, optional): Minimum estimated count of a pair. Defaults to 1.
+        depth (int, optional): Number of rows of the sketch. Defaults to 4.
+        seed (int, optional): Seed of the hash functions. Defaults to 0.
+        batch (int, optional): Maximum number of entries of the documents whose pairs are generated at a time. Defaults to 2^20.
+
+    Raises:
+        ValueError: If the budget does not fit the sketch, or a single pair.
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, CountMinSketch, TopPairs): Number of documents containing each token, first token, second token and estimated count of each pair kept (sorted by first and second token), the sketch, and the table of the pairs kept.
+
+    """
+    sketch_memory, capacity = pairs_budget(memory)
+    if capacity < 1:
+        raise ValueError('A memory of ' + str(memory) + ' bytes does not fit the pairs of a count-min sketch.')
+
+    incidence = incidence.tocsr().astype(np.int64)
+    incidence.sum_duplicates()
+    incidence.sort_indices()
+    n_tokens = incidence.shape[1]
+    frequency = np.bincount(incidence.indices, minlength=n_tokens).astype(np.int64)
+
+    sketch = CountMinSketch.from_memory(sketch_memory, depth, seed)
+    for firsts, seconds in iter_pairs(incidence, batch):
+        sketch.add(firsts * n_tokens + seconds)
+
+    pairs = TopPairs(capacity)
+    for firsts, seconds in iter_pairs(incidence, batch):
+        keys = firsts * n_tokens + seconds
+        estimates = sketch.query(keys)
+        keep = estimates >= max(1, min_support)
+        pairs.add(keys[keep], estimates[keep])
+
+    keys = pairs.keys
+    firsts, seconds = keys // n_tokens, keys % n_tokens
+    counts = np.minimum(pairs.estimates, np.minimum(frequency[firsts], frequency[seconds]))
+
+    return frequency, firsts, seconds, counts, sketch, pairs
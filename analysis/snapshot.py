@@ -0,0 +1,92 @@
+# -*- coding:utf-8 -*-
+
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'FOODGRPH'
+VERSION = 1
+# Every array starts at a multiple of this number of bytes
+ALIGNMENT = 64
+
+_PREAMBLE = struct.Struct('<8sIQ')
+
+
+def write_snapshot(fpath, arrays, metadata=None):
+    """Store a set of arrays in a single binary file, that can be memory-mapped by `read_snapshot`
+
+    The file layout is:
+        - Preamble: magic bytes, format version and length of the header.
+        - Header: JSON document with the offset, type and shape of every array, and the metadata.
+        - Arrays: raw contents (C order, little endian), each one aligned to `ALIGNMENT` bytes.
+
+    The file is written next to its destination and then renamed, so readers never see a partial snapshot.
+
+    Args:
+        fpath (str): Path of the file.
+        arrays (dict(str, numpy.ndarray)): Arrays, by name.
+        metadata (dict, optional): JSON serializable information stored in the header. Defaults to None.
+
+    """
+    arrays = {name: np.ascontiguousarray(array, dtype=np.asarray(array).dtype.newbyteorder('<')) for name, array in arrays.items()}
+
+    table = dict()
+    offset = 0
+    for name, array in arrays.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        table[name] = dict([
+            ('offset', offset),
+            ('dtype', array.dtype.str),
+            ('shape', list(array.shape))
+        ])
+        offset += array.nbytes
+
+    header = json.dumps(dict([('arrays', table), ('metadata', metadata or dict())])).encode('utf8')
+    start = -(-(_PREAMBLE.size + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    temporary = fpath + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(start + table[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(start + offset)
+    os.replace(temporary, fpath)
+
+
+def read_snapshot(fpath):
+    """Memory-map a file written by `write_snapshot`. The arrays are read-only views of the mapped file, so the operating system shares their pages among all the processes that read the same snapshot.
+
+    Args:
+        fpath (str): Path of the file.
+
+    Raises:
+        ValueError: If the file is not a snapshot, or its format version is not supported.
+
+    Returns:
+        (dict(str, numpy.ndarray), dict): Arrays, by name, and metadata.
+
+    """
+    with open(fpath, 'rb') as f:
+        magic, version, length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError('File `' + fpath + '` is not a model snapshot.')
+        if version != VERSION:
+            raise ValueError('Unsupported snapshot version ' + str(version) + ' in `' + fpath + '`. Expected version ' + str(VERSION) + '.')
+        header = json.loads(f.read(length).decode('utf8'))
+
+    start = -(-(_PREAMBLE.size + length) // ALIGNMENT) * ALIGNMENT
+    # Plain array views of the mapping (which they keep open), without the overhead of `numpy.memmap` on every slice
+    buffer = np.memmap(fpath, dtype=np.uint8, mode='r').view(np.ndarray)
+
+    arrays = dict()
+    for name, entry in header['arrays'].items():
+        dtype = np.dtype(entry['dtype'])
+        size = int(np.prod(entry['shape'], dtype=np.int64)) * dtype.itemsize
+        begin = start + entry['offset']
+        arrays[name] = buffer[begin:begin + size].view(dtype).reshape(entry['shape'])
+
+    return arrays, header['metadata']
@@ -1,48 +1,65 @@
-from analysis import FoodGraph
+from analysis import FoodGraph, SubstitutionFeedback
+from analysis.metrics import Metrics
+from service import QueryClient
 import networkx as nx
-from typing import List
+import os
+from typing import List, Tuple
 import streamlit as st
-from json import load, dump
 
 st.set_page_config("Recipes Engine", page_icon="👨‍🍳", layout="wide")
 
 with open("data/init.md") as fp:
     st.write(fp.read())
 
-graph = FoodGraph(graphs_path='data/graphs/')
+@st.experimental_singleton
+def load_graph() -> Tuple[FoodGraph, SubstitutionFeedback]:
+    "The model is loaded once, and shared by every rerun and session, with the votes recorded so far folded into it. If RECIPES_ENGINE_URL is set, the queries are sent to that query server instead (see `python -m service serve`). If RECIPES_ENGINE_METRICS is set, the loading and the queries are instrumented"
+    feedback = SubstitutionFeedback("data/substitutions.json")
+    if os.environ.get("RECIPES_ENGINE_URL"):
+        graph = QueryClient(os.environ["RECIPES_ENGINE_URL"])
+    else:
+        graph = FoodGraph(graphs_path='data/graphs/', metrics=Metrics() if os.environ.get("RECIPES_ENGINE_METRICS") else None)
+    graph.apply_substitution_feedback(feedback)
+    return graph, feedback
+
+# Number of matches offered by a search box
+SEARCH_LIMIT = 50
+# Number of similar recipes shown
+SIMILAR_LIMIT = 10
+
+graph, feedback = load_graph()
 
 def save_substitutions(ingredient: str, substitutions: List[str]) -> None:
-    subs = load(open("data/substitutions.json", 'r'))
-    print(subs)
-    if ingredient not in subs:
-        subs[ingredient] = {}
-    for ing in substitutions:
-        if ing in subs[ingredient]:
-            subs[ingredient][ing] += 1
-        else:
-            subs[ingredient][ing] = 1
-    
-    dump(subs, open("data/substitutions.json", "w"))
+    "Record a vote and fold it into the shared model. The model folds each vote once, under its own lock, whichever session calls it (see `FoodGraph.apply_substitution_feedback`)"
+    feedback.record(ingredient, substitutions)
+    graph.apply_substitution_feedback(feedback)
     st.balloons()
 
+def search_options(search, label: str, key: str, selected: List[str] = []) -> List[str]:
+    "Names that match the text typed in a search box, so that only a few options are sent to the browser. The selected ones are kept among the options"
+    query = st.text_input(label, key=key)
+    return list(dict.fromkeys(selected + search(query, limit=SEARCH_LIMIT)))
+
 def get_recipes(graph: FoodGraph) -> List[str]:
     "See the ingredients by recipes"
     
-    rel_graph = graph.recipe_ingredient_relationship_graph
-    recipes = {node["label"]:node for node in rel_graph.nodes.values() if node["type"] == "recipe_name"}
-    all_ingredients = [node["label"] for node in rel_graph.nodes.values() if node["type"] == "ingredient_name"]
     left, right = st.columns(2)
     with left:
-        select_recipe = recipes[st.selectbox(f"Select recipe ({len(recipes)})", options=[recipe.capitalize() for recipe in recipes]).lower()]
-        ingredients = [ing for ing in rel_graph.neighbors(select_recipe['label'])]
-        st.write(f"### Ingredients for {select_recipe['label'].capitalize()}")
+        options = search_options(graph.search_recipes, "Search a recipe", key="recipe_query")
+        select_recipe = st.selectbox("Select recipe", options=options, format_func=str.capitalize)
+        if select_recipe is None:
+            st.info("No recipes found", icon="ℹ️")
+            return
+        ingredients = graph.ingredients_of(select_recipe)
+        st.write(f"### Ingredients for {select_recipe.capitalize()}")
         for ingredient in ingredients:
             st.write(f"- {ingredient.capitalize()}")
     with right:
         select_ingredient = st.selectbox(f"Select an ingredient of this recipe ({len(ingredients)})", options=ingredients)
-        result_ingredients = graph.replace_ingredient(select_ingredient)
-        all_ingredients.remove(select_ingredient)
-        changes = st.multiselect(label="I can substitute this ingredient by ...", options=all_ingredients, key=ingredient)
+        result_ingredients = graph.replace_ingredient(select_ingredient, recipe=select_recipe)
+        key = f"substitutes_{select_ingredient}"
+        options = search_options(graph.search_ingredients, "Search a substitute", key=key + "_query", selected=st.session_state.get(key, []))
+        changes = st.multiselect(label="I can substitute this ingredient by ...", options=[ingredient for ingredient in options if ingredient != select_ingredient], key=key)
         if changes:
             st.button("Send info", on_click=save_substitutions, kwargs=dict(ingredient=select_ingredient, substitutions=changes))
         if not result_ingredients:
@@ -55,9 +72,8 @@ def get_recipes(graph: FoodGraph) -> List[str]:
 def get_ingredients(graph: FoodGraph) -> List[str]:
     "Select recipes with a set of ingredients"
     
-    rel_graph = graph.recipe_ingredient_relationship_graph
-    ingredients = {node["label"]:node for node in rel_graph.nodes.values() if node["type"] == "ingredient_name"}
-    select_ingredients = st.multiselect(f"Select a set of ingredients ({len(ingredients)})", options=ingredients)
+    options = search_options(graph.search_ingredients, "Search an ingredient", key="ingredients_query", selected=st.session_state.get("ingredients", []))
+    select_ingredients = st.multiselect("Select a set of ingredients", options=options, key="ingredients")
     result_recipes = graph.recipes_with(select_ingredients)
     if not result_recipes:
         st.info(f"Please, select an ingredient", icon="ℹ️")
@@ -69,28 +85,51 @@ def get_ingredients(graph: FoodGraph) -> List[str]:
                 st.write(f"- {recipe[0].capitalize()} *(with {recipe[1]} coincidences)*")
         with right:
             st.write("#### See the ingredients of a recipe")
-            recipe = st.selectbox("Select a recipe", options=[rec[0].capitalize() for rec in result_recipes]).lower()
-            for ing in rel_graph.neighbors(recipe):
+            recipe = st.selectbox("Select a recipe", options=[rec[0] for rec in result_recipes], format_func=str.capitalize)
+            for ing in graph.ingredients_of(recipe):
                 st.write(f"- {ing.capitalize()}")
             
 def replace_an_ingredient(graph: FoodGraph) -> None:
     "Give a list of ingredients that can replace the one defined"
     
-    rel_graph = graph.recipe_ingredient_relationship_graph
-    ingredients = {node["label"]:node for node in rel_graph.nodes.values() if node["type"] == "ingredient_name"}
-    select_ingredient = st.selectbox(f"Select an ingredient ({len(ingredients)})", options=ingredients)
-    result_ingredients = graph.replace_ingredient(select_ingredient)
-    if not result_ingredients:
+    options = search_options(graph.search_ingredients, "Search an ingredient", key="ingredient_query")
+    select_ingredient = st.selectbox("Select an ingredient", options=options)
+    if select_ingredient is None:
+        st.info("No ingredients found", icon="ℹ️")
+        return
+    result_ingredients = graph.replace_ingredient(select_ingredient, inferred=False)
+    inferred_ingredients = [(ingredient, similarity) for ingredient, similarity in graph.inferred_substitutes(select_ingredient, limit=SIMILAR_LIMIT) if not ingredient in result_ingredients]
+    if not result_ingredients and not inferred_ingredients:
         st.warning(f"No ingredients found to replace {select_ingredient}", icon="⚠️")
-    else:
+    if result_ingredients:
         st.write(f"### You can substitute the {select_ingredient} for the following ingredients")
         for ingredient in result_ingredients:
             st.write(f"- {ingredient.capitalize()}")
+    if inferred_ingredients:
+        st.write(f"#### Ingredients used like {select_ingredient} in other recipes")
+        for ingredient, similarity in inferred_ingredients:
+            st.write(f"- {ingredient.capitalize()} *(similarity {similarity:.2f})*")
 
-
-actions = {func.__doc__ : func for func in [get_recipes, get_ingredients, replace_an_ingredient]}
-actions[st.selectbox("Select a functionaly", options=actions.keys())](graph=graph)
-
+def get_similar_recipes(graph: FoodGraph) -> None:
+    "Find recipes similar to a recipe"
+    
+    options = search_options(graph.search_recipes, "Search a recipe", key="similar_query")
+    select_recipe = st.selectbox("Select recipe", options=options, format_func=str.capitalize, key="similar_recipe")
+    if select_recipe is None:
+        st.info("No recipes found", icon="ℹ️")
+        return
+    result_recipes = graph.similar_recipes(select_recipe, limit=SIMILAR_LIMIT)
+    if not result_recipes:
+        st.warning(f"No recipes found similar to {select_recipe}", icon="⚠️")
+    else:
+        st.write(f"### Recipes similar to {select_recipe.capitalize()}")
+        for recipe, similarity in result_recipes:
+            st.write(f"- {recipe.capitalize()} *(similarity {similarity:.2f})*")
 
 
+actions = {func.__doc__ : func for func in [get_recipes, get_ingredients, replace_an_ingredient, get_similar_recipes]}
+actions[st.selectbox("Select a functionaly", options=actions.keys())](graph=graph)
 
+if getattr(graph, "metrics", None) is not None and graph.metrics.enabled:
+    with st.sidebar.expander("Metrics"):
+        st.code(graph.metrics.prometheus())
@@ -0,0 +1,2 @@
+from .suite import run_suite, compare
+from .sketch import run_sketch
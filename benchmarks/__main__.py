@@ -0,0 +1,65 @@
+# -*- coding:utf-8 -*-
+
+import argparse
+import json
+import logging
+import sys
+
+from .sketch import DEFAULT_SKETCH_SIZE, DEFAULT_SKETCH_MEMORIES, DEFAULT_MIN_SUPPORT, run_sketch
+from .suite import DEFAULT_SIZES, DEFAULT_VOCABULARY, DEFAULT_VARIANT_DENSITY, DEFAULT_QUERIES, DEFAULT_WORKDIR, DEFAULT_THRESHOLD, run_suite, compare
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks of the recipes engine on synthetic corpora.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Build, load and query the model on corpora of several sizes.')
+    run.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Number of recipes of each corpus (default: 1000 10000 100000 1000000).')
+    run.add_argument('--vocabulary', type=int, default=DEFAULT_VOCABULARY, help='Number of distinct ingredients.')
+    run.add_argument('--variant-density', type=float, default=DEFAULT_VARIANT_DENSITY, help='Share of the recipes with substitution variants.')
+    run.add_argument('--queries', type=int, default=DEFAULT_QUERIES, help='Number of queries of each kind.')
+    run.add_argument('--workers', type=int, default=1, help='Number of processes of the build.')
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--workdir', default=DEFAULT_WORKDIR, help='Folder of the corpora and models (default: data/benchmarks/).')
+    run.add_argument('--output', help='JSON file of the results (default: standard output).')
+
+    sketch = commands.add_parser('sketch', help='Accuracy and memory of the approximate correlations, for several memories of the sketch.')
+    sketch.add_argument('--size', type=int, default=DEFAULT_SKETCH_SIZE, help='Number of recipes of the corpus (default: 100000).')
+    sketch.add_argument('--memories', type=float, nargs='+', default=DEFAULT_SKETCH_MEMORIES, help='Memory of each sketch, in megabytes (default: 0.25 1 4 16 64).')
+    sketch.add_argument('--min-support', type=int, default=DEFAULT_MIN_SUPPORT, help='Minimum number of recipes of a pair (default: 2).')
+    sketch.add_argument('--vocabulary', type=int, default=DEFAULT_VOCABULARY, help='Number of distinct ingredients.')
+    sketch.add_argument('--seed', type=int, default=0)
+    sketch.add_argument('--workdir', default=DEFAULT_WORKDIR, help='Folder of the corpora (default: data/benchmarks/).')
+    sketch.add_argument('--output', help='JSON file of the results (default: standard output).')
+
+    check = commands.add_parser('compare', help='Compare two result files, and fail if there is any regression.')
+    check.add_argument('baseline')
+    check.add_argument('current')
+    check.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='Growth, as a fraction, above which a result is a regression.')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command in ('run', 'sketch'):
+        if args.command == 'run':
+            results = run_suite(args.sizes, args.vocabulary, args.variant_density, args.queries, args.workers, args.seed, args.workdir)
+        else:
+            results = run_sketch(args.size, args.memories, args.min_support, args.vocabulary, seed=args.seed, workdir=args.workdir)
+        if args.output is None:
+            print(json.dumps(results, indent=2))
+        else:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        comparison = compare(baseline, current, args.threshold)
+        print(json.dumps(comparison, indent=2))
+        if any(result['regression'] for result in comparison):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# -*- coding:utf-8 -*-
+
+import logging
+import time
+
+import numpy as np
+
+from .suite import DEFAULT_VOCABULARY, DEFAULT_VARIANT_DENSITY, DEFAULT_WORKDIR, create_corpus, environment
+
+DEFAULT_SKETCH_SIZE = 100000
+# Memory of the sketches compared, in megabytes
+DEFAULT_SKETCH_MEMORIES = [0.25, 1, 4, 16, 64]
+DEFAULT_MIN_SUPPORT = 2
+
+
+def run_sketch(size=DEFAULT_SKETCH_SIZE, memories=DEFAULT_SKETCH_MEMORIES, min_support=DEFAULT_MIN_SUPPORT, vocabulary=DEFAULT_VOCABULARY, variant_density=DEFAULT_VARIANT_DENSITY, seed=0, workdir=DEFAULT_WORKDIR):
+    """Compare the approximate correlations (`CorpusStatistics.approximate_correlations`) with the exact ones on a synthetic corpus, for several memories of the sketch
+
+    Args:
+        size (int, optional): Number of recipes of the corpus. Defaults to 100000.
+        memories (list of float, optional): Memory of each sketch, in megabytes. Defaults to 0.25, 1, 4, 16 and 64.
+        min_support (int, optional): Minimum number of recipes of a pair, in both modes. Defaults to 2.
+        vocabulary (int, optional): Number of distinct ingredients. Defaults to 2000.
+        variant_density (float, optional): Share of the recipes with substitution variants. Defaults to 0.1.
+        seed (int, optional): Seed of the corpus. Defaults to 0.
+        workdir (str, optional): Folder of the corpora. Defaults to 'data/benchmarks/'.
+
+    Returns:
+        dict: Environment of the run, the exact correlations (number of pairs, memory of their counts in megabytes, time) and, for each memory: memory of the sketch and of the pairs kept, time, number of pairs kept, maximum number of pairs and whether some were left out, recall and precision of the pairs, count error (mean, maximum, bound and share of the pairs above it) and PMI error (mean, 99th percentile and maximum, in bits).
+
+    """
+    from analysis.corpus import CorpusStatistics
+    from analysis.relation import pointwise_mutual_information_values
+    from parser import RecipeJSON
+
+    corpus = dict([('recipes', size), ('vocabulary', vocabulary), ('variant_density', variant_density), ('seed', seed)])
+    statistics = CorpusStatistics()
+    for recipe in RecipeJSON(create_corpus(corpus, workdir)).get_recipes():
+        statistics.add(recipe)
+
+    start = time.perf_counter()
+    exact_firsts, exact_seconds, _ = statistics.correlations(min_support=min_support)
+    exact_seconds_elapsed = time.perf_counter() - start
+    frequency, counts = statistics.cooccurrence()
+    counts = counts.tocsr()
+    exact = dict([
+        ('pairs', len(exact_firsts)),
+        ('memory_mb', round((counts.data.nbytes + counts.indices.nbytes + counts.indptr.nbytes) / (1 << 20), 3)),
+        ('seconds', round(exact_seconds_elapsed, 4))
+    ])
+    exact_keys = set((exact_firsts * len(frequency) + exact_seconds).tolist())
+
+    results = []
+    for memory in memories:
+        logging.info('Sketch of ' + str(memory) + ' MB on ' + str(size) + ' recipes')
+        start = time.perf_counter()
+        firsts, seconds, values, estimates, sketch, kept = statistics.approximate_correlations(int(memory * (1 << 20)), min_support=min_support)
+        seconds_elapsed = time.perf_counter() - start
+
+        true_counts = np.asarray(counts[firsts, seconds]).ravel()
+        found = true_counts >= min_support
+        exact_values = pointwise_mutual_information_values(true_counts[found], frequency[firsts[found]], frequency[seconds[found]], statistics.n_recipes)
+        pmi_errors = np.abs(values[found] - exact_values)
+        count_errors = estimates - true_counts
+        bound = sketch.epsilon * sketch.total
+
+        keys = set((firsts * len(frequency) + seconds).tolist())
+        results.append(dict([
+            ('memory_mb', memory),
+            ('sketch_mb', round(sketch.nbytes / (1 << 20), 3)),
+            ('pairs_mb', round((firsts.nbytes + seconds.nbytes + estimates.nbytes) / (1 << 20), 3)),
+            ('seconds', round(seconds_elapsed, 4)),
+            ('pairs', len(firsts)),
+            ('max_pairs', kept.capacity),
+            ('truncated', kept.truncated),
+            ('recall', round(len(keys & exact_keys) / len(exact_keys), 4) if exact_keys else 1.0),
+            ('precision', round(len(keys & exact_keys) / len(keys), 4) if keys else 1.0),
+            ('count_error', dict([
+                ('mean', round(float(count_errors.mean()), 3) if len(count_errors) else 0.0),
+                ('max', int(count_errors.max()) if len(count_errors) else 0),
+                ('bound', round(bound, 3)),
+                ('above_bound', round(float(np.mean(count_errors > bound)), 4) if len(count_errors) else 0.0)
+            ])),
+            ('pmi_error', dict([
+                ('mean', round(float(pmi_errors.mean()), 4) if len(pmi_errors) else 0.0),
+                ('p99', round(float(np.quantile(pmi_errors, 0.99)), 4) if len(pmi_errors) else 0.0),
+                ('max', round(float(pmi_errors.max()), 4) if len(pmi_errors) else 0.0)
+            ]))
+        ]))
+
+    return dict([
+        ('environment', environment()),
+        ('parameters', dict([('corpus', corpus), ('min_support', min_support)])),
+        ('exact', exact),
+        ('results', results)
+    ])
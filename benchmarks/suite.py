@@ -0,0 +1,234 @@
+# -*- coding:utf-8 -*-
+
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from os import makedirs, path
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+DEFAULT_VOCABULARY = 2000
+DEFAULT_VARIANT_DENSITY = 0.1
+MIN_INGREDIENTS = 3
+MAX_INGREDIENTS = 12
+# Number of queries of each kind, run on a loaded model with the query cache disabled
+DEFAULT_QUERIES = 200
+DEFAULT_WORKDIR = 'data/benchmarks/'
+# A result is a regression when its time or memory grows by more than this fraction, and by more than the noise of the measure (see `compare`)
+DEFAULT_THRESHOLD = 0.2
+NOISE = dict([('seconds', 0.01), ('peak_memory_mb', 1.0), ('peak_rss_mb', 1.0)])
+
+OPERATIONS = ['build', 'load', 'recipes_with', 'replace_ingredient', 'similar_recipes']
+
+
+def run_suite(sizes=DEFAULT_SIZES, vocabulary=DEFAULT_VOCABULARY, variant_density=DEFAULT_VARIANT_DENSITY, queries=DEFAULT_QUERIES, workers=1, seed=0, workdir=DEFAULT_WORKDIR):
+    """Measure the model on synthetic corpora of several sizes. For each corpus, the model is built (`FoodGraph._build_model`) and stored, loaded back (`FoodGraph._load_model`), and queried with random `recipes_with`, `replace_ingredient` and `similar_recipes` queries.
+
+    Every operation runs in a new process, so its peak memory is not hidden by what previous operations allocated. The corpora and models are kept in `workdir` and named after their parameters, so runs on different commits measure the same corpora.
+
+    Args:
+        sizes (list of int, optional): Number of recipes of each corpus. Defaults to 10^3, 10^4, 10^5 and 10^6.
+        vocabulary (int, optional): Number of distinct ingredients. Defaults to 2000.
+        variant_density (float, optional): Share of the recipes with substitution variants. Defaults to 0.1.
+        queries (int, optional): Number of queries of each kind. Defaults to 200.
+        workers (int, optional): Number of processes of the build. Defaults to 1.
+        seed (int, optional): Seed of the corpora and of the queries. Defaults to 0.
+        workdir (str, optional): Folder of the corpora and models. Defaults to 'data/benchmarks/'.
+
+    Returns:
+        dict: Environment of the run and measurements (see `measure`), ready to be stored as JSON.
+
+    """
+    results = []
+    for size in sizes:
+        corpus = dict([('recipes', size), ('vocabulary', vocabulary), ('variant_density', variant_density), ('seed', seed)])
+        recipes_path = create_corpus(corpus, workdir)
+        graphs_path = path.splitext(recipes_path)[0] + '_model/'
+        makedirs(graphs_path, exist_ok=True)
+
+        for operation in OPERATIONS:
+            logging.info('Measuring `' + operation + '` on ' + str(size) + ' recipes')
+            result = measure(operation, recipes_path, graphs_path, queries, workers, seed)
+            result['corpus'] = corpus
+            results.append(result)
+
+    return dict([
+        ('environment', environment()),
+        ('parameters', dict([('queries', queries), ('workers', workers)])),
+        ('results', results)
+    ])
+
+
+def create_corpus(corpus, workdir):
+    """Generate a corpus in the `RecipeJSON` format with `tmp_create`, unless it already exists
+
+    Args:
+        corpus (dict): Number of recipes, vocabulary size, variant density and seed.
+        workdir (str): Folder of the corpora.
+
+    Returns:
+        str: Path of the corpus.
+
+    """
+    import tmp_create
+
+    makedirs(workdir, exist_ok=True)
+    fname = 'corpus_' + '_'.join(str(corpus[key]) for key in ['recipes', 'vocabulary', 'variant_density', 'seed'])
+    fpath = path.join(workdir, fname + '.jsonl')
+
+    if not path.isfile(fpath):
+        logging.info('Generating ' + fpath)
+        tmp_create.rnd.seed(corpus['seed'])
+        vocabulary = tmp_create.generate_vocabulary(corpus['vocabulary'])
+        # Written aside and renamed, so an interrupted generation is not reused
+        tmp_create.create_recipes_and_save_json(corpus['recipes'], MIN_INGREDIENTS, MAX_INGREDIENTS, fname + '.partial', vocabulary, corpus['variant_density'], path.join(workdir, ''))
+        os.replace(path.join(workdir, fname + '.partial.jsonl'), fpath)
+
+    return fpath
+
+
+def measure(operation, recipes_path, graphs_path, queries=DEFAULT_QUERIES, workers=1, seed=0):
+    """Measure one operation in a new process
+
+    Args:
+        operation (str): 'build', 'load', 'recipes_with', 'replace_ingredient' or 'similar_recipes'.
+        recipes_path (str): Path of the corpus.
+        graphs_path (str): Folder of the model. It is written by 'build' and read by the other operations.
+        queries (int, optional): Number of queries. Defaults to 200.
+        workers (int, optional): Number of processes of the build. Defaults to 1.
+        seed (int, optional): Seed of the queries. Defaults to 0.
+
+    Returns:
+        dict: Operation, wall time in seconds, peak memory in megabytes (growth of the peak resident set size of the process during the operation, 0 if it stays below the peak reached while importing and preparing), peak resident set size of the whole process in megabytes, and, for the queries, their number and latency percentiles in milliseconds.
+
+    """
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(_measure, (operation, recipes_path, graphs_path, queries, workers, seed))
+
+
+def _measure(operation, recipes_path, graphs_path, queries, workers, seed):
+    from analysis import FoodGraph
+
+    if operation == 'build':
+        start_memory = _peak_memory()
+        start = time.perf_counter()
+        FoodGraph(recipes_path=recipes_path, save_path=graphs_path, workers=workers, cache_size=0)
+        return _result(operation, time.perf_counter() - start, _peak_memory() - start_memory)
+
+    if operation == 'load':
+        start_memory = _peak_memory()
+        start = time.perf_counter()
+        FoodGraph(graphs_path=graphs_path, cache_size=0)
+        return _result(operation, time.perf_counter() - start, _peak_memory() - start_memory)
+
+    graph = FoodGraph(graphs_path=graphs_path, cache_size=0)
+    ingredients, recipes = graph.ingredients().labels, graph.recipes().labels
+    rng = random.Random(seed)
+
+    if operation == 'recipes_with':
+        arguments = [([rng.sample(ingredients, min(len(ingredients), rng.randint(1, 3)))], dict(limit=20)) for _ in range(queries)]
+        query = graph.recipes_with
+    elif operation == 'replace_ingredient':
+        # Half of them in the context of a recipe
+        arguments = []
+        for i in range(queries):
+            recipe = rng.choice(recipes)
+            if i % 2 == 0:
+                arguments.append(([rng.choice(ingredients)], dict(limit=10)))
+            else:
+                arguments.append(([rng.choice(graph.ingredients_of(recipe))], dict(limit=10, recipe=recipe)))
+        query = graph.replace_ingredient
+    elif operation == 'similar_recipes':
+        arguments = [([rng.choice(recipes)], dict(limit=10)) for _ in range(queries)]
+        query = graph.similar_recipes
+    else:
+        raise ValueError('Unknown operation `' + operation + '`.')
+
+    latencies = []
+    start_memory = _peak_memory()
+    start = time.perf_counter()
+    for args, kwargs in arguments:
+        begin = time.perf_counter()
+        query(*args, **kwargs)
+        latencies.append(time.perf_counter() - begin)
+    result = _result(operation, time.perf_counter() - start, _peak_memory() - start_memory)
+
+    latencies.sort()
+    result['queries'] = len(latencies)
+    result['latency_ms'] = dict((name, round(1000 * latencies[min(len(latencies) - 1, int(p * len(latencies)))], 4)) for name, p in [('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1)])
+    return result
+
+
+def _result(operation, seconds, memory):
+    return dict([('operation', operation), ('seconds', round(seconds, 4)), ('peak_memory_mb', round(memory, 2)), ('peak_rss_mb', round(_peak_memory(), 2))])
+
+
+def _peak_memory():
+    """Peak resident set size of the process, in megabytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+
+
+def environment():
+    """Returns what identifies a run: commit, time, Python version and machine
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return dict([
+        ('commit', commit),
+        ('time', datetime.datetime.now().isoformat(timespec='seconds')),
+        ('python', platform.python_version()),
+        ('machine', platform.machine()),
+        ('system', platform.system())
+    ])
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Compare two runs of the suite, matching the results by operation and corpus
+
+    Args:
+        baseline (dict): Results of the reference run (see `run_suite`).
+        current (dict): Results of the run to check.
+        threshold (float, optional): Growth, as a fraction, above which a result is a regression. Defaults to 0.2.
+
+    Returns:
+        list of dict: For each result present in both runs: operation, corpus, baseline and current time and memory, their ratios, and whether it is a regression.
+
+    """
+    def key(result):
+        return (result['operation'], json.dumps(result['corpus'], sort_keys=True))
+
+    reference = dict((key(result), result) for result in baseline['results'])
+    comparison = []
+    for result in current['results']:
+        if not key(result) in reference:
+            continue
+        before = reference[key(result)]
+
+        ratios = dict()
+        for field in ['seconds', 'peak_memory_mb', 'peak_rss_mb']:
+            ratios[field] = round(result[field] / before[field], 3) if before[field] > 0 else None
+
+        comparison.append(dict([
+            ('operation', result['operation']),
+            ('corpus', result['corpus']),
+            ('baseline', dict((field, before[field]) for field in ratios)),
+            ('current', dict((field, result[field]) for field in ratios)),
+            ('ratio', ratios),
+            ('regression', any(result[field] > before[field] * (1 + threshold) and result[field] - before[field] > NOISE[field] for field in ratios))
+        ]))
+
+    return comparison
@@ -2,13 +2,17 @@ import pandas as pd
 import ingredient_parser as ip
 import logging, pprint as pp
 from yaml import safe_load, safe_dump
-from json import load, dump
+from json import load, dump, loads, dumps
 from nltk.tokenize import word_tokenize, sent_tokenize
-import string
+import os
+import sys
+import ast
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-from nltk.stem.porter import PorterStemmer
-stemmer = PorterStemmer()
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from normalize import expand_units, normalize_ingredient, normalize_ingredient_column, normalize_name
 
 from translate import Translator
 translator = Translator(to_lang='es')
@@ -16,38 +20,13 @@ translator = Translator(to_lang='es')
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-convert_units = {
-    'tsp.': 'teaspoon',
-    'c.': 'cup',
-    'tbsp.': 'tablespoon',
-    'pkg.': 'package',
-    'kg.': 'kilogram',
-    'g.': 'gram',
-    'ml.': 'milliliter',
-    'l.': 'liter',
-    'oz.': 'ounce',
-    'lb.': 'pound',
-    'pt.': 'pint',
-    'qt.': 'quart',
-    'gal.': 'gallon',
-}
-
-abbreviation = set(convert_units.keys())
 units = {}
 
-trans_ingredients = {}
+# Recipes per chunk of the CSV, the unit of work of the parsing processes and of the checkpoints
+CHUNK_SIZE = 10000
+CHECKPOINT_EXTENSION = '.checkpoint'
 
-def parse(sentence: str) -> str:
-    sentence = sentence.lower()
-    current_word = ""
-    for char in sentence:
-        if char == " " or char == '(' or char == ')' or char == ',':
-            if current_word in abbreviation:
-                sentence = sentence.replace(current_word, convert_units[current_word])
-            current_word = ""
-        else:
-            current_word += char
-    return sentence
+trans_ingredients = {}
 
 def translate(word: str, dictionary: dict) -> str:
     words = [sentence.strip() for sentence in word.lower().split(';')]
@@ -69,6 +48,88 @@ def load_csv(csv: str, column: str) -> list:
     col = df[column]
     return col
 
+def read_list(value: str) -> list:
+    # The lists of RecipeNLG are valid JSON; other Python literals are parsed safely
+    try:
+        return loads(value)
+    except ValueError:
+        return ast.literal_eval(value)
+
+def parse_recipe(title: str, ingredients: str) -> dict:
+    recipe = {"name": normalize_name(str(title)), "ingredients": []}
+    for sentence in read_list(ingredients):
+        parsed = ip.parse_ingredient(expand_units(sentence))
+        name = (parsed.get('name') or sentence) if isinstance(parsed, dict) else sentence
+        recipe["ingredients"].append({"name": normalize_ingredient(name, stemmed=True), "variants": []})
+    return recipe
+
+def parse_chunk(rows: list) -> bytes:
+    # Task of each process: the recipes of a chunk, as JSON Lines
+    return ''.join(dumps(parse_recipe(title, ingredients)) + '\n' for title, ingredients in rows).encode('utf8')
+
+def read_checkpoint(output: str) -> dict:
+    checkpoint = output + CHECKPOINT_EXTENSION
+    if Path(checkpoint).exists() and Path(output).exists():
+        return load(open(checkpoint, 'r'))
+    return {"rows": 0, "bytes": 0}
+
+def write_checkpoint(output: str, rows: int, size: int) -> None:
+    # Written next to its destination and renamed, so it is never left half written
+    checkpoint = output + CHECKPOINT_EXTENSION
+    with open(checkpoint + '.tmp', 'w') as f:
+        dump({"rows": rows, "bytes": size}, f)
+    os.replace(checkpoint + '.tmp', checkpoint)
+
+def parse_csv(csv: str, output: str = 'parsed_data/recipes.jsonl', chunk_size: int = CHUNK_SIZE, workers: int = None) -> int:
+    """Parse the RecipeNLG CSV into a JSON Lines file of recipes, readable by `parser.RecipeJSON`
+
+    The CSV is read in chunks of `chunk_size` recipes, whose ingredients are parsed by a pool of `workers` processes. The chunks are appended to the output in order, and after each one a checkpoint records the rows and bytes written, so an interrupted run resumes from the last checkpoint.
+
+    Returns the number of recipes written.
+    """
+    workers = workers or os.cpu_count() or 1
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+
+    progress = read_checkpoint(output)
+    rows, size = progress["rows"], progress["bytes"]
+    if rows > 0:
+        logger.info(f'Resuming after {rows} recipes')
+
+    # Anything written after the last checkpoint is discarded
+    with open(output, 'ab') as out:
+        out.truncate(size)
+
+    chunks = pd.read_csv(
+        filepath_or_buffer=csv,
+        sep=',',
+        header=0,
+        usecols=['title', 'ingredients'],
+        chunksize=chunk_size,
+        skiprows=range(1, rows + 1),
+        )
+
+    with ProcessPoolExecutor(max_workers=workers) as executor, open(output, 'ab') as out:
+        pending = deque()
+
+        def write(future, n_rows):
+            nonlocal rows, size
+            lines = future.result()
+            out.write(lines)
+            out.flush()
+            os.fsync(out.fileno())
+            rows, size = rows + n_rows, size + len(lines)
+            write_checkpoint(output, rows, size)
+            logger.info(f'Parsed {rows} recipes')
+
+        for chunk in chunks:
+            pending.append((executor.submit(parse_chunk, list(zip(chunk['title'], chunk['ingredients']))), len(chunk)))
+            if len(pending) >= 2 * workers:
+                write(*pending.popleft())
+        while pending:
+            write(*pending.popleft())
+
+    return rows
+
 def parse_ingredients(csv: str) -> list:
     ingredients = load_csv(csv, 'ingredients')
 
@@ -81,10 +142,10 @@ def parse_ingredients(csv: str) -> list:
     for i, ing in enumerate(ingredients_list):
         current_recipe = [0]*len(ing)
         for j, sentence in enumerate(ing):
-            sentence = parse(sentence)
+            sentence = expand_units(sentence)
             current_recipe[j] = ip.parse_ingredient(sentence)
             # current_recipe[j]['unit'] = translate(current_recipe[j]['unit'], units)
-            current_recipe[j]['ingredient'] = stemmer.stem(current_recipe[j])
+            current_recipe[j]['ingredient'] = normalize_ingredient(current_recipe[j]['name'], stemmed=True)
         parsed_ingredients[i] = current_recipe
         
         logger.info(f'Parsed {((i+1)*100)/recipes}% recipes')
@@ -102,22 +163,10 @@ def load_files(path: str) -> list:
     return files
 
 def create_ingredients_set(ingredients: list, save: bool = False) -> set:
-    ingredient_set = set([])
-    for i, ing in enumerate(ingredients):
-        for ingredient in eval(ing):
-            if ingredient[:4] == 'http':
-                continue
-            for char in ingredient:
-                if char in string.punctuation:
-                    if char == '-':
-                        ingredient = ingredient.replace(char, ' ')
-                    elif char == '/':
-                        ingredient = ingredient.replace(char, ' ')
-                    else: ingredient = ingredient.replace(char, '')
-            ingredient = ingredient.lower()
-            ingredient_set.add(stemmer.stem(ingredient.strip()))
-        if i % 2000 == 0:
-            logger.info(f'{((i+1)*100)/len(ingredients)}% ingredients')
+    ingredients = pd.Series(ingredients, dtype=object).dropna()
+    ingredients = ingredients[~ingredients.str.startswith('http')]
+    ingredient_set = set(normalize_ingredient_column(ingredients, stemmed=True).unique())
+    logger.info(f'{len(ingredient_set)} distinct ingredients')
     if save: 
         safe_dump(list(ingredient_set), open(file='ingredients_set.yml', mode='w'))
     return ingredient_set
@@ -147,9 +196,14 @@ def translate_ingredients(csv: str) -> list:
         # recipes = safe_load(open('parsed_ingredients.yml'))
         ingredients = []
         all_recipes = load_files(path='parsed_data/')
-        # open a json file
+        # open a json or json lines file
         for file in all_recipes:
-            file_open = load(open(file=file, mode='r'))
+            if file.suffix == CHECKPOINT_EXTENSION:
+                continue
+            if file.suffix == '.jsonl':
+                file_open = (loads(line) for line in open(file=file, mode='r'))
+            else:
+                file_open = load(open(file=file, mode='r'))
             for recipe in file_open:
                 for ing in recipe['ingredients']:
                     ingredients.append(ing['name'])
@@ -164,7 +218,7 @@ def translate_ingredients(csv: str) -> list:
         safe_dump(trans_ingredients, open(file='translate_ing.yml', mode='w'))
 
 def main(args=None):
-    # pi = parse_csv('RecipeNLG_dataset.csv')
+    parse_csv('RecipeNLG_dataset.csv', 'parsed_data/recipes.jsonl')
     translate_ingredients(csv='RecipeNLG_dataset.csv')
     
     
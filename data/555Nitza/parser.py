@@ -1,8 +1,13 @@
+import sys
 from json import load, dump
+from pathlib import Path
 from pprint import pprint
 from translate import Translator
 translator = Translator(from_lang='es', to_lang='en')
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from normalize import normalize_ingredient, normalize_name
+
 recipes: dict = load(open("raw_data/recipes.json", "r"))
 
 ingredients_set: set = set()
@@ -57,10 +62,10 @@ translate_rec = load(open("parsed_data/trans_recipes.json", "r"))
 new_recipes: dict = {}
 
 for recipe in recipes:
-    new_name = translate_rec[recipe.lower()]
+    new_name = normalize_name(translate_rec[recipe.lower()])
     new_recipes[new_name] = {"ingredients": [], "ingredients_extended": []}
     for ingredient in recipes[recipe]["ingredientes"]:
-        new_ing_name = translate_ing[ingredient["nombre"]]
+        new_ing_name = normalize_ingredient(translate_ing[ingredient["nombre"]])
         new_recipes[new_name]["ingredients"].append({"name": new_ing_name, "variants": ingredient["variantes"]})
         
 dump(new_recipes, open(file=f"recipes.json", mode="w"))
\ No newline at end of file
@@ -1,4 +1,9 @@
+import sys
 from json import dump
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from normalize import normalize_ingredient, normalize_name
 
 recipes_file = open("raw_data/classes_Recipes5k.txt", "r")
 recipes = recipes_file.readlines()
@@ -15,9 +20,9 @@ ingredients_simpl_file.close()
 
 recipes_with_ing = {}
 for rs, ing, ings in zip(recipes, ingredients, ingredients_simpl):
-    recipes_with_ing[rs.replace("\n", "").lower()] = {
-        "ingredients_extended": [{"name": i.replace("\n", "").replace("_", " "), "variants": []} for i in ing.split(",")],
-        "ingredients": [{"name": i.replace("\n", "").replace("_", " "), "variants": []} for i in ings.split(",")]
+    recipes_with_ing[normalize_name(rs)] = {
+        "ingredients_extended": [{"name": normalize_ingredient(i), "variants": []} for i in ing.split(",")],
+        "ingredients": [{"name": normalize_ingredient(i), "variants": []} for i in ings.split(",")]
     }
     
 dump(recipes_with_ing, open("parsed_data/recipes.json", "w"))
\ No newline at end of file
@@ -0,0 +1,99 @@
+# -*- coding:utf-8 -*-
+
+"""Text normalization shared by the dataset parsers
+
+Every function works on one string, and has a `*_column` counterpart that works on a whole pandas column (`pandas.Series` of strings) at once.
+"""
+
+import re
+import string
+from functools import lru_cache
+
+# Abbreviations of units, and their full names
+UNITS = dict([
+    ('tsp.', 'teaspoon'),
+    ('c.', 'cup'),
+    ('tbsp.', 'tablespoon'),
+    ('pkg.', 'package'),
+    ('kg.', 'kilogram'),
+    ('g.', 'gram'),
+    ('ml.', 'milliliter'),
+    ('l.', 'liter'),
+    ('oz.', 'ounce'),
+    ('lb.', 'pound'),
+    ('pt.', 'pint'),
+    ('qt.', 'quart'),
+    ('gal.', 'gallon'),
+])
+# Maximum number of stems kept in memory
+STEM_CACHE_SIZE = 1 << 16
+
+# Separators become spaces, the rest of the punctuation is removed
+_SEPARATORS = '-/_'
+_PUNCTUATION = str.maketrans(_SEPARATORS, ' ' * len(_SEPARATORS), ''.join(c for c in string.punctuation if not c in _SEPARATORS))
+# An abbreviation is a whole word, delimited by spaces, parentheses or commas
+_UNITS = re.compile(r'(?<![^\s(),])(' + '|'.join(re.escape(unit) for unit in sorted(UNITS, key=len, reverse=True)) + r')(?![^\s(),])')
+_SPACES = re.compile(r'\s+')
+
+_stemmer = None
+
+
+def expand_units(sentence: str) -> str:
+    """Lower case an ingredient sentence and replace the abbreviations of units by their full names, e.g. '1 c. sugar' -> '1 cup sugar'
+    """
+    return _UNITS.sub(_expand_unit, sentence.lower())
+
+
+def _expand_unit(match):
+    return UNITS[match.group(1)]
+
+
+def normalize_name(name: str) -> str:
+    """Lower case a name and collapse its whitespace
+    """
+    return _SPACES.sub(' ', name.lower()).strip()
+
+
+def normalize_ingredient(name: str, stemmed: bool = False) -> str:
+    """Normalize an ingredient name: lower case, '-', '/' and '_' as spaces, no other punctuation and collapsed whitespace
+
+    Args:
+        name (str): Ingredient name.
+        stemmed (bool, optional): Whether to stem the result with `stem`. Defaults to False.
+
+    """
+    name = normalize_name(name.translate(_PUNCTUATION))
+    return stem(name) if stemmed else name
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem(word: str) -> str:
+    """Porter stem of a word, memoized since the ingredients of a dataset repeat a lot
+    """
+    global _stemmer
+    if _stemmer is None:
+        from nltk.stem.porter import PorterStemmer
+        _stemmer = PorterStemmer()
+    return _stemmer.stem(word)
+
+
+def expand_units_column(column):
+    """`expand_units` over a pandas column
+    """
+    return column.str.lower().str.replace(_UNITS, _expand_unit, regex=True)
+
+
+def normalize_name_column(column):
+    """`normalize_name` over a pandas column
+    """
+    return column.str.lower().str.replace(_SPACES, ' ', regex=True).str.strip()
+
+
+def normalize_ingredient_column(column, stemmed: bool = False):
+    """`normalize_ingredient` over a pandas column. Each distinct name is stemmed once.
+    """
+    column = normalize_name_column(column.str.translate(_PUNCTUATION))
+    if not stemmed:
+        return column
+    names = column.dropna().unique()
+    return column.map(dict(zip(names, map(stem, names))))
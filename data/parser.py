@@ -1,10 +1,219 @@
-from json import load, dump
+import argparse
+import hashlib
+import heapq
+import logging
+import math
+import os
+import re
+import sys
+import tempfile
+from json import dumps, loads
+from pathlib import Path
 
-full_recipes = load(open("555Nitza/parsed_data/recipes.json"))
-recipes5k = load(open("5KRecipes/parsed_data/recipes.json"))
+# The `parser` package of the repository, not this script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from parser import RecipeJSON
+from normalize import normalize_ingredient, normalize_name
 
-for key, value in recipes5k.items():
-    if key not in full_recipes:
-        full_recipes[key] = value
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
-dump(full_recipes, open("recipes.json", "w"))
\ No newline at end of file
+# Outputs of the dataset parsers, merged in this order when no source is given. The first copy of a repeated recipe is the one kept.
+DEFAULT_SOURCES = [
+    ('555Nitza', '555Nitza/parsed_data/recipes.json'),
+    ('5KRecipes', '5KRecipes/parsed_data/recipes.json'),
+    ('2MRecipes', '2MRecipes/parsed_data/recipes.jsonl'),
+]
+DEFAULT_OUTPUT = 'recipes.json'
+# Memory available for the recipes of a partition, in megabytes
+DEFAULT_MEMORY_MB = 256
+# Size in memory of the decoded recipes, relative to their size in the source files
+EXPANSION = 4
+MAX_PARTITIONS = 512
+
+# Suffix of the later recipes with the name of a previous one (see `unique_names`)
+_COPY_SUFFIX = re.compile(r'\s*\(\d+\)$')
+
+
+def recipe_key(recipe: dict, stemmed: bool = False) -> str:
+    """Key of a recipe for deduplication: a hash of its normalized name and of the set of its normalized ingredient names, so the order and repetitions of the ingredients do not matter
+    """
+    ingredients = sorted(set(normalize_ingredient(ingredient['name'], stemmed) for ingredient in recipe.get('ingredients', [])))
+    text = normalize_name(recipe['name']) + '\0' + '\n'.join(ingredients)
+    return hashlib.blake2b(text.encode('utf8'), digest_size=16).hexdigest()
+
+
+def base_name(name: str) -> str:
+    """Normalized name of a recipe without a copy suffix, so a recipe and the ones that `unique_names` may rename after it share it
+    """
+    return _COPY_SUFFIX.sub('', normalize_name(name))
+
+
+def partition_of(name: str, n_partitions: int) -> int:
+    return int(hashlib.blake2b(base_name(name).encode('utf8'), digest_size=4).hexdigest(), 16) % n_partitions
+
+
+def unique_names(recipes: list) -> int:
+    """Rename the recipes whose name is taken by a previous one, in place: the first keeps the name, and the later ones get the first free name among `name (2)`, `name (3)`, ...
+
+    The model joins the recipes with the same name into one, with the ingredients of all of them (see `analysis.corpus.CorpusStatistics`), so recipes with the same name and different ingredients must have different names to stay apart.
+
+    Args:
+        recipes (list): Recipes, in order of the input.
+
+    Returns:
+        int: Number of recipes renamed.
+    """
+    taken = set(recipe['name'] for recipe in recipes)
+    used = set()
+    renamed = 0
+    for recipe in recipes:
+        name = recipe['name']
+        if name in used:
+            copy = 2
+            while f'{name} ({copy})' in taken or f'{name} ({copy})' in used:
+                copy += 1
+            recipe['name'] = f'{name} ({copy})'
+            renamed += 1
+        used.add(recipe['name'])
+    return renamed
+
+
+def partition_recipes(sources: list, partitions: list, stemmed: bool = False) -> dict:
+    """First pass: read the sources one recipe at a time, and append each one to the partition of its name (see `base_name`), with its key, its position in the input and its source. The repeated recipes, and the recipes with the same name, end up in the same partition.
+
+    Returns the number of recipes read from each source.
+    """
+    counts = {}
+    sequence = 0
+    for label, source in sources:
+        counts[label] = 0
+        for recipe in RecipeJSON(source).get_recipes():
+            key = recipe_key(recipe, stemmed)
+            # A recipe of a corpus merged before keeps its provenance
+            provenance = recipe.pop('sources', None) or [label]
+            partitions[partition_of(recipe['name'], len(partitions))].write(dumps([sequence, key, provenance, recipe]) + '\n')
+            sequence += 1
+            counts[label] += 1
+        logger.info(f'Read {counts[label]} recipes from {source}')
+    return counts
+
+
+def deduplicate_partition(partition: str, output: str) -> tuple:
+    """Second pass: keep the first copy of every recipe of a partition, with the sources of all its copies in `sources`, sorted by position in the input, and give different names to the recipes kept with the same name (see `unique_names`)
+
+    Returns the number of recipes kept and renamed.
+    """
+    kept = {}
+    with open(partition, 'r', encoding='utf8') as f:
+        for line in f:
+            sequence, key, provenance, recipe = loads(line)
+            if key in kept:
+                sources = kept[key][1]['sources']
+                sources.extend(source for source in provenance if source not in sources)
+            else:
+                recipe['sources'] = list(dict.fromkeys(provenance))
+                kept[key] = (sequence, recipe)
+
+    kept = sorted(kept.values(), key=lambda item: item[0])
+    renamed = unique_names([recipe for _, recipe in kept])
+
+    with open(output, 'w', encoding='utf8') as f:
+        for sequence, recipe in kept:
+            f.write(dumps([sequence, recipe]) + '\n')
+    return len(kept), renamed
+
+
+def read_partition(fpath: str):
+    with open(fpath, 'r', encoding='utf8') as f:
+        for line in f:
+            yield loads(line)
+
+
+def write_corpus(partitions: list, output: str) -> None:
+    """Third pass: merge the deduplicated partitions in the order of the input, into a JSON object keyed by recipe name or, for a `.jsonl` output, into JSON Lines
+    """
+    json_lines = Path(output).suffix.lower() in ('.jsonl', '.ndjson')
+    temporary = output + '.tmp'
+    with open(temporary, 'w', encoding='utf8') as f:
+        if not json_lines:
+            f.write('{')
+        first = True
+        for _, recipe in heapq.merge(*[read_partition(partition) for partition in partitions], key=lambda item: item[0]):
+            name = recipe.pop('name')
+            if json_lines:
+                f.write(dumps(dict(name=name, **recipe)) + '\n')
+                continue
+            f.write(('' if first else ',') + '\n' + dumps(name) + ': ' + dumps(recipe))
+            first = False
+        if not json_lines:
+            f.write('\n}\n')
+    # Renamed at the end, so an interrupted merge never leaves a partial corpus
+    os.replace(temporary, output)
+
+
+def merge_sources(sources: list, output: str = DEFAULT_OUTPUT, memory_mb: float = DEFAULT_MEMORY_MB, stemmed: bool = False) -> dict:
+    """Merge recipe files (JSON or JSON Lines, see `parser.RecipeJSON`) into a single corpus, without repeated recipes
+
+    Two recipes are the same if they have the same normalized name and the same set of normalized ingredient names (see `recipe_key`). The first copy is kept, in the order of the sources, with the labels of the sources of every copy in its `sources` field. Recipes with the same name and different ingredients are all kept, and the later ones are renamed `name (2)`, `name (3)`, ... (see `unique_names`), since the model would join recipes with the same name into one.
+
+    The sources are streamed, and the recipes are spread by name among temporary partition files, sized so that the recipes of one partition fit in `memory_mb` megabytes. Each partition is deduplicated on its own, and the partitions are merged back in the order of the input, so the memory does not depend on the size of the corpus, only on the number of recipes that share a name.
+
+    Returns the number of recipes read from each source, and the number of recipes written, discarded and renamed.
+    """
+    size = sum(Path(source).stat().st_size for _, source in sources)
+    n_partitions = min(MAX_PARTITIONS, max(1, math.ceil(size * EXPANSION / (memory_mb * (1 << 20)))))
+    logger.info(f'Merging {len(sources)} sources ({size} bytes) in {n_partitions} partitions')
+
+    with tempfile.TemporaryDirectory(prefix='merge', dir=str(Path(output).resolve().parent)) as workdir:
+        paths = [os.path.join(workdir, f'{i}.partition') for i in range(n_partitions)]
+        files = [open(fpath, 'w', encoding='utf8') for fpath in paths]
+        try:
+            counts = partition_recipes(sources, files, stemmed)
+        finally:
+            for f in files:
+                f.close()
+
+        written, renamed = 0, 0
+        for fpath in paths:
+            kept, copies = deduplicate_partition(fpath, fpath + '.unique')
+            written += kept
+            renamed += copies
+            os.remove(fpath)
+
+        write_corpus([fpath + '.unique' for fpath in paths], output)
+
+    read = sum(counts.values())
+    logger.info(f'Wrote {written} recipes to {output}, {read - written} repeated recipes discarded, {renamed} recipes renamed')
+    return {"sources": counts, "written": written, "duplicates": read - written, "renamed": renamed}
+
+
+def parse_source(value: str) -> tuple:
+    # `label=path`, or a path labelled by itself
+    label, separator, source = value.partition('=')
+    return (label, source) if separator else (value, value)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Merge recipe files into a single corpus, without repeated recipes.')
+    parser.add_argument('sources', nargs='*', metavar='[LABEL=]FILE', help='Recipe files, JSON or JSON Lines, labelled in the `sources` field of their recipes (default: the outputs of the Nitza, 5K and RecipeNLG parsers that exist).')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help=f'Merged corpus, a JSON object or, with a .jsonl extension, JSON Lines (default: {DEFAULT_OUTPUT}).')
+    parser.add_argument('--memory-mb', type=float, default=DEFAULT_MEMORY_MB, help=f'Memory for the recipes held at a time, in megabytes (default: {DEFAULT_MEMORY_MB}).')
+    parser.add_argument('--stem', action='store_true', help='Compare the stems of the ingredient names, as the RecipeNLG parser writes them.')
+    args = parser.parse_args(args)
+
+    if args.sources:
+        sources = [parse_source(value) for value in args.sources]
+    else:
+        sources = []
+        for label, source in DEFAULT_SOURCES:
+            if Path(source).is_file():
+                sources.append((label, source))
+            else:
+                logger.warning(f'Skipping {label}: {source} does not exist')
+
+    merge_sources(sources, args.output, args.memory_mb, args.stem)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,32 +1,48 @@
-# -*- coding:utf-8 -*- 
+# -*- coding:utf-8 -*-
 
 import json
+import time
 from os import path
 
+JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson')
+
+
 class RecipeJSON:
     """
     Class oriented to the extraction of the data from the JSON file, with the information of the recipes
-    """    
-    
-    def __init__(self, pfile):
+
+    Two layouts are supported, and both are read lazily (the file is never loaded as a whole into memory):
+        - JSON (`.json`): A single object, whose keys are the recipe names and whose values are the recipe fields.
+        - JSON Lines (`.jsonl`, `.ndjson`): One recipe object per line, with the recipe name in the `name` field.
+    """
+
+    def __init__(self, pfile, chunk_size=1 << 16, start=0, end=None, metrics=None):
         """
         Args:
-            pfile (str): Path of the JSON file with the definition of the recipes.
-            
+            pfile (str): Path of the JSON or JSON Lines file with the definition of the recipes.
+            chunk_size (int, optional): Number of characters read from the file at a time. Defaults to 65536.
+            start (int, optional): Only for JSON Lines. Byte offset from which the recipes are read; a line that begins before it is skipped. Defaults to 0.
+            end (int, optional): Only for JSON Lines. Byte offset at which the reading stops; a line that begins before it is read entirely. Defaults to None (end of file).
+            metrics (analysis.metrics.Metrics, optional): Instrumentation of the reading: number of recipes and bytes read, and time spent decoding JSON (phase 'parse.decode'). It is not passed on to the shards. Defaults to None.
+
         """
-        if pfile is None: 
+        if pfile is None:
             raise ValueError('')
         elif not path.isfile(pfile):
             raise FileNotFoundError('')
-        else: 
-            with open(pfile, 'r', encoding='utf8', errors='ignore') as f:
-                self.recipes = json.load(f)
-                
+        else:
+            self.pfile = pfile
+            self.chunk_size = chunk_size
+            self.json_lines = path.splitext(pfile)[1].lower() in JSON_LINES_EXTENSIONS
+            self.start = start
+            self.end = end
+            self.metrics = metrics
+
     def get_recipes(self):
-        """Returns the recipes
+        """Returns the recipes. Every call reads the file again, one recipe at a time.
 
         Yields:
-            dict: The fields are: 
+            dict: The fields are:
                 - name (str): Recipe name.
                 - ingredients (list of dict): List of ingredients. Its fields are:
                     - name (str): Ingredient name.
@@ -34,13 +50,186 @@ class RecipeJSON:
                 - ingredients_simplified (list of dict): List of standardized/simplified ingredients. Its fields are:
                     - name (str): Ingredient name.
                     - variants (list of int): List of ingredients that can be substituted. The list contains positions within the `ingredients` list.
-            
-        """        
-        for key, value in self.recipes.items():
-            restructured = dict()
-            restructured['name'] = key
-            restructured.update(value)
-            
-            yield restructured
-    
 
+        """
+        if self.json_lines:
+            with open(self.pfile, 'rb') as f:
+                yield from self._read_lines(f)
+        else:
+            with open(self.pfile, 'r', encoding='utf8', errors='ignore') as f:
+                n_recipes = 0
+                try:
+                    for key, value in self._read_object(f):
+                        value['name'] = key
+                        n_recipes += 1
+                        yield value
+                finally:
+                    if self._timed():
+                        self.metrics.count('recipes_read', n_recipes)
+
+    def get_shards(self, n_shards, batch_size=10000):
+        """Split the recipes into portions that can be read independently (e.g. by different processes)
+
+        JSON Lines files are split into `n_shards` byte ranges of similar size, so each portion is read and decoded by whoever processes it. A JSON object cannot be split without decoding it, so its recipes are read here and grouped into lists of `batch_size` recipes.
+
+        Args:
+            n_shards (int): Number of portions of a JSON Lines file.
+            batch_size (int, optional): Number of recipes of each portion of a JSON file. Defaults to 10000.
+
+        Yields:
+            RecipeJSON | list of dict: Portions of the recipes, in the order in which they appear in the file.
+
+        """
+        if self.json_lines:
+            start = self.start
+            end = path.getsize(self.pfile) if self.end is None else self.end
+            size = max(1, -(-(end - start) // n_shards))
+
+            for offset in range(start, end, size):
+                yield RecipeJSON(self.pfile, self.chunk_size, offset, min(offset + size, end))
+        else:
+            batch = []
+            for recipe in self.get_recipes():
+                batch.append(recipe)
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+    def _read_lines(self, f):
+        """Decode the lines of a JSON Lines file that begin in the range [`start`, `end`)
+
+        Args:
+            f (file object): File opened in binary mode.
+
+        Raises:
+            ValueError: If a line does not contain a recipe object with a `name` field.
+
+        Yields:
+            dict: Recipe.
+
+        """
+        if self.start > 0:
+            # Skip the line in progress, it belongs to the previous range
+            f.seek(self.start - 1)
+            f.readline()
+
+        timed = self._timed()
+        first = f.tell()
+        n_recipes, decoding = 0, 0.0
+        try:
+            while self.end is None or f.tell() < self.end:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+
+                line = line.decode('utf8', errors='ignore').strip()
+                if not line:
+                    continue
+
+                if timed:
+                    start = time.perf_counter()
+                    recipe = json.loads(line)
+                    decoding += time.perf_counter() - start
+                else:
+                    recipe = json.loads(line)
+                if not isinstance(recipe, dict) or 'name' not in recipe:
+                    raise ValueError('The line at byte ' + str(offset) + ' of `' + self.pfile + '` is not a recipe object with a `name` field.')
+
+                n_recipes += 1
+                yield recipe
+        finally:
+            if timed:
+                self.metrics.add_time('parse.decode', decoding)
+                self.metrics.count('recipes_read', n_recipes)
+                self.metrics.count('bytes_read', f.tell() - first)
+
+    def _read_object(self, f):
+        """Decode, member by member, a file whose content is a single JSON object
+
+        Args:
+            f (file object): Opened file.
+
+        Raises:
+            ValueError: If the content of the file is not a JSON object.
+
+        Yields:
+            (str, object): Key and value of each member of the object.
+
+        """
+        decoder = json.JSONDecoder()
+        buffer = ''
+        position = 0
+        eof = False
+        timed = self._timed()
+        decoding = 0.0
+
+        def fill():
+            # Discard what has already been decoded and append a new chunk
+            nonlocal buffer, position, eof
+            chunk = f.read(self.chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+        def skip_whitespace():
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                if position < len(buffer) or eof:
+                    return
+                fill()
+
+        def expect(*chars):
+            nonlocal position
+            skip_whitespace()
+            if position >= len(buffer) or buffer[position] not in chars:
+                found = buffer[position] if position < len(buffer) else 'end of file'
+                raise ValueError('Malformed JSON in `' + self.pfile + '`: expected ' + ' or '.join(repr(c) for c in chars) + ', found ' + repr(found) + '.')
+            position += 1
+            return buffer[position - 1]
+
+        def decode():
+            nonlocal position, decoding
+            skip_whitespace()
+            while True:
+                try:
+                    if timed:
+                        start = time.perf_counter()
+                        try:
+                            value, end = decoder.raw_decode(buffer, position)
+                        finally:
+                            decoding += time.perf_counter() - start
+                    else:
+                        value, end = decoder.raw_decode(buffer, position)
+                    # A value that ends exactly at the end of the buffer may be truncated (e.g. a number)
+                    if end < len(buffer) or eof:
+                        position = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+
+        try:
+            expect('{')
+            skip_whitespace()
+            if position < len(buffer) and buffer[position] == '}':
+                return
+
+            while True:
+                key = decode()
+                expect(':')
+                yield key, decode()
+
+                if expect(',', '}') == '}':
+                    return
+        finally:
+            if timed:
+                self.metrics.add_time('parse.decode', decoding)
+
+    def _timed(self):
+        return not self.metrics is None and self.metrics.enabled
@@ -0,0 +1,2 @@
+from .server import QueryServer
+from .client import QueryClient
\ No newline at end of file
@@ -0,0 +1,55 @@
+# -*- coding:utf-8 -*-
+
+import argparse
+import asyncio
+import json
+import logging
+
+from analysis import FoodGraph, SubstitutionFeedback
+from analysis.metrics import Metrics
+
+from .load import generate_load
+from .server import DEFAULT_HOST, DEFAULT_PORT, MAX_BATCH, BATCH_WINDOW, QueryServer
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m service', description='Query service of the recipes engine.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='Load the model and serve queries over HTTP.')
+    serve.add_argument('--graphs', default='data/graphs/', help='Folder of the model (default: data/graphs/).')
+    serve.add_argument('--feedback', default='data/substitutions.json', help='Substitution feedback store (default: data/substitutions.json).')
+    serve.add_argument('--host', default=DEFAULT_HOST)
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('--max-batch', type=int, default=MAX_BATCH, help='Maximum number of queries per batch.')
+    serve.add_argument('--batch-window', type=float, default=BATCH_WINDOW, help='Time that a batch waits for more queries, in seconds.')
+    serve.add_argument('--metrics', action='store_true', help='Instrument the model and the requests, and expose the metrics on GET /metrics.')
+    serve.add_argument('--prefetch', action='store_true', help='Read every graph of the model in background threads as soon as it is loaded, instead of on first access.')
+
+    load = commands.add_parser('load', help='Send random queries to a server and report their latency.')
+    load.add_argument('--url', default='http://' + DEFAULT_HOST + ':' + str(DEFAULT_PORT))
+    load.add_argument('--requests', type=int, default=1000)
+    load.add_argument('--concurrency', type=int, default=16)
+    load.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == 'serve':
+        feedback = SubstitutionFeedback(args.feedback)
+        graph = FoodGraph(graphs_path=args.graphs, metrics=Metrics() if args.metrics else None, prefetch=args.prefetch)
+        graph.apply_substitution_feedback(feedback)
+        # The search indexes are built before the first type-ahead request arrives
+        graph.search_recipes('')
+        graph.search_ingredients('')
+        server = QueryServer(graph, feedback, args.max_batch, args.batch_window)
+        try:
+            asyncio.run(server.serve_forever(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        print(json.dumps(asyncio.run(generate_load(args.url, args.requests, args.concurrency, seed=args.seed)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
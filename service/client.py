@@ -0,0 +1,212 @@
+# -*- coding:utf-8 -*-
+
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+from analysis.error import IngredientNotFoundError, RecipeNotFoundError
+from analysis.ingredient import DEFAULT_SIMILAR_LIMIT
+from analysis.search import DEFAULT_SEARCH_LIMIT
+
+# Errors reported by the server that are raised again by the client, by name
+ERRORS = dict([
+    ('IngredientNotFoundError', IngredientNotFoundError),
+    ('RecipeNotFoundError', RecipeNotFoundError),
+    ('KeyError', ValueError),
+    ('ValueError', ValueError),
+    ('TypeError', ValueError)
+])
+# Time for which the names of the recipes and ingredients are reused, in seconds
+LABELS_TTL = 60
+
+
+class LabelList(list):
+    """
+    Sorted names, with the `labels` attribute of `analysis.index.LabelView`
+    """
+
+    @property
+    def labels(self):
+        return self
+
+
+class QueryClient:
+    """
+    Client of a `service.QueryServer`, with the query methods of `FoodGraph`, so it can take its place in a frontend. The HTTP connection is kept alive, one per thread.
+    """
+
+    def __init__(self, url, timeout=30, labels_ttl=LABELS_TTL):
+        """
+        Args:
+            url (str): Address of the server, e.g. 'http://127.0.0.1:8765'.
+            timeout (float, optional): Timeout of each request, in seconds. Defaults to 30.
+            labels_ttl (float, optional): Time for which the names of the recipes and ingredients are reused, in seconds. Defaults to 60.
+
+        """
+        address = urlsplit(url)
+        self.host = address.hostname
+        self.port = address.port or 80
+        self.timeout = timeout
+        self.labels_ttl = labels_ttl
+        self._local = threading.local()
+        # path -> (time of the request, names)
+        self._labels = dict()
+
+
+    def recipes(self):
+        """Returns the names of the recipes of the model, sorted
+
+        Returns:
+            LabelList: Recipe names.
+
+        """
+        return self._label_list('/recipes')
+
+
+    def ingredients(self):
+        """Returns the names of the ingredients of the model, sorted
+
+        Returns:
+            LabelList: Ingredient names.
+
+        """
+        return self._label_list('/ingredients')
+
+
+    def _label_list(self, path):
+        now = time.monotonic()
+        if not path in self._labels or now - self._labels[path][0] > self.labels_ttl:
+            self._labels[path] = (now, LabelList(self._request('GET', path)))
+        return self._labels[path][1]
+
+
+    def search_recipes(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        """See `FoodGraph.search_recipes`
+
+        """
+        return self._request('POST', '/search', dict([('query', query), ('kind', 'recipes'), ('limit', limit)]))
+
+
+    def search_ingredients(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        """See `FoodGraph.search_ingredients`
+
+        """
+        return self._request('POST', '/search', dict([('query', query), ('kind', 'ingredients'), ('limit', limit)]))
+
+
+    def similar_recipes(self, recipe, limit=DEFAULT_SIMILAR_LIMIT):
+        """See `FoodGraph.similar_recipes`
+
+        """
+        result = self._request('POST', '/similar', dict([('name', recipe), ('kind', 'recipes'), ('limit', limit)]))
+        return [(name, score) for name, score in result]
+
+
+    def similar_recipes_batch(self, recipes, limit=DEFAULT_SIMILAR_LIMIT):
+        """See `FoodGraph.similar_recipes_batch`
+
+        """
+        result = self._request('POST', '/similar', dict([('names', list(recipes)), ('kind', 'recipes'), ('limit', limit)]))
+        return [[(name, score) for name, score in similar] for similar in result]
+
+
+    def similar_ingredients(self, ingredient, limit=DEFAULT_SIMILAR_LIMIT):
+        """See `FoodGraph.similar_ingredients`
+
+        """
+        result = self._request('POST', '/similar', dict([('name', ingredient), ('kind', 'ingredients'), ('limit', limit)]))
+        return [(name, score) for name, score in result]
+
+
+    def similar_ingredients_batch(self, ingredients, limit=DEFAULT_SIMILAR_LIMIT):
+        """See `FoodGraph.similar_ingredients_batch`
+
+        """
+        result = self._request('POST', '/similar', dict([('names', list(ingredients)), ('kind', 'ingredients'), ('limit', limit)]))
+        return [[(name, score) for name, score in similar] for similar in result]
+
+
+    def ingredients_of(self, recipe):
+        """See `FoodGraph.ingredients_of`
+
+        """
+        return self._request('POST', '/recipe', dict([('name', recipe)]))['ingredients']
+
+
+    def recipes_with(self, ingredients, match_all=False, limit=None):
+        """See `FoodGraph.recipes_with`
+
+        """
+        result = self._request('POST', '/recipes_with', dict([('ingredients', list(ingredients)), ('match_all', match_all), ('limit', limit)]))
+        return result if match_all else [(recipe, count) for recipe, count in result]
+
+
+    def replace_ingredient(self, ingredient, limit=None, recipe=None, inferred=True):
+        """See `FoodGraph.replace_ingredient`
+
+        """
+        return self._request('POST', '/replace_ingredient', dict([('ingredient', ingredient), ('limit', limit), ('recipe', recipe), ('inferred', inferred)]))
+
+
+    def inferred_substitutes(self, ingredient, limit=None):
+        """See `FoodGraph.inferred_substitutes`
+
+        """
+        result = self._request('POST', '/inferred_substitutes', dict([('ingredient', ingredient), ('limit', limit)]))
+        return [(name, similarity) for name, similarity in result]
+
+
+    def recipes_from_pantry(self, pantry, max_missing=0, limit=None):
+        """See `FoodGraph.recipes_from_pantry`
+
+        """
+        result = self._request('POST', '/pantry', dict([('pantry', list(pantry)), ('max_missing', max_missing), ('limit', limit)]))
+        return [(recipe, missing) for recipe, missing in result]
+
+
+    def apply_substitution_feedback(self, feedback=None):
+        """Ask the server to fold the new votes of its substitution feedback store into the model. The votes are expected to be recorded in the same store (see `analysis.SubstitutionFeedback`).
+
+        Args:
+            feedback (analysis.SubstitutionFeedback, optional): Ignored; accepted for compatibility with `FoodGraph.apply_substitution_feedback`.
+
+        Returns:
+            int: Number of votes folded into the model.
+
+        """
+        return self._request('POST', '/feedback')
+
+
+    def _connection(self):
+        if getattr(self._local, 'connection', None) is None:
+            self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._local.connection
+
+
+    def _request(self, method, path, params=None):
+        body = None if params is None else json.dumps(params).encode('utf8')
+        headers = dict([('Content-Type', 'application/json')])
+
+        # A kept-alive connection may have been closed by the server: it is opened again once
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                payload = json.loads(response.read())
+                break
+            except (http.client.HTTPException, ConnectionError):
+                connection.close()
+                self._local.connection = None
+                if attempt > 0:
+                    raise
+
+        if response.getheader('Connection', '').lower() == 'close':
+            connection.close()
+            self._local.connection = None
+
+        if 'error' in payload:
+            raise ERRORS.get(payload['error'], RuntimeError)(payload['message'])
+        return payload['result']
@@ -0,0 +1,117 @@
+# -*- coding:utf-8 -*-
+
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlsplit
+
+# Share of each kind of query in the generated load
+DEFAULT_MIX = dict([
+    ('recipes_with', 0.4),
+    ('replace_ingredient', 0.3),
+    ('recipe', 0.2),
+    ('pantry', 0.1)
+])
+
+
+async def generate_load(url, requests=1000, concurrency=16, mix=None, seed=0):
+    """Send random queries to a `service.QueryServer` and measure their latency. The queries are drawn from the recipes and ingredients of the model, and sent over `concurrency` kept-alive connections, each one waiting for a response before sending its next query.
+
+    Args:
+        url (str): Address of the server, e.g. 'http://127.0.0.1:8765'.
+        requests (int, optional): Number of queries. Defaults to 1000.
+        concurrency (int, optional): Number of connections. Defaults to 16.
+        mix (dict(str, float), optional): Share of each kind of query ('recipes_with', 'replace_ingredient', 'recipe', 'pantry'). Defaults to `DEFAULT_MIX`.
+        seed (int, optional): Seed of the random queries. Defaults to 0.
+
+    Returns:
+        dict: Number of requests and errors, elapsed seconds, throughput (requests per second) and latency percentiles, in milliseconds.
+
+    """
+    address = urlsplit(url)
+    host, port = address.hostname, address.port or 80
+    mix = DEFAULT_MIX if mix is None else mix
+    rng = random.Random(seed)
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, ingredients = await _exchange(reader, writer, 'GET', '/ingredients')
+    _, recipes = await _exchange(reader, writer, 'GET', '/recipes')
+    writer.close()
+    ingredients, recipes = ingredients['result'], recipes['result']
+
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=requests)
+    queries = [_random_query(kind, rng, ingredients, recipes) for kind in kinds]
+
+    latencies, errors = [], [0]
+    pending = iter(queries)
+
+    async def connection():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for path, params in pending:
+                start = time.perf_counter()
+                status, _ = await _exchange(reader, writer, 'POST', path, params)
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors[0] += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[connection() for _ in range(max(1, concurrency))])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    def percentile(p):
+        return round(1000 * latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else None
+
+    return dict([
+        ('requests', len(latencies)),
+        ('errors', errors[0]),
+        ('concurrency', concurrency),
+        ('seconds', round(elapsed, 3)),
+        ('throughput', round(len(latencies) / elapsed, 1) if elapsed > 0 else None),
+        ('latency_ms', dict([('p50', percentile(0.5)), ('p90', percentile(0.9)), ('p99', percentile(0.99)), ('max', percentile(1))]))
+    ])
+
+
+def _random_query(kind, rng, ingredients, recipes):
+    if kind == 'recipes_with':
+        return '/recipes_with', dict([('ingredients', rng.sample(ingredients, min(len(ingredients), rng.randint(1, 3)))), ('limit', 20)])
+    if kind == 'replace_ingredient':
+        return '/replace_ingredient', dict([('ingredient', rng.choice(ingredients)), ('limit', 10)])
+    if kind == 'recipe':
+        return '/recipe', dict([('name', rng.choice(recipes))])
+    if kind == 'pantry':
+        return '/pantry', dict([('pantry', rng.sample(ingredients, min(len(ingredients), rng.randint(3, 8)))), ('max_missing', 1), ('limit', 20)])
+    raise ValueError('Unknown kind of query `' + kind + '`.')
+
+
+async def _exchange(reader, writer, method, path, params=None):
+    """Send one request on a kept-alive connection and read its response
+
+    Returns:
+        (int, dict): Status code and decoded body.
+
+    """
+    body = b'' if params is None else json.dumps(params).encode('utf8')
+    writer.write((
+        method + ' ' + path + ' HTTP/1.1\r\n' +
+        'Host: ' + str(writer.get_extra_info('peername')[0]) + '\r\n' +
+        'Content-Type: application/json\r\n' +
+        'Content-Length: ' + str(len(body)) + '\r\n\r\n'
+    ).encode('latin-1') + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split(b' ')[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+
+    return status, json.loads(await reader.readexactly(length))
@@ -0,0 +1,383 @@
+# -*- coding:utf-8 -*-
+
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from analysis.error import IngredientNotFoundError, RecipeNotFoundError
+from analysis.ingredient import DEFAULT_SIMILAR_LIMIT
+from analysis.search import DEFAULT_SEARCH_LIMIT
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# Maximum number of queries executed together, and time that a batch waits for more queries, in seconds. Without waiting, a batch takes the queries that arrived while the previous one was running.
+MAX_BATCH = 64
+BATCH_WINDOW = 0
+# Maximum size of a request body, in bytes
+MAX_BODY = 1 << 20
+
+STATUS = dict([
+    (200, 'OK'),
+    (400, 'Bad Request'),
+    (404, 'Not Found'),
+    (405, 'Method Not Allowed'),
+    (413, 'Payload Too Large'),
+    (500, 'Internal Server Error')
+])
+
+# Errors of the queries that are reported to the client, with their status code
+QUERY_ERRORS = dict([
+    (IngredientNotFoundError, 404),
+    (RecipeNotFoundError, 404),
+    (KeyError, 400),
+    (ValueError, 400),
+    (TypeError, 400)
+])
+
+
+class Text(str):
+    """Result of an endpoint that is sent as plain text, instead of JSON
+    """
+
+
+class HTTPError(Exception):
+    """Raised when a request cannot be served
+    """
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class QueryServer:
+    """
+    HTTP/JSON server in front of a single `FoodGraph`, shared by all the clients. The endpoints are:
+        - GET /health: `{"status": "ok"}`.
+        - GET /stats: Number of requests, queries, batches and distinct queries executed, statistics of the query cache of the model, and how its graphs were loaded.
+        - GET /metrics: Metrics of the model (see `analysis.metrics.Metrics`), and latency of the requests by endpoint, in the Prometheus text format. Empty unless the model is instrumented.
+        - GET /recipes, GET /ingredients: Sorted names of the recipes or ingredients of the model.
+        - POST /recipe `{"name"}`: Recipe lookup, `{"name", "ingredients"}`.
+        - POST /recipes_with `{"ingredients", "match_all", "limit"}`: See `FoodGraph.recipes_with`.
+        - POST /replace_ingredient `{"ingredient", "limit", "recipe", "inferred"}`: See `FoodGraph.replace_ingredient`.
+        - POST /inferred_substitutes `{"ingredient", "limit"}`: See `FoodGraph.inferred_substitutes`.
+        - POST /pantry `{"pantry", "max_missing", "limit"}`: See `FoodGraph.recipes_from_pantry`.
+        - POST /search `{"query", "kind", "limit"}`: Type-ahead search of the recipes (kind 'recipes') or ingredients (kind 'ingredients', the default). See `FoodGraph.search_recipes`.
+        - POST /similar `{"name" or "names", "kind", "limit"}`: Recipes (kind 'recipes') or ingredients (kind 'ingredients', the default) most similar to one, or to each of a list (see `FoodGraph.similar_recipes` and `FoodGraph.similar_recipes_batch`).
+        - POST /feedback: Fold the new votes of the substitution feedback into the model (see `FoodGraph.apply_substitution_feedback`).
+    The result of a query is returned as `{"result": ...}`, and an error as `{"error": <exception name>, "message": ...}`.
+
+    Connections are served concurrently by an asyncio event loop. The queries are not run on the loop: they are queued, and a single worker thread, the only one that touches the model, runs them in batches. A batch takes the queries queued while the previous batch was running, plus those that arrive within `batch_window` seconds (at most `max_batch` of them), and identical queries of a batch are run once.
+    """
+
+    def __init__(self, graph, feedback=None, max_batch=MAX_BATCH, batch_window=BATCH_WINDOW):
+        """
+        Args:
+            graph (analysis.FoodGraph): Model.
+            feedback (analysis.SubstitutionFeedback, optional): Store of the substitution feedback folded by `POST /feedback`. Defaults to None (the endpoint is not available).
+            max_batch (int, optional): Maximum number of queries per batch. Defaults to 64.
+            batch_window (float, optional): Time that a batch waits for more queries, in seconds. Defaults to 0 (no waiting).
+
+        """
+        self.graph = graph
+        self.feedback = feedback
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.stats = dict([('requests', 0), ('queries', 0), ('batches', 0), ('executed', 0)])
+
+        self._queue = None
+        self._server = None
+        self._batcher = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._routes = dict([
+            (('GET', '/health'), lambda params: dict([('status', 'ok')])),
+            (('GET', '/stats'), lambda params: dict(self.stats, cache=self.graph.cache_stats(), load=self.graph.load_stats())),
+            (('GET', '/metrics'), lambda params: Text(self.graph.metrics.prometheus())),
+            (('GET', '/recipes'), self._query('recipes')),
+            (('GET', '/ingredients'), self._query('ingredients')),
+            (('POST', '/recipe'), self._query('recipe')),
+            (('POST', '/recipes_with'), self._query('recipes_with')),
+            (('POST', '/replace_ingredient'), self._query('replace_ingredient')),
+            (('POST', '/inferred_substitutes'), self._query('inferred_substitutes')),
+            (('POST', '/pantry'), self._query('pantry')),
+            (('POST', '/search'), self._query('search')),
+            (('POST', '/similar'), self._query('similar')),
+            (('POST', '/feedback'), self._query('feedback'))
+        ])
+
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Start listening
+
+        Args:
+            host (str, optional): Interface. Defaults to '127.0.0.1'.
+            port (int, optional): Port, or 0 for any free port. Defaults to 8765.
+
+        Returns:
+            (str, int): Address on which the server listens.
+
+        """
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.ensure_future(self._run_batches())
+        self._server = await asyncio.start_server(self._serve_connection, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+
+    async def serve_forever(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        address = await self.start(host, port)
+        logging.info('Serving queries on http://' + address[0] + ':' + str(address[1]))
+        async with self._server:
+            await self._server.serve_forever()
+
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+        self._batcher.cancel()
+        self._executor.shutdown(wait=True)
+
+
+    ##################
+    ### CONNECTION ###
+    ##################
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                    if request is None:
+                        break
+                    method, target, body, keep_alive = request
+                    status, payload = await self._dispatch(method, target, body)
+                except HTTPError as e:
+                    status, payload, keep_alive = e.status, _error(e), False
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+
+    async def _dispatch(self, method, target, body):
+        self.stats['requests'] += 1
+        path = urlsplit(target).path
+
+        if not (method, path) in self._routes:
+            if any(route_path == path for _, route_path in self._routes):
+                raise HTTPError(405, 'Method ' + method + ' is not allowed on `' + path + '`.')
+            raise HTTPError(404, 'Unknown endpoint `' + path + '`.')
+
+        try:
+            params = json.loads(body) if body else dict()
+        except ValueError:
+            raise HTTPError(400, 'The request body is not valid JSON.')
+        if not isinstance(params, dict):
+            raise HTTPError(400, 'The request body must be a JSON object.')
+
+        metrics = self.graph.metrics
+        start = time.perf_counter()
+        result = self._routes[(method, path)](params)
+        if asyncio.isfuture(result):
+            try:
+                result = await result
+            except tuple(QUERY_ERRORS) as e:
+                return next(status for error, status in QUERY_ERRORS.items() if isinstance(e, error)), _error(e)
+            except Exception as e:
+                logging.exception('Query failed')
+                return 500, _error(e)
+            finally:
+                # Including the time queued and batched
+                metrics.observe('request_seconds', time.perf_counter() - start, endpoint=path)
+
+        if isinstance(result, Text):
+            return 200, result
+        return 200, dict([('result', result)])
+
+
+    ###############
+    ### QUERIES ###
+    ###############
+
+    def _query(self, name):
+        """Returns the handler of an endpoint that queues a query
+
+        """
+        def handler(params):
+            future = asyncio.get_running_loop().create_future()
+            self._queue.put_nowait((name, params, future))
+            return future
+        return handler
+
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            results = await loop.run_in_executor(self._executor, self._execute, [(name, params) for name, params, _ in batch])
+            for (_, _, future), (ok, value) in zip(batch, results):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+
+    def _execute(self, queries):
+        """Run a batch of queries on the worker thread. Identical queries are run once.
+
+        Args:
+            queries (list of (str, dict)): Name and parameters of each query.
+
+        Returns:
+            list of (bool, object): For each query, whether it succeeded, and its result or exception.
+
+        """
+        self.stats['batches'] += 1
+        self.stats['queries'] += len(queries)
+        done = dict()
+        results = []
+
+        for name, params in queries:
+            # Feedback changes the model, so it is never merged with other requests
+            key = (name, json.dumps(params, sort_keys=True)) if name != 'feedback' else object()
+            if not key in done:
+                self.stats['executed'] += 1
+                try:
+                    done[key] = (True, self._run(name, params))
+                except Exception as e:
+                    done[key] = (False, e)
+            results.append(done[key])
+
+        return results
+
+
+    def _run(self, name, params):
+        graph = self.graph
+
+        if name == 'recipes':
+            return graph.recipes().labels
+        if name == 'ingredients':
+            return graph.ingredients().labels
+        if name == 'recipe':
+            return dict([('name', params['name']), ('ingredients', graph.ingredients_of(params['name']))])
+        if name == 'recipes_with':
+            return graph.recipes_with(_list(params, 'ingredients'), params.get('match_all', False), params.get('limit'))
+        if name == 'replace_ingredient':
+            return graph.replace_ingredient(params['ingredient'], params.get('limit'), params.get('recipe'), params.get('inferred', True))
+        if name == 'inferred_substitutes':
+            return graph.inferred_substitutes(params['ingredient'], params.get('limit'))
+        if name == 'pantry':
+            return graph.recipes_from_pantry(_list(params, 'pantry'), params.get('max_missing', 0), params.get('limit'))
+        if name == 'search':
+            kind = params.get('kind', 'ingredients')
+            if not kind in ('recipes', 'ingredients'):
+                raise ValueError('Field `kind` must be `recipes` or `ingredients`.')
+            search = graph.search_recipes if kind == 'recipes' else graph.search_ingredients
+            return search(params['query'], params.get('limit', DEFAULT_SEARCH_LIMIT))
+        if name == 'similar':
+            kind = params.get('kind', 'ingredients')
+            if not kind in ('recipes', 'ingredients'):
+                raise ValueError('Field `kind` must be `recipes` or `ingredients`.')
+            limit = params.get('limit', DEFAULT_SIMILAR_LIMIT)
+            if 'names' in params:
+                similar = graph.similar_recipes_batch if kind == 'recipes' else graph.similar_ingredients_batch
+                return similar(_list(params, 'names'), limit)
+            similar = graph.similar_recipes if kind == 'recipes' else graph.similar_ingredients
+            return similar(params['name'], limit)
+        if name == 'feedback':
+            if self.feedback is None:
+                raise ValueError('The server has no substitution feedback store.')
+            return graph.apply_substitution_feedback(self.feedback)
+
+        raise ValueError('Unknown query `' + name + '`.')
+
+
+def _list(params, field):
+    value = params[field]
+    if not isinstance(value, list):
+        raise ValueError('Field `' + field + '` must be a list.')
+    return value
+
+
+def _error(e):
+    if isinstance(e, KeyError):
+        message = 'Missing field `' + str(e.args[0]) + '`.'
+    else:
+        message = str(e)
+    return dict([('error', type(e).__name__), ('message', message)])
+
+
+async def _read_request(reader):
+    """Read one HTTP/1.1 request
+
+    Raises:
+        HTTPError: If the request is malformed or its body is too large.
+
+    Returns:
+        (str, str, bytes, bool) | None: Method, target, body and whether the connection is kept alive, or None if the connection was closed.
+
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+
+    parts = line.decode('latin-1').rstrip('\r\n').split(' ')
+    if len(parts) != 3:
+        raise HTTPError(400, 'Malformed request line.')
+    method, target, version = parts
+
+    headers = dict()
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HTTPError(400, 'Invalid Content-Length.')
+    if length > MAX_BODY:
+        raise HTTPError(413, 'The request body exceeds ' + str(MAX_BODY) + ' bytes.')
+
+    body = await reader.readexactly(length) if length > 0 else b''
+    connection = headers.get('connection', '').lower()
+    keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+
+    return method, target, body, keep_alive
+
+
+def _response(status, payload, keep_alive):
+    if isinstance(payload, Text):
+        body, content_type = payload.encode('utf8'), 'text/plain; version=0.0.4; charset=utf-8'
+    else:
+        body, content_type = json.dumps(payload).encode('utf8'), 'application/json'
+    head = (
+        'HTTP/1.1 ' + str(status) + ' ' + STATUS.get(status, '') + '\r\n' +
+        'Content-Type: ' + content_type + '\r\n' +
+        'Content-Length: ' + str(len(body)) + '\r\n' +
+        'Connection: ' + ('keep-alive' if keep_alive else 'close') + '\r\n\r\n'
+    )
+    return head.encode('latin-1') + body
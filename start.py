@@ -4,10 +4,44 @@
 
 
 from analysis import FoodGraph
+from analysis.metrics import Metrics
 from tmp_create import create_recipes_and_save_csv
+import argparse
 import logging
+import os
 
-logging.basicConfig(level=logging.INFO)
-logging.info("Creating graphs ...")
-info = FoodGraph(recipes_path='data/recipes.json')
-logging.info("Graphs created")
\ No newline at end of file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the model of the recipes engine.')
+    parser.add_argument('--recipes', default='data/recipes.json', help='Recipes file, JSON or JSON Lines (default: data/recipes.json).')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of processes of the build (default: number of CPUs).')
+    parser.add_argument('--min-support', type=int, default=1, help='Minimum number of recipes in which two ingredients appear together to be correlated (default: 1).')
+    parser.add_argument('--min-npmi', type=float, help='Minimum normalized PMI, between -1 and 1, of two correlated ingredients.')
+    parser.add_argument('--top-k', type=int, help='Maximum number of correlations kept per ingredient.')
+    parser.add_argument('--sketch-memory-mb', type=float, help='Estimate the co-occurrence counts with a count-min sketch instead of counting them exactly, keeping the sketch and the pairs kept within this many megabytes.')
+    parser.add_argument('--prune-counts', action='store_true', help='Store only the co-occurrence counts of the pairs kept by the pruning, so it also reduces the model. The model updates are then approximate.')
+    parser.add_argument('--embedding-dim', type=int, default=64, help='Number of dimensions of the vectors of the ingredients and recipes, used to find similar ones (default: 64).')
+    parser.add_argument('--infer-substitutions', action='store_true', help='Infer substitutions from the recipes, for the corpora whose recipes have no substitution variants.')
+    parser.add_argument('--rebuild', action='store_true', help='Build the whole model, even if the stored one was built from the same recipes and options.')
+    parser.add_argument('--metrics', action='store_true', help='Log the time of every phase of the build and its counters.')
+    parser.add_argument('--prometheus', metavar='FILE', help='Store the metrics of the build in FILE, in the Prometheus text format. Implies --metrics.')
+    parser.add_argument('--profile', metavar='FILE', help='Profile the build with cProfile and store the profile in FILE. Implies --metrics.')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    metrics = Metrics(profile=not args.profile is None) if args.metrics or args.prometheus or args.profile else None
+    
+    logging.info("Creating graphs ...")
+    info = FoodGraph(recipes_path=args.recipes, workers=args.workers, metrics=metrics, min_support=args.min_support, min_npmi=args.min_npmi, top_k=args.top_k, sketch_memory_mb=args.sketch_memory_mb, prune_counts=args.prune_counts, embedding_dim=args.embedding_dim, infer_substitutions=args.infer_substitutions, reuse=not args.rebuild)
+    if info.rebuilt:
+        logging.info("Graphs created: " + ', '.join(info.rebuilt))
+    else:
+        logging.info("Graphs unchanged, the stored model is reused")
+    
+    if not metrics is None:
+        metrics.log()
+        if args.prometheus:
+            with open(args.prometheus, 'w') as f:
+                f.write(metrics.prometheus())
+        if args.profile:
+            metrics.dump_profile(args.profile)
+            logging.info(metrics.profile_stats(limit=20))
@@ -0,0 +1,96 @@
+# -*- coding:utf-8 -*-
+
+import json
+import threading
+import time
+
+from analysis import FoodGraph, SubstitutionFeedback
+
+
+RECIPES = dict([
+    ('flan', dict([('ingredients', [dict([('name', 'egg'), ('variants', [])]), dict([('name', 'milk'), ('variants', [])]), dict([('name', 'sugar'), ('variants', [])])])])),
+    ('natilla', dict([('ingredients', [dict([('name', 'milk'), ('variants', [])]), dict([('name', 'honey'), ('variants', [])]), dict([('name', 'egg'), ('variants', [])])])]))
+])
+
+
+class SlowFeedback(SubstitutionFeedback):
+    """
+    Feedback store whose reads take a while, so concurrent callers overlap between reading the cursor and folding the votes
+    """
+
+    def changes(self, cursor=None):
+        result = super().changes(cursor)
+        time.sleep(0.01)
+        return result
+
+
+def substitution_weight(graph, ingredient, substitute):
+    edges = graph.ingredient_substitution_graph
+    return edges[ingredient][substitute]['weight'] if edges.has_edge(ingredient, substitute) else 0
+
+
+def test_concurrent_feedback_is_folded_once(tmp_path):
+    recipes_path = tmp_path / 'recipes.json'
+    recipes_path.write_text(json.dumps(RECIPES))
+    graph = FoodGraph(recipes_path=str(recipes_path), save_path=str(tmp_path), cache_size=0)
+    feedback = SlowFeedback(str(tmp_path / 'substitutions.json'))
+
+    n_threads, n_rounds = 8, 5
+    barrier = threading.Barrier(n_threads)
+
+    def vote_and_fold(i):
+        barrier.wait()
+        for _ in range(n_rounds):
+            feedback.record('sugar', ['honey'])
+            if i % 2 == 0:
+                feedback.record('egg', ['milk'])
+            graph.apply_substitution_feedback(feedback)
+
+    threads = [threading.Thread(target=vote_and_fold, args=(i,)) for i in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    graph.apply_substitution_feedback(feedback)
+
+    votes = dict([(('sugar', 'honey'), n_threads * n_rounds), (('egg', 'milk'), n_threads // 2 * n_rounds)])
+    assert feedback.totals() == votes
+    for (ingredient, substitute), count in votes.items():
+        assert substitution_weight(graph, ingredient, substitute) == count
+
+
+def test_interrupted_compaction_counts_votes_once(tmp_path, monkeypatch):
+    recipes_path = tmp_path / 'recipes.json'
+    recipes_path.write_text(json.dumps(RECIPES))
+    graph = FoodGraph(recipes_path=str(recipes_path), save_path=str(tmp_path), cache_size=0)
+    feedback = SubstitutionFeedback(str(tmp_path / 'substitutions.json'))
+    feedback.record('sugar', ['honey'])
+    feedback.compact()
+    feedback.record('sugar', ['honey'])
+    feedback.record('egg', ['milk'])
+    graph.apply_substitution_feedback(feedback)
+
+    # The process dies after writing the compacted votes, before removing the journal
+    def crash(path):
+        raise OSError('crash')
+
+    with monkeypatch.context() as patch:
+        patch.setattr('analysis.feedback.os.remove', crash)
+        try:
+            feedback.compact()
+        except OSError:
+            pass
+        else:
+            raise AssertionError('The compaction was not interrupted')
+
+    votes = dict([(('sugar', 'honey'), 2), (('egg', 'milk'), 1)])
+    restarted = SubstitutionFeedback(str(tmp_path / 'substitutions.json'))
+    assert restarted.totals() == votes
+    restarted.record('egg', ['milk'])
+    restarted.compact()
+    votes[('egg', 'milk')] += 1
+    assert restarted.totals() == votes
+
+    graph.apply_substitution_feedback(restarted)
+    for (ingredient, substitute), count in votes.items():
+        assert substitution_weight(graph, ingredient, substitute) == count
@@ -0,0 +1,45 @@
+# -*- coding:utf-8 -*-
+
+import importlib.util
+import json
+from pathlib import Path
+
+from analysis import FoodGraph
+
+DATA = Path(__file__).resolve().parent.parent / 'data'
+
+
+def load_merge(monkeypatch):
+    # `data/parser.py` is a script run from `data/`, whose name is taken by the `parser` package
+    monkeypatch.syspath_prepend(str(DATA))
+    spec = importlib.util.spec_from_file_location('merge', DATA / 'parser.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def recipe(*ingredients):
+    return dict([('ingredients', [dict([('name', name), ('variants', [])]) for name in ingredients])])
+
+
+def test_colliding_names_stay_apart(tmp_path, monkeypatch):
+    merge = load_merge(monkeypatch)
+    (tmp_path / 'a.json').write_text(json.dumps(dict([('pie', recipe('apple', 'flour')), ('flan', recipe('egg', 'milk'))])))
+    with open(tmp_path / 'b.jsonl', 'w') as f:
+        for name, ingredients in [('pie', ['pear', 'flour']), ('Flan', ['milk', 'egg', 'egg']), ('pie', ['apple', 'flour']), ('pie (2)', ['plum'])]:
+            f.write(json.dumps(dict(recipe(*ingredients), name=name)) + '\n')
+
+    output = str(tmp_path / 'recipes.json')
+    stats = merge.merge_sources([('A', str(tmp_path / 'a.json')), ('B', str(tmp_path / 'b.jsonl'))], output, memory_mb=1e-6)
+    assert stats['written'] == 4 and stats['duplicates'] == 2 and stats['renamed'] == 1
+
+    with open(output) as f:
+        corpus = json.load(f)
+    assert list(corpus) == ['pie', 'flan', 'pie (3)', 'pie (2)']
+    assert corpus['pie']['sources'] == ['A', 'B'] and corpus['flan']['sources'] == ['A', 'B']
+    assert corpus['pie (3)']['sources'] == ['B']
+
+    graph = FoodGraph(recipes_path=output, save_path=str(tmp_path), cache_size=0)
+    assert sorted(graph.ingredients_of('pie')) == ['apple', 'flour']
+    assert sorted(graph.ingredients_of('pie (3)')) == ['flour', 'pear']
+    assert not graph.ingredient_correlation_graph.has_edge('apple', 'pear')
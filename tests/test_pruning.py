@@ -0,0 +1,98 @@
+# -*- coding:utf-8 -*-
+
+import itertools
+import json
+import math
+import random
+
+from analysis import FoodGraph
+from parser import RecipeJSON
+
+N_RECIPES = 800
+N_INGREDIENTS = 120
+
+
+def write_corpus(fpath, n_recipes=N_RECIPES, n_ingredients=N_INGREDIENTS, seed=0):
+    # Skewed ingredient frequencies, so the pairs have a wide range of support and NPMI
+    rng = random.Random(seed)
+    vocabulary = ['ingredient' + str(i) for i in range(n_ingredients)]
+    weights = [1 / (i + 1) for i in range(n_ingredients)]
+    with open(fpath, 'w') as f:
+        for i in range(n_recipes):
+            names = list(dict.fromkeys(rng.choices(vocabulary, weights, k=rng.randint(3, 10))))
+            f.write(json.dumps(dict([('name', 'recipe' + str(i)), ('ingredients', [dict([('name', name), ('variants', [])]) for name in names])])) + '\n')
+    return str(fpath)
+
+
+def pair_statistics(fpath):
+    """Number of recipes, of recipes of each ingredient, and of recipes of each pair of ingredients, counted directly from the corpus
+    """
+    n_recipes, frequency, counts = 0, dict(), dict()
+    for recipe in RecipeJSON(fpath).get_recipes():
+        names = sorted(set(ingredient['name'] for ingredient in recipe['ingredients']))
+        n_recipes += 1
+        for name in names:
+            frequency[name] = frequency.get(name, 0) + 1
+        for pair in itertools.combinations(names, 2):
+            counts[pair] = counts.get(pair, 0) + 1
+    return n_recipes, frequency, counts
+
+
+def correlations(graph):
+    return dict((tuple(sorted((u, v))), data['value']) for u, v, data in graph.ingredient_correlation_graph.edges(data=True))
+
+
+def test_min_support_removes_rare_pairs(tmp_path):
+    recipes_path = write_corpus(tmp_path / 'recipes.jsonl')
+    _, _, counts = pair_statistics(recipes_path)
+    assert any(count < 3 for count in counts.values())
+
+    graph = FoodGraph(recipes_path=recipes_path, save_path=str(tmp_path), cache_size=0, min_support=3)
+    assert set(correlations(graph)) == set(pair for pair, count in counts.items() if count >= 3)
+
+
+def test_min_npmi_removes_weak_pairs(tmp_path):
+    recipes_path = write_corpus(tmp_path / 'recipes.jsonl')
+    n_recipes, frequency, counts = pair_statistics(recipes_path)
+
+    def npmi(pair, count):
+        if count == n_recipes:
+            return 1.0
+        return math.log2(count * n_recipes / (frequency[pair[0]] * frequency[pair[1]])) / -math.log2(count / n_recipes)
+
+    expected = set(pair for pair, count in counts.items() if npmi(pair, count) >= 0.1)
+    assert 0 < len(expected) < len(counts)
+
+    graph = FoodGraph(recipes_path=recipes_path, save_path=str(tmp_path), cache_size=0, min_npmi=0.1)
+    assert set(correlations(graph)) == expected
+
+
+def test_top_k_bounds_the_degree(tmp_path):
+    recipes_path = write_corpus(tmp_path / 'recipes.jsonl')
+    full = FoodGraph(recipes_path=recipes_path, save_path=str(tmp_path), cache_size=0)
+    assert max(degree for _, degree in full.ingredient_correlation_graph.degree()) > 5
+
+    graph = FoodGraph(recipes_path=recipes_path, save_path=str(tmp_path), cache_size=0, top_k=5)
+    degrees = [degree for _, degree in graph.ingredient_correlation_graph.degree()]
+    assert 0 < max(degrees) <= 5
+
+
+def test_updates_equal_a_pruned_build(tmp_path):
+    write_corpus(tmp_path / 'all.jsonl')
+    recipes = list(RecipeJSON(str(tmp_path / 'all.jsonl')).get_recipes())
+    pruning = dict([('min_support', 2), ('min_npmi', 0.0), ('top_k', 5)])
+
+    def write(fpath, selected):
+        with open(fpath, 'w') as f:
+            for recipe in selected:
+                f.write(json.dumps(recipe) + '\n')
+        return str(fpath)
+
+    # Built without the last recipes, which are then added, and with the first ones, which are then removed
+    graph = FoodGraph(recipes_path=write(tmp_path / 'before.jsonl', recipes[:-50]), save_path=str(tmp_path), cache_size=0, **pruning)
+    graph.add_recipes(recipes[-50:])
+    graph.remove_recipes([recipe['name'] for recipe in recipes[:20]])
+
+    expected = FoodGraph(recipes_path=write(tmp_path / 'after.jsonl', recipes[20:]), save_path=str(tmp_path), cache_size=0, **pruning)
+    assert len(correlations(expected)) > 0
+    assert correlations(graph) == correlations(expected)
@@ -0,0 +1,59 @@
+# -*- coding:utf-8 -*-
+
+import json
+import random
+
+import numpy as np
+
+from analysis import FoodGraph
+from analysis.corpus import CorpusStatistics
+from analysis.sketch import pairs_budget, sketch_cooccurrence
+
+
+def random_recipes(n_recipes=2000, n_ingredients=300, seed=0):
+    rng = random.Random(seed)
+    vocabulary = ['ingredient' + str(i) for i in range(n_ingredients)]
+    weights = [1 / (i + 1) for i in range(n_ingredients)]
+    for i in range(n_recipes):
+        names = list(dict.fromkeys(rng.choices(vocabulary, weights, k=rng.randint(3, 12))))
+        yield dict([('name', 'recipe' + str(i)), ('ingredients', [dict([('name', name), ('variants', [])]) for name in names])])
+
+
+def test_retained_pairs_stay_within_the_budget():
+    statistics = CorpusStatistics()
+    for recipe in random_recipes():
+        statistics.add(recipe)
+    _, exact = statistics.cooccurrence()
+
+    memory = 64 << 10
+    _, capacity = pairs_budget(memory)
+    assert exact.nnz > capacity
+
+    # Small batches, so the pairs go through the table many times
+    _, firsts, seconds, _, sketch, pairs = sketch_cooccurrence(statistics.incidence(), memory, batch=256)
+    assert pairs.capacity == capacity
+    assert pairs.peak <= capacity and len(firsts) <= capacity
+    assert pairs.truncated
+
+    # The pairs kept are those of highest estimate, whatever the batches
+    n_tokens = statistics.incidence().shape[1]
+    keys = exact.row.astype(np.int64) * n_tokens + exact.col
+    kept = np.isin(keys, firsts * n_tokens + seconds)
+    assert sketch.query(keys[kept]).min() >= sketch.query(keys[~kept]).max()
+    _, all_firsts, all_seconds, _, _, _ = sketch_cooccurrence(statistics.incidence(), memory)
+    assert np.array_equal(firsts, all_firsts) and np.array_equal(seconds, all_seconds)
+
+
+def test_sketch_build_is_bounded_by_the_budget(tmp_path):
+    recipes_path = tmp_path / 'recipes.jsonl'
+    with open(recipes_path, 'w') as f:
+        for recipe in random_recipes():
+            f.write(json.dumps(recipe) + '\n')
+
+    memory_mb = 1 / 16
+    graph = FoodGraph(recipes_path=str(recipes_path), save_path=str(tmp_path), cache_size=0, sketch_memory_mb=memory_mb)
+    _, capacity = pairs_budget(int(memory_mb * (1 << 20)))
+    sketch = graph._model.metadata['ingredient_correlation_graph']['sketch']
+    assert sketch['max_pairs'] == capacity and sketch['truncated']
+    assert graph.ingredient_correlation_graph.number_of_edges() <= capacity
+    assert len(graph._model.graphs['ingredient_cooccurrence_graph'].edges()[0]) <= capacity